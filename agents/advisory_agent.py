@@ -94,6 +94,21 @@ Use bullet points and numbered lists.
         treatment_info = research_data.get("treatment_info", {})
         weather = research_data.get("weather", {})
         language = research_data.get("language", "en")  # Default to English
+        similar_cases = research_data.get("similar_cases") or []
+        severity = research_data.get("severity") or {}
+        
+        if severity:
+            research += (f"\n\nMeasured severity: {severity['affected_area_percent']}% "
+                         f"of leaf area affected ({severity['severity']})")
+        
+        # Verified outcomes of look-alike past cases ground the action plan
+        verified = [case for case in similar_cases if case.get("verified")]
+        if verified:
+            research += "\n\nVerified outcomes of similar past cases:\n" + "\n".join(
+                f"- {case['plant_type']} / {case['disease_detected']} "
+                f"(similarity {case['similarity']}): {case.get('outcome') or 'no notes'}"
+                for case in verified
+            )
         
         # Build advisory prompt using translations
         advisory_prompt = get_advisory_instruction(
@@ -114,6 +129,9 @@ Use bullet points and numbered lists.
             "action_plan": action_plan,
             "weather_context": weather,
             "image_path": research_data.get("image_path"),
+            "severity": severity,
+            "image_hash": research_data.get("image_hash"),
+            "similar_cases": similar_cases,
             "generated_at": research_data.get("timestamp"),
             "language": language,
             "follow_up_required": True,
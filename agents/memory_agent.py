@@ -2,8 +2,10 @@
 Memory Agent for Farm History Tracking
 Maintains user session data, crop history, and follow-up schedules
 """
+import hashlib
 import json
 import sqlite3
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
 from pathlib import Path
@@ -44,6 +46,12 @@ class MemoryAgent:
         
         self.db_path = db_path
         self._init_database()
+        
+        # In-memory similarity indexes (one per model arch), synced from
+        # image_embeddings incrementally by rowid
+        self._similarity_indexes = {}
+        self._similarity_synced_rowid = 0
+        self._similarity_lock = threading.Lock()
     
     def _init_database(self):
         """Initialize database schema if not exists."""
@@ -72,11 +80,19 @@ class MemoryAgent:
                 confidence REAL,
                 diagnosis_json TEXT,
                 action_plan TEXT,
+                affected_area_percent REAL,
+                severity TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(user_id)
             )
         """)
         
+        # Databases created before severity was measured lack these columns
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(farm_sessions)")}
+        for column, column_type in (("affected_area_percent", "REAL"), ("severity", "TEXT")):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE farm_sessions ADD COLUMN {column} {column_type}")
+        
         # Follow-ups table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS follow_ups (
@@ -106,6 +122,46 @@ class MemoryAgent:
             )
         """)
         
+        # Image embeddings from the local model (float16 blobs) for
+        # similar-case retrieval, keyed by SHA-256 of the image bytes
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS image_embeddings (
+                image_hash TEXT PRIMARY KEY,
+                user_id TEXT,
+                session_id INTEGER,
+                plant_type TEXT,
+                disease_name TEXT,
+                confidence REAL,
+                model_arch TEXT,
+                dim INTEGER,
+                embedding BLOB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(user_id),
+                FOREIGN KEY (session_id) REFERENCES farm_sessions(session_id)
+            )
+        """)
+        
+        # Shadow mode: local model vs cloud vision on the same request
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS shadow_comparisons (
+                comparison_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                image_hash TEXT,
+                user_id TEXT,
+                cloud_plant TEXT,
+                cloud_disease TEXT,
+                cloud_confidence REAL,
+                cloud_latency_ms REAL,
+                local_plant TEXT,
+                local_disease TEXT,
+                local_confidence REAL,
+                local_latency_ms REAL,
+                model_arch TEXT,
+                plant_match INTEGER,
+                disease_match INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
         conn.commit()
         conn.close()
     
@@ -192,7 +248,9 @@ class MemoryAgent:
         disease_detected: str,
         confidence: float,
         diagnosis_json: str,
-        action_plan: str
+        action_plan: str,
+        affected_area_percent: Optional[float] = None,
+        severity: Optional[str] = None
     ) -> Optional[int]:
         """
         Save a diagnosis session.
@@ -205,6 +263,8 @@ class MemoryAgent:
             confidence: Confidence score
             diagnosis_json: Full diagnosis JSON
             action_plan: Generated action plan
+            affected_area_percent: Measured lesion area (percent of leaf)
+            severity: Severity label derived from the lesion area
             
         Returns:
             Session ID if successful
@@ -214,9 +274,11 @@ class MemoryAgent:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO farm_sessions 
-                (user_id, image_path, plant_type, disease_detected, confidence, diagnosis_json, action_plan)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (user_id, image_path, plant_type, disease_detected, confidence, diagnosis_json, action_plan))
+                (user_id, image_path, plant_type, disease_detected, confidence, diagnosis_json, action_plan,
+                 affected_area_percent, severity)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (user_id, image_path, plant_type, disease_detected, confidence, diagnosis_json, action_plan,
+                  affected_area_percent, severity))
             
             session_id = cursor.lastrowid
             conn.commit()
@@ -271,7 +333,8 @@ class MemoryAgent:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT session_id, plant_type, disease_detected, confidence, created_at
+                SELECT session_id, plant_type, disease_detected, confidence, created_at,
+                       affected_area_percent, severity
                 FROM farm_sessions
                 WHERE user_id = ?
                 ORDER BY created_at DESC
@@ -288,7 +351,9 @@ class MemoryAgent:
                     "plant_type": row[1],
                     "disease_detected": row[2],
                     "confidence": row[3],
-                    "date": row[4]
+                    "date": row[4],
+                    "affected_area_percent": row[5],
+                    "severity": row[6]
                 })
             
             return history
@@ -399,3 +464,224 @@ class MemoryAgent:
         except Exception as e:
             print(f"Error analyzing patterns: {e}")
             return {"error": str(e)}
+    
+    def save_shadow_comparison(self, comparison: Dict[str, Any]) -> bool:
+        """
+        Record one shadow-mode comparison (see ml_model/shadow.py).
+        
+        Args:
+            comparison: Row from ShadowEvaluator.compare
+            
+        Returns:
+            True if successful
+        """
+        columns = (
+            "image_hash", "user_id", "cloud_plant", "cloud_disease", "cloud_confidence",
+            "cloud_latency_ms", "local_plant", "local_disease", "local_confidence",
+            "local_latency_ms", "model_arch", "plant_match", "disease_match"
+        )
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                INSERT INTO shadow_comparisons ({', '.join(columns)})
+                VALUES ({', '.join('?' * len(columns))})
+            """, tuple(comparison.get(column) for column in columns))
+            
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"Error saving shadow comparison: {e}")
+            return False
+    
+    @staticmethod
+    def image_hash(image_path: str) -> str:
+        """SHA-256 of an image file, used as its embedding key."""
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def save_embedding(
+        self,
+        image_hash: str,
+        embedding,
+        user_id: Optional[str] = None,
+        plant_type: str = "",
+        disease_name: str = "",
+        confidence: float = 0.0,
+        model_arch: str = "",
+        session_id: Optional[int] = None
+    ) -> bool:
+        """
+        Store a local-model image embedding as a float16 blob.
+        
+        Args:
+            image_hash: SHA-256 of the image (see image_hash)
+            embedding: 1-D feature vector (numpy array or list)
+            user_id: User who uploaded the image
+            plant_type: Predicted plant
+            disease_name: Predicted disease
+            confidence: Prediction confidence
+            model_arch: Backbone that produced the embedding; only embeddings
+                from the same arch are compared
+            session_id: Diagnosis session, if already saved
+            
+        Returns:
+            True if successful
+        """
+        try:
+            import numpy as np
+            vector = np.asarray(embedding, dtype=np.float16).ravel()
+            
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT OR REPLACE INTO image_embeddings
+                (image_hash, user_id, session_id, plant_type, disease_name,
+                 confidence, model_arch, dim, embedding)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (image_hash, user_id, session_id, plant_type, disease_name,
+                  confidence, model_arch, len(vector), vector.tobytes()))
+            conn.commit()
+            conn.close()
+            return True
+        except Exception as e:
+            print(f"Error saving embedding: {e}")
+            return False
+    
+    def link_embedding_to_session(self, image_hash: str, session_id: int) -> bool:
+        """
+        Attach a stored embedding to the diagnosis session it belongs to.
+        
+        Args:
+            image_hash: SHA-256 of the image
+            session_id: Saved session
+            
+        Returns:
+            True if an embedding was updated
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE image_embeddings SET session_id = ? WHERE image_hash = ?",
+                (session_id, image_hash)
+            )
+            updated = cursor.rowcount > 0
+            conn.commit()
+            conn.close()
+            return updated
+        except Exception as e:
+            print(f"Error linking embedding: {e}")
+            return False
+    
+    def _sync_similarity_index(self):
+        """Load embeddings added since the last sync into the in-memory indexes."""
+        import numpy as np
+        from ml_model.similarity_index import EmbeddingIndex
+        
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT rowid, image_hash, model_arch, dim, embedding
+            FROM image_embeddings
+            WHERE rowid > ?
+            ORDER BY rowid
+        """, (self._similarity_synced_rowid,))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        for rowid, image_hash, model_arch, dim, blob in rows:
+            index = self._similarity_indexes.get(model_arch)
+            if index is None or index.dim != dim:
+                index = EmbeddingIndex(dim, nlist=Config.SIMILARITY_INDEX_NLIST)
+                self._similarity_indexes[model_arch] = index
+            index.add([image_hash], np.frombuffer(blob, dtype=np.float16))
+            self._similarity_synced_rowid = rowid
+        
+        # Periodic compaction: replaced rows leave tombstones behind
+        for index in self._similarity_indexes.values():
+            if index.needs_compaction:
+                index.compact()
+    
+    def has_similarity_index(self, model_arch: str = "") -> bool:
+        """Whether embeddings from model_arch have been stored to search."""
+        try:
+            with self._similarity_lock:
+                self._sync_similarity_index()
+                index = self._similarity_indexes.get(model_arch)
+                return index is not None and len(index) > 0
+        except Exception as e:
+            print(f"Error loading similarity index: {e}")
+            return False
+    
+    def find_similar_cases(
+        self,
+        embedding,
+        model_arch: str = "",
+        k: int = 3,
+        min_similarity: float = 0.85,
+        exclude_hash: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find past diagnoses (across all users) whose images look alike.
+        
+        Args:
+            embedding: Query embedding from the same model arch
+            model_arch: Backbone that produced the embedding
+            k: Maximum number of cases
+            min_similarity: Minimum cosine similarity
+            exclude_hash: Image hash to leave out (the query image itself)
+            
+        Returns:
+            List of case dictionaries, most similar first. "verified" is True
+            when the case's follow-up was completed, and "outcome" holds the
+            recorded follow-up notes.
+        """
+        try:
+            with self._similarity_lock:
+                self._sync_similarity_index()
+                index = self._similarity_indexes.get(model_arch)
+                if index is None:
+                    return []
+                matches = index.search(embedding, k + 1, min_similarity)
+            matches = [(h, score) for h, score in matches if h != exclude_hash][:k]
+            if not matches:
+                return []
+            
+            conn = sqlite3.connect(self.db_path)
+            cursor = conn.cursor()
+            placeholders = ",".join("?" * len(matches))
+            cursor.execute(f"""
+                SELECT e.image_hash, e.plant_type, e.disease_name, e.confidence,
+                       e.created_at, s.action_plan, f.notes, f.completed_at
+                FROM image_embeddings e
+                LEFT JOIN farm_sessions s ON e.session_id = s.session_id
+                LEFT JOIN follow_ups f ON f.session_id = e.session_id AND f.status = 'completed'
+                WHERE e.image_hash IN ({placeholders})
+            """, [h for h, _ in matches])
+            rows = {row[0]: row for row in cursor.fetchall()}
+            conn.close()
+            
+            cases = []
+            for image_hash, similarity in matches:
+                row = rows.get(image_hash)
+                if row is None:
+                    continue
+                cases.append({
+                    "similarity": round(similarity, 3),
+                    "plant_type": row[1],
+                    "disease_detected": row[2],
+                    "confidence": row[3],
+                    "date": row[4],
+                    "action_plan": row[5],
+                    "outcome": row[6],
+                    "verified": row[7] is not None
+                })
+            return cases
+        except Exception as e:
+            print(f"Error finding similar cases: {e}")
+            return []
@@ -85,18 +85,39 @@ Always prioritize:
         # Fetch weather data
         weather_data = await self._get_weather_data(location)
         
+        # Look-alike past cases (with verified follow-up outcomes when known)
+        similar_cases = diagnosis_data.get("similar_cases") or []
+        similar_cases_section = ""
+        if similar_cases:
+            similar_cases_section = f"""
+SIMILAR PAST CASES (images that look alike; "verified" cases have a completed follow-up):
+{json.dumps(similar_cases, indent=2, default=str)}
+
+Reuse what worked in verified cases where it fits this diagnosis.
+"""
+        
+        # Lesion area measured from the image
+        severity = diagnosis_data.get("severity") or {}
+        severity_section = ""
+        if severity:
+            severity_section = f"""
+MEASURED SEVERITY (lesion area from image segmentation):
+{severity['affected_area_percent']}% of leaf area affected ({severity['severity']})
+Scale the treatment intensity to this severity.
+"""
+        
         # Build comprehensive research prompt
         research_prompt = f"""Based on the following diagnosis, provide comprehensive treatment recommendations:
 
 DIAGNOSIS:
 {diagnosis_text}
-
+{severity_section}
 AVAILABLE TREATMENT OPTIONS:
 {json.dumps(treatment_info, indent=2)}
 
 CURRENT WEATHER:
 {json.dumps(weather_data, indent=2)}
-
+{similar_cases_section}
 Provide:
 1. **Recommended Treatment Plan** (prioritize organic first, then chemical if needed)
 2. **Application Schedule** (considering weather)
@@ -119,7 +140,10 @@ Format as structured JSON for easy parsing."""
             "weather": weather_data,
             "user_id": diagnosis_data.get("user_id"),
             "location": location,
-            "image_path": diagnosis_data.get("image_path")
+            "image_path": diagnosis_data.get("image_path"),
+            "severity": severity,
+            "image_hash": diagnosis_data.get("image_hash"),
+            "similar_cases": similar_cases
         }
         
         # Forward to Advisory Agent
@@ -3,6 +3,7 @@ Vision Agent for Plant Disease Detection
 Uses GPT-4o for image analysis and disease identification
 """
 import base64
+import time
 from io import BytesIO
 from typing import Dict, Any
 from PIL import Image
@@ -10,6 +11,7 @@ from PIL import Image
 from agent_framework import Executor, WorkflowContext, handler
 from agent_framework import ChatMessage, ChatAgent
 from config import Config
+from agents.vision_agent_ml import measure_severity
 
 
 class VisionAgent(Executor):
@@ -25,13 +27,15 @@ class VisionAgent(Executor):
     
     agent: ChatAgent
     
-    def __init__(self, chat_client, id: str = "vision_agent"):
+    def __init__(self, chat_client, id: str = "vision_agent", shadow=None):
         """
         Initialize the Vision Agent with a chat client.
         
         Args:
             chat_client: Azure OpenAI chat client configured for vision tasks
             id: Unique identifier for this executor
+            shadow: Optional ml_model.shadow.ShadowEvaluator that runs the
+                local model on the same image and records agreement
         """
         # Create a specialized agent for plant disease detection
         self.agent = chat_client.create_agent(
@@ -336,11 +340,11 @@ Response format (JSON):
     "botanical_features_observed": "detailed features that identified the plant - leaf structure, shape, edges, etc.",
     "disease_name": "specific disease identified for THIS plant type",
     "disease_confidence": 85,
-    "symptoms_observed": ["symptom1", "symptom2"],
-    "severity": "mild/moderate/severe",
-    "affected_area": "percentage of leaf area affected"
+    "symptoms_observed": ["symptom1", "symptom2"]
 }
 
+Severity and affected leaf area are measured from the image separately; do not estimate them.
+
 IMPORTANT RULES:
 - DO NOT default to Tur/Pigeon Pea - carefully examine actual leaf structure
 - Compound leaves with 3 leaflets + smooth edges = Tur
@@ -354,6 +358,7 @@ If no disease is detected, return disease_confidence 0 and disease_name as "heal
             model=Config.VISION_MODEL
         )
         super().__init__(id=id)
+        self.shadow = shadow
     
     @handler
     async def analyze_image(
@@ -374,6 +379,9 @@ If no disease is detected, return disease_confidence 0 and disease_name as "heal
         image_path = image_data.get("image_path")
         user_context = image_data.get("additional_context", "")
         
+        # Lesion area is measured locally rather than guessed by the LLM
+        severity = image_data.get("severity") or measure_severity(image_path)
+        
         # Load and encode image
         image = Image.open(image_path)
         buffered = BytesIO()
@@ -421,17 +429,31 @@ Provide detailed diagnosis in JSON format with plant identification reasoning.""
             images=[f"data:image/png;base64,{img_base64}"]
         )
         
+        # Local model runs in the background while the cloud answers
+        shadow_run = self.shadow.start(image_path) if self.shadow else None
+        
         # Run the vision agent
+        start = time.perf_counter()
         response = await self.agent.run([message])
+        cloud_latency_ms = (time.perf_counter() - start) * 1000
         diagnosis_text = response.messages[-1].text
         
+        if shadow_run is not None:
+            self.shadow.finish(shadow_run, diagnosis_text, cloud_latency_ms,
+                               image_hash=image_data.get("image_hash"),
+                               user_id=image_data.get("user_id"))
+        
         # Package the results for the next agent
         result = {
             "image_path": image_path,
             "diagnosis": diagnosis_text,
             "user_id": image_data.get("user_id"),
             "timestamp": image_data.get("timestamp"),
-            "additional_context": user_context
+            "additional_context": user_context,
+            "severity": severity,
+            # Look-alike past cases found by the coordinator (local model embeddings)
+            "image_hash": image_data.get("image_hash"),
+            "similar_cases": image_data.get("similar_cases", [])
         }
         
         # Forward to Research Agent
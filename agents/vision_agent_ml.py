@@ -3,6 +3,7 @@ Vision Agent with Local ML Model Support
 Can use either API-based vision or local trained model
 """
 import base64
+import time
 from io import BytesIO
 from typing import Dict, Any, Optional
 from PIL import Image
@@ -13,25 +14,103 @@ from agent_framework import ChatMessage, ChatAgent
 from config import Config
 
 
+def lookup_similar_cases(model, memory_agent, image_path: str, user_id: Optional[str] = None,
+                         prediction: Optional[Dict] = None) -> Dict[str, Any]:
+    """
+    Store the local-model embedding of an image and find look-alike past cases
+    
+    Args:
+        model: Inference model with supports_embeddings
+        memory_agent: MemoryAgent holding the embedding store
+        image_path: Image being diagnosed
+        user_id: User who uploaded it
+        prediction: Prediction made with return_embedding=True, if available
+        
+    Returns:
+        Dictionary with image_hash and similar_cases (JSON serializable)
+    """
+    if prediction is None or 'embedding' not in prediction:
+        prediction = model.predict(image_path, top_k=1, return_embedding=True)
+    
+    primary = prediction['primary_prediction']
+    arch = prediction['model_info'].get('arch', 'unknown')
+    image_hash = memory_agent.image_hash(image_path)
+    
+    # Nothing to search until embeddings from this arch have been stored
+    similar_cases = []
+    if memory_agent.has_similarity_index(arch):
+        similar_cases = memory_agent.find_similar_cases(
+            prediction['embedding'],
+            model_arch=arch,
+            k=Config.SIMILAR_CASES_TOP_K,
+            min_similarity=Config.SIMILAR_CASES_MIN_SIMILARITY,
+            exclude_hash=image_hash
+        )
+    memory_agent.save_embedding(
+        image_hash,
+        prediction['embedding'],
+        user_id=user_id,
+        plant_type=primary['plant'],
+        disease_name=primary['disease'],
+        confidence=primary['confidence'],
+        model_arch=arch
+    )
+    if similar_cases:
+        print(f"🔁 Found {len(similar_cases)} similar past case(s)")
+    
+    return {"image_hash": image_hash, "similar_cases": similar_cases}
+
+
+def measure_severity(image_path: str) -> Dict[str, Any]:
+    """
+    Measure lesion area on the image (colour segmentation, a few milliseconds)
+    
+    Returns:
+        Dictionary with affected_area_percent, severity and method, or an
+        empty dictionary if the image could not be analyzed
+    """
+    from ml_model.severity import estimate_severity
+    
+    try:
+        measured = estimate_severity(image_path)
+    except Exception as e:
+        print(f"⚠️ Severity estimation failed: {e}")
+        return {}
+    print(f"🍂 Lesion area: {measured['affected_area_percent']:.1f}% ({measured['severity']})")
+    return {
+        "affected_area_percent": measured['affected_area_percent'],
+        "severity": measured['severity'],
+        "method": measured['method']
+    }
+
+
 class VisionAgentML(Executor):
     """
     Vision Agent that uses local trained model for plant disease detection
     No API calls required - runs completely offline
     """
     
-    def __init__(self, model_path: Optional[str] = None, id: str = "vision_agent_ml"):
+    def __init__(self, model_path: Optional[str] = None, id: str = "vision_agent_ml",
+                 memory_agent=None):
         """
         Initialize Vision Agent with local ML model
         
         Args:
             model_path: Path to trained model checkpoint
             id: Unique identifier for this executor
+            memory_agent: MemoryAgent used for similar-case lookups (created
+                automatically when SIMILAR_CASES_ENABLED)
         """
         super().__init__(id=id)
         
+        if memory_agent is None and Config.SIMILAR_CASES_ENABLED:
+            from agents.memory_agent import MemoryAgent
+            memory_agent = MemoryAgent()
+        self.memory_agent = memory_agent
+        
         # Import inference module
         try:
-            from ml_model.inference import get_inference_model
+            from ml_model.registry import get_inference_model
             
             if model_path is None:
                 # Try default paths
@@ -75,17 +154,30 @@ class VisionAgentML(Executor):
         print(f"📸 Image: {image_path}")
         
         # Run inference
-        prediction = self.model.predict(image_path, top_k=3)
+        use_embeddings = (self.memory_agent is not None
+                          and getattr(self.model, 'supports_embeddings', False))
+        if use_embeddings:
+            prediction = self.model.predict(image_path, top_k=3, return_embedding=True)
+        else:
+            prediction = self.model.predict(image_path, top_k=3)
         
         # Format output for workflow
         primary = prediction['primary_prediction']
+        user_id = ctx.get_message_data().get("user_id")
+        similar = {"image_hash": None, "similar_cases": []}
+        if use_embeddings:
+            similar = lookup_similar_cases(self.model, self.memory_agent, image_path,
+                                           user_id, prediction)
+        
+        severity = measure_severity(image_path)
         
         # Create detailed analysis
         diagnosis = {
             "plant_type": primary['plant'],
             "disease_name": primary['disease'],
             "confidence_score": int(primary['confidence'] * 100),
-            "severity_level": self._determine_severity(primary['confidence']),
+            "severity_level": severity.get("severity", "unknown"),
+            "affected_area_percent": severity.get("affected_area_percent"),
             "visual_symptoms": self._generate_symptoms(primary['plant'], primary['disease']),
             "alternative_diagnoses": [
                 {
@@ -96,7 +188,7 @@ class VisionAgentML(Executor):
                 for pred in prediction['alternative_predictions']
             ],
             "model_info": {
-                "type": "Local CNN (ResNet50)",
+                "type": f"Local CNN ({prediction['model_info'].get('arch', 'resnet50')})",
                 "device": prediction['model_info']['device'],
                 "inference_mode": "offline"
             }
@@ -110,22 +202,16 @@ class VisionAgentML(Executor):
         return {
             "vision_analysis": diagnosis,
             "image_path": image_path,
-            "user_id": ctx.get_message_data().get("user_id"),
+            "severity": severity,
+            "image_hash": similar["image_hash"],
+            "similar_cases": similar["similar_cases"],
+            "user_id": user_id,
             "location": ctx.get_message_data().get("location", ""),
             "additional_context": ctx.get_message_data().get("additional_context", ""),
             "language": ctx.get_message_data().get("language", "en"),
             "timestamp": ctx.get_message_data().get("timestamp")
         }
     
-    def _determine_severity(self, confidence: float) -> str:
-        """Determine severity level based on confidence"""
-        if confidence > 0.9:
-            return "high"
-        elif confidence > 0.7:
-            return "moderate"
-        else:
-            return "low"
-    
     def _generate_symptoms(self, plant: str, disease: str) -> list:
         """
         Generate typical symptoms for the disease
@@ -199,9 +285,14 @@ class VisionAgentHybrid(Executor):
         # Try to load local model
         self.local_model = None
         try:
-            from ml_model.inference import get_inference_model
-            self.local_model = get_inference_model(model_path)
+            from ml_model.registry import get_inference_model
+            self.local_model = get_inference_model(model_path or Config.LOCAL_MODEL_PATH)
             print("✅ Local model loaded - will use for primary detection")
+            
+            self.confidence_threshold = self._confidence_threshold(self.local_model)
+            
+            if Config.CASCADE_FAST_MODEL_PATH:
+                self.local_model = self._build_cascade(self.local_model)
         except Exception as e:
             print(f"⚠️ Local model not available: {e}")
         
@@ -213,9 +304,49 @@ class VisionAgentHybrid(Executor):
             )
             print("✅ API fallback configured")
     
+    @staticmethod
+    def _confidence_threshold(model) -> float:
+        """Escalation threshold: config override, calibrated value, or 0.6"""
+        if Config.LOCAL_CONFIDENCE_THRESHOLD is not None:
+            return Config.LOCAL_CONFIDENCE_THRESHOLD
+        calibration = getattr(model, 'calibration', None) or {}
+        if 'escalation_threshold' in calibration:
+            print(f"🎯 Calibrated escalation threshold {calibration['escalation_threshold']:.3f} "
+                  f"(~{calibration['escalation_rate']*100:.0f}% of validation images to the cloud)")
+            return calibration['escalation_threshold']
+        return 0.6
+    
+    def _build_cascade(self, full_model):
+        """Put a cheap first-tier model in front of the full local model"""
+        from ml_model.inference import (CASCADE_THRESHOLDS_FILE, CascadeInference,
+                                        PlantDiseaseInference, load_cascade_thresholds)
+        
+        fast_model = PlantDiseaseInference(
+            Config.CASCADE_FAST_MODEL_PATH,
+            image_size=Config.CASCADE_FAST_IMAGE_SIZE
+        )
+        # Thresholds: config override, calibrated value, or CascadeInference default
+        thresholds_path = Config.CASCADE_THRESHOLDS_PATH or (
+            Path(Config.LOCAL_MODEL_PATH or "ml_model/checkpoints/best_model.pth").parent
+            / CASCADE_THRESHOLDS_FILE
+        )
+        thresholds = load_cascade_thresholds(thresholds_path)
+        if thresholds:
+            print(f"🎯 Calibrated cascade thresholds from {thresholds_path}")
+        overrides = {
+            'fast_confidence': Config.CASCADE_FAST_CONFIDENCE,
+            'fast_margin': Config.CASCADE_FAST_MARGIN,
+            'full_confidence': Config.CASCADE_FULL_CONFIDENCE,
+            'full_margin': Config.CASCADE_FULL_MARGIN,
+        }
+        thresholds.update({name: value for name, value in overrides.items() if value is not None})
+        print("✅ Cascade enabled - small model first, full model when uncertain")
+        return CascadeInference(fast_model, full_model, **thresholds)
+    
     @handler
     async def process(self, ctx: WorkflowContext) -> Dict[str, Any]:
         """Process with local model first, API as fallback"""
+        escalated = False
         
         # Try local model first
         if self.local_model:
@@ -226,8 +357,17 @@ class VisionAgentHybrid(Executor):
                 
                 primary = prediction['primary_prediction']
                 
+                if 'cascade' in prediction:
+                    # Cascade already applied its calibrated thresholds
+                    escalated = prediction['cascade']['escalate_to_cloud']
+                    if not escalated:
+                        print(f"✅ Served by {prediction['cascade']['tier']} tier "
+                              f"({primary['confidence']*100:.1f}%)")
+                        return self._format_local_result(prediction, ctx)
+                    print("⚠️ Cascade uncertain - trying API fallback")
+                
                 # If confidence is good, use local model result
-                if primary['confidence'] > 0.6:
+                elif primary['confidence'] > self.confidence_threshold:
                     print(f"✅ Local model confident ({primary['confidence']*100:.1f}%)")
                     return self._format_local_result(prediction, ctx)
                 else:
@@ -239,23 +379,34 @@ class VisionAgentHybrid(Executor):
         # Fallback to API
         if self.api_agent:
             print("🌐 Using API fallback...")
-            return await self._api_fallback(ctx)
+            start = time.perf_counter()
+            try:
+                return await self._api_fallback(ctx)
+            finally:
+                if escalated:
+                    self.local_model.record_cloud_latency(
+                        (time.perf_counter() - start) * 1000
+                    )
         
         raise RuntimeError("Neither local model nor API available")
     
     def _format_local_result(self, prediction: Dict, ctx: WorkflowContext) -> Dict:
         """Format local model result for workflow"""
         primary = prediction['primary_prediction']
+        image_path = ctx.get_message_data().get("image_path")
+        severity = measure_severity(image_path)
         
         return {
             "vision_analysis": {
                 "plant_type": primary['plant'],
                 "disease_name": primary['disease'],
                 "confidence_score": int(primary['confidence'] * 100),
-                "severity_level": "moderate",
+                "severity_level": severity.get("severity", "unknown"),
+                "affected_area_percent": severity.get("affected_area_percent"),
                 "detection_method": "local_model"
             },
-            "image_path": ctx.get_message_data().get("image_path"),
+            "image_path": image_path,
+            "severity": severity,
             "user_id": ctx.get_message_data().get("user_id"),
             "location": ctx.get_message_data().get("location", ""),
             "language": ctx.get_message_data().get("language", "en")
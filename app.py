@@ -49,6 +49,15 @@ def get_coordinator():
         coordinator = KrishiSahayakCoordinator()
     return coordinator
 
+# Load the local model up front so gunicorn workers forked from a preloaded
+# master share its (memory-mapped) weights instead of each loading a copy
+if Config.PRELOAD_LOCAL_MODEL:
+    try:
+        from ml_model.registry import get_inference_model
+        get_inference_model(Config.LOCAL_MODEL_PATH)
+    except Exception as e:
+        print(f"⚠️ Could not preload local model: {e}")
+
 @app.context_processor
 def inject_language():
     """Make language and translation function available in all templates"""
@@ -235,6 +244,96 @@ def get_session(session_id):
         app.logger.error(f"Error in get_session route: {str(e)}")
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
+@app.route('/api/scan_video', methods=['POST'])
+def scan_video():
+    """Scan a plot walk-through video with the local model"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    # Videos are larger than the image upload limit
+    max_bytes = Config.VIDEO_MAX_UPLOAD_MB * 1024 * 1024
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'success': False,
+                        'error': f'Video larger than {Config.VIDEO_MAX_UPLOAD_MB} MB'}), 413
+    try:
+        # Per-request limit (Flask >= 3.1); older versions keep MAX_CONTENT_LENGTH
+        request.max_content_length = max_bytes
+    except AttributeError:
+        pass
+    
+    from ml_model.video_scan import VIDEO_EXTENSIONS
+    
+    if 'video' not in request.files:
+        return jsonify({'success': False, 'error': 'No video uploaded'}), 400
+    
+    file = request.files['video']
+    if file.filename == '':
+        return jsonify({'success': False, 'error': 'No file selected'}), 400
+    if '.' not in file.filename or file.filename.rsplit('.', 1)[1].lower() not in VIDEO_EXTENSIONS:
+        return jsonify({'success': False, 'error': 'Invalid file type'}), 400
+    
+    filename = secure_filename(file.filename)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{session['user_id']}_{timestamp}_{filename}")
+    file.save(filepath)
+    
+    try:
+        from ml_model.registry import get_inference_model
+        from ml_model.video_scan import scan_video as run_video_scan, video_duration
+        
+        # The scan runs inside the request; long videos would tie up a worker
+        # past the gunicorn timeout
+        duration = video_duration(filepath)
+        if duration is not None and duration > Config.VIDEO_MAX_DURATION_S:
+            return jsonify({'success': False,
+                            'error': f'Video is {duration:.0f} s long; the limit is '
+                                     f'{Config.VIDEO_MAX_DURATION_S:.0f} s'}), 413
+        
+        summary = run_video_scan(
+            filepath,
+            get_inference_model(Config.LOCAL_MODEL_PATH),
+            plot_id=request.form.get('plot_id') or None,
+            sample_fps=Config.VIDEO_SAMPLE_FPS,
+            # Also bounds videos whose container reports no duration
+            max_duration_s=Config.VIDEO_MAX_DURATION_S
+        )
+        return jsonify({'success': True, 'summary': summary})
+    except Exception as e:
+        app.logger.error(f"Error scanning video: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        # Only the summary is kept; walk-through videos are large
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+def _is_admin_request():
+    """Check the admin token header for model management endpoints"""
+    return bool(Config.ADMIN_TOKEN) and request.headers.get('X-Admin-Token') == Config.ADMIN_TOKEN
+
+@app.route('/api/admin/models')
+def list_models():
+    """List registered model versions"""
+    if not _is_admin_request():
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    from ml_model.registry import get_registry
+    return jsonify({'models': get_registry().list_models()})
+
+@app.route('/api/admin/models/reload', methods=['POST'])
+def reload_models():
+    """Hot swap models to the versions active in the manifest"""
+    if not _is_admin_request():
+        return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        from ml_model.registry import get_registry
+        model_id = (request.json or {}).get('model_id') if request.is_json else None
+        active = get_registry().reload(model_id)
+        return jsonify({'success': True, 'active': active})
+    except Exception as e:
+        app.logger.error(f"Error reloading models: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
@@ -38,6 +38,49 @@ class Config:
     TEXT_MODEL = os.getenv("TEXT_MODEL", "gemini-2.5-flash")
     DEPLOYMENT_NAME = os.getenv("DEPLOYMENT_NAME", "gemini-2.5-flash")
     
+    # Local ML Model
+    LOCAL_MODEL_PATH = os.getenv("LOCAL_MODEL_PATH")
+    # Load the local model at import time (in the gunicorn master with preload_app)
+    PRELOAD_LOCAL_MODEL = os.getenv("PRELOAD_LOCAL_MODEL", "false").lower() == "true"
+    # Hybrid agent: escalate to the cloud below this local confidence. When
+    # unset, the threshold stored by ml_model/calibration.py is used (0.6 if
+    # the model was never calibrated)
+    LOCAL_CONFIDENCE_THRESHOLD = (float(os.getenv("LOCAL_CONFIDENCE_THRESHOLD"))
+                                  if os.getenv("LOCAL_CONFIDENCE_THRESHOLD") else None)
+    # Token required by the model admin endpoints (disabled when unset)
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    # Optional cascade: cheap model first, full model / cloud only when uncertain
+    CASCADE_FAST_MODEL_PATH = os.getenv("CASCADE_FAST_MODEL_PATH")
+    CASCADE_FAST_IMAGE_SIZE = int(os.getenv("CASCADE_FAST_IMAGE_SIZE", "224"))
+    # Thresholds fitted by `ml_model/inference.py --calibrate-dir` (default:
+    # cascade_thresholds.json next to the local model). The variables below
+    # override them when set; the built-in defaults apply when neither exists
+    CASCADE_THRESHOLDS_PATH = os.getenv("CASCADE_THRESHOLDS_PATH")
+    CASCADE_FAST_CONFIDENCE = (float(os.getenv("CASCADE_FAST_CONFIDENCE"))
+                               if os.getenv("CASCADE_FAST_CONFIDENCE") else None)
+    CASCADE_FAST_MARGIN = (float(os.getenv("CASCADE_FAST_MARGIN"))
+                           if os.getenv("CASCADE_FAST_MARGIN") else None)
+    CASCADE_FULL_CONFIDENCE = (float(os.getenv("CASCADE_FULL_CONFIDENCE"))
+                               if os.getenv("CASCADE_FULL_CONFIDENCE") else None)
+    CASCADE_FULL_MARGIN = (float(os.getenv("CASCADE_FULL_MARGIN"))
+                           if os.getenv("CASCADE_FULL_MARGIN") else None)
+    # Shadow mode: run the local model next to cloud vision and record
+    # agreement/latency (report: python ml_model/shadow.py)
+    SHADOW_MODE_ENABLED = os.getenv("SHADOW_MODE_ENABLED", "false").lower() == "true"
+    SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "4"))
+    # Similar past cases: local-model embeddings indexed in the memory DB
+    # (opt-in: every diagnosis then also runs the local model)
+    SIMILAR_CASES_ENABLED = os.getenv("SIMILAR_CASES_ENABLED", "false").lower() == "true"
+    SIMILAR_CASES_TOP_K = int(os.getenv("SIMILAR_CASES_TOP_K", "3"))
+    SIMILAR_CASES_MIN_SIMILARITY = float(os.getenv("SIMILAR_CASES_MIN_SIMILARITY", "0.85"))
+    # IVF partitions for the similarity index (0 = exact search)
+    SIMILARITY_INDEX_NLIST = int(os.getenv("SIMILARITY_INDEX_NLIST", "0"))
+    # Field video scanning
+    VIDEO_MAX_UPLOAD_MB = int(os.getenv("VIDEO_MAX_UPLOAD_MB", "200"))
+    VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "3"))
+    # Longest video scanned inside a web request (keeps it within the worker timeout)
+    VIDEO_MAX_DURATION_S = float(os.getenv("VIDEO_MAX_DURATION_S", "120"))
+    
     # Application Settings
     DEBUG = os.getenv("DEBUG", "false").lower() == "true"
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -0,0 +1,38 @@
+"""
+Gunicorn configuration for AI Krishi Sahayak
+Loaded automatically by gunicorn from the working directory
+"""
+import os
+import time
+
+# Load the app (and the local ML model when PRELOAD_LOCAL_MODEL=true) in the
+# master before forking, so workers share the model weights copy-on-write
+preload_app = os.environ.get('PRELOAD_LOCAL_MODEL', 'false').lower() == 'true'
+
+_master_start = time.perf_counter()
+
+
+def when_ready(server):
+    """Report master memory once the app is loaded"""
+    from ml_model.resource_usage import format_memory_usage, get_memory_usage
+    server.log.info(
+        f"Master ready in {time.perf_counter() - _master_start:.1f}s "
+        f"(preload_app={preload_app}) | {format_memory_usage(get_memory_usage())}"
+    )
+
+
+def post_fork(server, worker):
+    """Limit torch threads per worker so workers don't oversubscribe the CPU"""
+    threads = os.environ.get('TORCH_NUM_THREADS')
+    if threads:
+        try:
+            import torch
+            torch.set_num_threads(int(threads))
+        except ImportError:
+            pass
+
+
+def post_worker_init(worker):
+    """Per-worker startup memory report (PSS shows the shared savings)"""
+    from ml_model.resource_usage import format_memory_usage, get_memory_usage
+    worker.log.info(f"Worker ready | {format_memory_usage(get_memory_usage())}")
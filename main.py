@@ -46,14 +46,45 @@ class KrishiSahayakCoordinator:
             raise ValueError("No API credentials found. Set GEMINI_API_KEY, GITHUB_TOKEN or AZURE_OPENAI_KEY in .env")
         
         # Initialize agents
-        self.vision_agent = VisionAgent(self.chat_client)
+        self.memory_agent = MemoryAgent()
+        self.similarity_model = self._load_similarity_model()
+        self.shadow = self._load_shadow_evaluator()
+        self.vision_agent = VisionAgent(self.chat_client, shadow=self.shadow)
         self.research_agent = ResearchAgent(self.chat_client)
         self.advisory_agent = AdvisoryAgent(self.chat_client)
-        self.memory_agent = MemoryAgent()
         
         # Build the workflow
         self.workflow = self._build_workflow()
     
+    def _load_similarity_model(self):
+        """Load the local model for similar-case embeddings, if available."""
+        if not Config.SIMILAR_CASES_ENABLED:
+            return None
+        try:
+            from ml_model.registry import get_inference_model
+            model = get_inference_model(Config.LOCAL_MODEL_PATH)
+            if getattr(model, 'supports_embeddings', False):
+                print("✅ Similar-case retrieval enabled")
+                return model
+        except Exception as e:
+            print(f"ℹ️ Similar-case retrieval disabled (no local model: {e})")
+        return None
+    
+    def _load_shadow_evaluator(self):
+        """Run the local model in shadow mode next to cloud vision, if enabled."""
+        if not Config.SHADOW_MODE_ENABLED:
+            return None
+        try:
+            from ml_model.registry import get_inference_model
+            from ml_model.shadow import ShadowEvaluator
+            model = self.similarity_model or get_inference_model(Config.LOCAL_MODEL_PATH)
+        except Exception as e:
+            print(f"ℹ️ Shadow mode disabled (no local model: {e})")
+            return None
+        print("✅ Shadow mode enabled - local model compared against cloud vision")
+        return ShadowEvaluator(model, self.memory_agent.save_shadow_comparison,
+                               max_pending=Config.SHADOW_MAX_PENDING)
+    
     def _init_gemini_client(self) -> OpenAIChatClient:
         """Initialize Gemini client using OpenAI-compatible interface with proper timeout settings."""
         # Create OpenAIChatClient with timeout configuration
@@ -180,6 +211,16 @@ class KrishiSahayakCoordinator:
             "timestamp": datetime.now().isoformat()
         }
         
+        # Attach look-alike past cases found with local model embeddings
+        if self.similarity_model is not None:
+            try:
+                from agents.vision_agent_ml import lookup_similar_cases
+                input_data.update(lookup_similar_cases(
+                    self.similarity_model, self.memory_agent, image_path, user_id
+                ))
+            except Exception as e:
+                print(f"⚠️ Similar-case lookup failed: {e}")
+        
         print("🌱 Starting AI Krishi Sahayak diagnosis...")
         print(f"📸 Analyzing image: {image_path}")
         print(f"🌐 Language: {language}")
@@ -223,6 +264,8 @@ class KrishiSahayakCoordinator:
                 # Fallback if not valid JSON
                 pass
             
+            severity = output.get("severity") or {}
+            
             # Save session
             session_id = self.memory_agent.save_session(
                 user_id=output.get("user_id"),
@@ -231,9 +274,15 @@ class KrishiSahayakCoordinator:
                 disease_detected=disease_name,
                 confidence=confidence,
                 diagnosis_json=diagnosis_text,
-                action_plan=output.get("action_plan", "")
+                action_plan=output.get("action_plan", ""),
+                affected_area_percent=severity.get("affected_area_percent"),
+                severity=severity.get("severity")
             )
             
+            # Link the image embedding so future look-alike cases see this outcome
+            if session_id and output.get("image_hash"):
+                self.memory_agent.link_embedding_to_session(output["image_hash"], session_id)
+            
             # Schedule follow-up
             if session_id and output.get("follow_up_required"):
                 follow_up_days = output.get("follow_up_days", 2)
@@ -0,0 +1,149 @@
+"""
+Model registry for plant disease classification backbones
+Every variant shares the same classification head so checkpoints differ
+only in the backbone, which is recorded in the checkpoint as "arch"
+"""
+import os
+import pickle
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple
+
+import torch
+import torch.nn as nn
+from torchvision import models
+
+DEFAULT_ARCH = 'resnet50'
+
+
+class ArchSpec(NamedTuple):
+    """How to build a backbone and where its classifier lives"""
+    builder: Callable
+    head_attr: str          # attribute on the torchvision model holding the classifier
+    num_features: int       # size of the pooled feature vector fed to the head
+    family: str             # 'resnet' or 'mobilenet' (features -> avgpool -> classifier)
+
+
+ARCHITECTURES: Dict[str, ArchSpec] = {
+    'resnet18': ArchSpec(models.resnet18, 'fc', 512, 'resnet'),
+    'resnet50': ArchSpec(models.resnet50, 'fc', 2048, 'resnet'),
+    'mobilenet_v3_small': ArchSpec(models.mobilenet_v3_small, 'classifier', 576, 'mobilenet'),
+    'mobilenet_v3_large': ArchSpec(models.mobilenet_v3_large, 'classifier', 960, 'mobilenet'),
+    'efficientnet_b0': ArchSpec(models.efficientnet_b0, 'classifier', 1280, 'mobilenet'),
+}
+
+
+def build_head(num_features: int, num_classes: int) -> nn.Sequential:
+    """Classification head shared by every backbone"""
+    return nn.Sequential(
+        nn.Dropout(0.5),
+        nn.Linear(num_features, 512),
+        nn.ReLU(),
+        nn.Dropout(0.3),
+        nn.Linear(512, num_classes)
+    )
+
+
+class PlantDiseaseModel(nn.Module):
+    """CNN model for plant disease classification"""
+
+    def __init__(self, num_classes, pretrained=True, arch=DEFAULT_ARCH):
+        super(PlantDiseaseModel, self).__init__()
+
+        if arch not in ARCHITECTURES:
+            raise ValueError(
+                f"Unknown architecture '{arch}'. Available: {', '.join(sorted(ARCHITECTURES))}"
+            )
+
+        self.arch = arch
+        self.spec = ARCHITECTURES[arch]
+        self.backbone = self.spec.builder(weights='DEFAULT' if pretrained else None)
+
+        # Replace final classifier for our number of classes
+        setattr(self.backbone, self.spec.head_attr,
+                build_head(self.spec.num_features, num_classes))
+
+    @property
+    def head(self) -> nn.Module:
+        """The classification head (Dropout -> Linear -> ReLU -> Dropout -> Linear)"""
+        return getattr(self.backbone, self.spec.head_attr)
+
+    def forward_features(self, x):
+        """Pooled backbone features, i.e. the input of the classification head"""
+        b = self.backbone
+        if self.spec.family == 'resnet':
+            x = b.maxpool(b.relu(b.bn1(b.conv1(x))))
+            x = b.layer4(b.layer3(b.layer2(b.layer1(x))))
+        else:
+            x = b.features(x)
+        return torch.flatten(b.avgpool(x), 1)
+
+    def forward(self, x):
+        return self.backbone(x)
+
+
+def load_checkpoint(model_path, map_location='cpu', mmap: bool = True) -> Dict:
+    """
+    Load a checkpoint, memory-mapping tensor storage when possible
+    
+    With mmap the weights stay in the page cache and are shared by every
+    process that loads the same file (and by forked workers) instead of
+    each process holding a private copy.
+    """
+    if mmap and str(map_location) == 'cpu':
+        try:
+            return torch.load(model_path, map_location='cpu', mmap=True, weights_only=True)
+        except (TypeError, RuntimeError, pickle.UnpicklingError) as e:
+            # torch < 2.1, legacy (non-zip) checkpoint or non-tensor payload
+            print(f"⚠️ Memory-mapped load unavailable ({e}); using regular torch.load")
+    return torch.load(model_path, map_location=map_location)
+
+
+def save_checkpoint(checkpoint: Dict, path) -> Path:
+    """
+    Write a checkpoint atomically (temp file + rename)
+    
+    A crash mid-write leaves the previous file intact instead of a
+    truncated checkpoint.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_checkpoint_model(checkpoint: Dict, num_classes: int,
+                          share_memory: bool = False) -> PlantDiseaseModel:
+    """
+    Build the architecture recorded in a checkpoint and load its weights
+    
+    Checkpoints without an "arch" entry are treated as ResNet50, and
+    state dicts saved from a bare torchvision model (no "backbone." prefix)
+    are accepted as well.
+    
+    Args:
+        checkpoint: Loaded checkpoint dictionary
+        num_classes: Number of output classes
+        share_memory: Build the model on the meta device and adopt the
+            checkpoint tensors as parameters instead of copying them, so
+            memory-mapped weights stay shared (torch >= 2.1; older
+            versions copy the weights into a regular model)
+    """
+    arch = checkpoint.get('arch', DEFAULT_ARCH)
+    state_dict = checkpoint['model_state_dict']
+    if not any(k.startswith('backbone.') for k in state_dict):
+        state_dict = {f'backbone.{k}': v for k, v in state_dict.items()}
+    
+    if share_memory:
+        with torch.device('meta'):
+            model = PlantDiseaseModel(num_classes=num_classes, pretrained=False, arch=arch)
+        try:
+            model.load_state_dict(state_dict, assign=True)
+            return model
+        except TypeError as e:
+            # torch < 2.1 has no assign=True; copy the weights instead
+            print(f"⚠️ Shared-memory weights unavailable ({e}); copying weights")
+    
+    model = PlantDiseaseModel(num_classes=num_classes, pretrained=False, arch=arch)
+    model.load_state_dict(state_dict)
+    return model
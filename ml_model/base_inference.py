@@ -0,0 +1,271 @@
+"""
+Backend-independent parts of the plant disease inference interface
+Shared by the PyTorch and ONNX Runtime implementations
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ml_model.preprocessing import IMAGE_SIZE, load_batch
+
+
+class BaseInference:
+    """
+    Common behaviour for every inference backend.
+
+    Subclasses load a model and implement ``predict``; this class handles
+    the class mapping, result formatting and disease descriptions so that
+    every backend returns exactly the same output structure.
+    """
+
+    backend = "base"
+    image_size = IMAGE_SIZE
+    # Whether predict(..., return_embedding=True) is available
+    supports_embeddings = False
+    # Whether predict_logits is available (pre-softmax model outputs)
+    supports_logits = False
+    # Softmax temperature fitted on validation data (see ml_model/calibration.py)
+    temperature = 1.0
+    # Calibration results stored with the model (escalation threshold,
+    # confidence bands), if it was calibrated
+    calibration = None
+
+    def _load_class_mapping(self, model_path: str, class_mapping_path: Optional[str] = None):
+        """Load class names and index mapping stored next to the model"""
+        if class_mapping_path is None:
+            class_mapping_path = Path(model_path).parent / 'class_mapping.json'
+
+        with open(class_mapping_path, 'r') as f:
+            mapping = json.load(f)
+            self.classes = mapping['classes']
+            self.class_to_idx = mapping['class_to_idx']
+            self.idx_to_class = {v: k for k, v in self.class_to_idx.items()}
+
+    def _format_prediction(self, probabilities: Sequence[float], top_k: int,
+                           original_size, device: str) -> Dict:
+        """
+        Build the prediction dictionary from a vector of class probabilities
+
+        Args:
+            probabilities: Softmax probabilities for a single image
+            top_k: Number of top predictions to return
+            original_size: (width, height) of the input image
+            device: Device the model ran on
+
+        Returns:
+            Dictionary with prediction results
+        """
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        top_k = min(top_k, len(probabilities))
+        top_indices = np.argsort(-probabilities, kind='stable')[:top_k]
+
+        predictions = []
+        for idx in top_indices:
+            prob = float(probabilities[idx])
+            class_name = self.idx_to_class[int(idx)]
+            disease_info = self._parse_class_name(class_name)
+
+            predictions.append({
+                'disease': disease_info['disease'],
+                'plant': disease_info['plant'],
+                'confidence': prob,
+                'confidence_percent': f"{prob * 100:.2f}%"
+            })
+
+        # Primary prediction
+        primary = predictions[0]
+
+        return {
+            'primary_prediction': {
+                'plant': primary['plant'],
+                'disease': primary['disease'],
+                'confidence': primary['confidence'],
+                'severity': self._estimate_severity(primary['confidence'])
+            },
+            'alternative_predictions': predictions[1:],
+            'all_predictions': predictions,
+            'model_info': {
+                'device': device,
+                'backend': self.backend,
+                'arch': getattr(self, 'arch', 'unknown'),
+                'num_classes': len(self.classes),
+                'image_size': original_size
+            }
+        }
+
+    def _parse_class_name(self, class_name: str) -> Dict[str, str]:
+        """
+        Parse class name into plant and disease
+        Format: "Plant___Disease" (e.g., "Tomato___Early_Blight")
+        """
+        parts = class_name.split('___')
+        if len(parts) == 2:
+            plant = parts[0].replace('_', ' ')
+            disease = parts[1].replace('_', ' ')
+        else:
+            plant = class_name.replace('_', ' ')
+            disease = "Unknown"
+
+        return {
+            'plant': plant,
+            'disease': disease,
+            'full_name': class_name
+        }
+
+    def _estimate_severity(self, confidence: float) -> str:
+        """
+        Describe how far the prediction can be trusted
+
+        Calibrated models use the confidences that reached 95% / 80%
+        validation accuracy; otherwise fixed 0.9 / 0.7 cutoffs.
+        """
+        bands = (self.calibration or {}).get('confidence_bands', {})
+        if confidence > bands.get('high', 0.9):
+            return "High confidence detection - Immediate action recommended"
+        elif confidence > bands.get('moderate', 0.7):
+            return "Moderate confidence - Monitor closely"
+        else:
+            return "Low confidence - Consider consulting expert"
+
+    def get_disease_description(self, disease_name: str) -> Dict[str, str]:
+        """
+        Get detailed description of disease
+        This is a basic implementation - can be enhanced with a knowledge base
+        """
+        # Load disease knowledge base
+        knowledge_base_path = Path(__file__).parent / 'disease_knowledge.json'
+
+        if knowledge_base_path.exists():
+            with open(knowledge_base_path, 'r') as f:
+                knowledge = json.load(f)
+                return knowledge.get(disease_name, {
+                    'name': disease_name,
+                    'description': 'Description not available',
+                    'treatment': 'Consult agricultural expert',
+                    'prevention': 'Follow general plant health practices'
+                })
+
+        return {
+            'name': disease_name,
+            'description': 'Description not available',
+            'treatment': 'Consult agricultural expert',
+            'prevention': 'Follow general plant health practices'
+        }
+
+    def _probabilities(self, batch: np.ndarray) -> np.ndarray:
+        """Class probabilities for a preprocessed NCHW float32 batch"""
+        raise NotImplementedError
+
+    def predict_probabilities(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Raw class probabilities for a preprocessed batch
+
+        Args:
+            batch: NCHW float32 array (see preprocessing.normalize_batch)
+
+        Returns:
+            (N, num_classes) array indexed like self.classes
+        """
+        return self._probabilities(batch)
+
+    def predict_logits(self, batch: np.ndarray) -> np.ndarray:
+        """
+        Uncalibrated logits (before temperature and softmax) for a preprocessed batch
+
+        Args:
+            batch: NCHW float32 array (see preprocessing.normalize_batch)
+
+        Returns:
+            (N, num_classes) float32 array indexed like self.classes
+        """
+        raise NotImplementedError(f"The {self.backend} backend does not expose logits")
+
+    def _probabilities_and_embeddings(self, batch: np.ndarray):
+        """Class probabilities and penultimate-layer embeddings for a batch"""
+        raise NotImplementedError(f"The {self.backend} backend does not expose embeddings")
+
+    def predict_preprocessed(self, batch: np.ndarray, original_sizes,
+                             top_k: int = 3, return_embedding: bool = False) -> List[Dict]:
+        """
+        Predict diseases for an already preprocessed batch
+
+        Args:
+            batch: NCHW float32 array (see preprocessing.normalize_batch)
+            original_sizes: (width, height) of each source image
+            top_k: Number of top predictions per image
+            return_embedding: Add the penultimate-layer feature vector
+                (float32 numpy array) as result['embedding']
+
+        Returns:
+            List of prediction dictionaries
+        """
+        embeddings = None
+        if return_embedding:
+            probabilities, embeddings = self._probabilities_and_embeddings(batch)
+        else:
+            probabilities = self._probabilities(batch)
+
+        results = []
+        for i, (row, size) in enumerate(zip(probabilities, original_sizes)):
+            result = self._format_prediction(row, top_k, size, str(self.device))
+            if embeddings is not None:
+                result['embedding'] = embeddings[i]
+            results.append(result)
+        return results
+
+    def _predict_paths(self, image_paths: List[str], top_k: int = 3,
+                       return_embedding: bool = False) -> List[Dict]:
+        """
+        Batched predict/batch_predict for backends implementing predict_preprocessed
+
+        All readable images are decoded as uint8, stacked, normalized once
+        and run in a single forward pass; unreadable ones get an error entry.
+        """
+        batch, sizes, positions, errors = load_batch(image_paths, self.image_size)
+
+        results = [None] * len(image_paths)
+        for i, error in errors.items():
+            results[i] = {'image_path': image_paths[i], 'status': 'error', 'error': error}
+
+        if positions:
+            # Only backends with supports_embeddings take the flag
+            kwargs = {'return_embedding': True} if return_embedding else {}
+            predictions = self.predict_preprocessed(batch, sizes, top_k, **kwargs)
+            for prediction, i in zip(predictions, positions):
+                prediction['image_path'] = image_paths[i]
+                prediction['status'] = 'success'
+                results[i] = prediction
+
+        return results
+
+    def predict(self, image_path: str, top_k: int = 3) -> Dict:
+        raise NotImplementedError
+
+    def batch_predict(self, image_paths: List[str], top_k: int = 3) -> List[Dict]:
+        """
+        Predict diseases for multiple images
+
+        Args:
+            image_paths: List of image paths
+            top_k: Number of top predictions per image
+
+        Returns:
+            List of prediction dictionaries
+        """
+        results = []
+        for image_path in image_paths:
+            try:
+                result = self.predict(image_path, top_k)
+                result['image_path'] = image_path
+                result['status'] = 'success'
+                results.append(result)
+            except Exception as e:
+                results.append({
+                    'image_path': image_path,
+                    'status': 'error',
+                    'error': str(e)
+                })
+
+        return results
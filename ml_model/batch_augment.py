@@ -0,0 +1,148 @@
+"""
+Vectorized batch-level data augmentation on tensors
+Replaces the per-image PIL transforms of get_transforms() (horizontal flip,
+rotation, colour jitter) with a few tensor ops over the whole batch, run
+after collation in the training process. DataLoader workers then only
+decode and resize (or slice the memory-mapped cache), and collate uint8.
+
+    flips      boolean-mask indexing, or folded into the rotation matrices
+    rotation   one affine_grid/grid_sample call with a per-image matrix
+    jitter     per-image factors broadcast into one batched 3x3 colour matrix
+"""
+import math
+from typing import Optional
+
+import torch
+import torch.nn.functional as F
+
+from ml_model.preprocessing import IMAGENET_MEAN, IMAGENET_STD
+
+# ITU-R 601 luma weights, as used by torchvision's rgb_to_grayscale
+_LUMA = (0.299, 0.587, 0.114)
+
+
+def to_float_nchw(batch: torch.Tensor) -> torch.Tensor:
+    """uint8 NHWC batch -> float32 NCHW in [0, 1]; float NCHW batches pass through"""
+    if batch.dtype == torch.uint8:
+        return batch.permute(0, 3, 1, 2).float().div_(255.0)
+    return batch
+
+
+class BatchAugment:
+    """
+    Random flip, rotation and colour jitter for a whole batch, then normalization
+
+    Matches get_transforms()'s training augmentation (without the resize,
+    which the loader already did): RandomHorizontalFlip(), RandomRotation(15)
+    with black fill and ColorJitter(0.2, 0.2, 0.2). Rotation uses bilinear
+    sampling instead of nearest. Random draws come from the global torch
+    RNG (or ``generator``), so they are covered by seeding and resume.
+    """
+
+    def __init__(self, flip_p: float = 0.5, degrees: float = 15.0,
+                 brightness: float = 0.2, contrast: float = 0.2, saturation: float = 0.2,
+                 normalize: bool = True, generator: Optional[torch.Generator] = None):
+        """
+        Initialize augmentation
+
+        Args:
+            flip_p: Probability of a horizontal flip per image
+            degrees: Rotation angle range (-degrees, +degrees)
+            brightness, contrast, saturation: Jitter strength; factors are
+                drawn uniformly from [1 - value, 1 + value] per image
+            normalize: Apply ImageNet mean/std normalization at the end
+            generator: Optional RNG for reproducible draws
+        """
+        self.flip_p = flip_p
+        self.degrees = degrees
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.normalize = normalize
+        self.generator = generator
+
+    def _uniform(self, n: int, low: float, high: float, device) -> torch.Tensor:
+        return torch.rand(n, generator=self.generator, device=device) * (high - low) + low
+
+    def _flip_mask(self, n: int, device) -> torch.Tensor:
+        return torch.rand(n, generator=self.generator, device=device) < self.flip_p
+
+    def flip(self, x: torch.Tensor) -> torch.Tensor:
+        """Mirror a random subset in place (only the selected images are copied)"""
+        selected = self._flip_mask(x.shape[0], x.device)
+        x[selected] = x[selected].flip(-1)
+        return x
+
+    def rotate(self, x: torch.Tensor, flip: Optional[torch.Tensor] = None) -> torch.Tensor:
+        """
+        Rotate every image by its own random angle in one grid_sample call
+
+        A flip mask is folded into the same matrices (mirrored x axis), so
+        flipped images cost nothing extra.
+        """
+        n = x.shape[0]
+        angle = self._uniform(n, -self.degrees, self.degrees, x.device) * (math.pi / 180.0)
+        cos, sin = torch.cos(angle), torch.sin(angle)
+        mirror = torch.ones_like(angle) if flip is None else 1.0 - 2.0 * flip.float()
+        zero = torch.zeros_like(angle)
+        # Output -> input sampling matrix in normalized [-1, 1] coordinates:
+        # rotation about the image centre, then the optional mirror
+        theta = torch.stack([
+            torch.stack([cos * mirror, -sin, zero], dim=1),
+            torch.stack([sin * mirror, cos, zero], dim=1),
+        ], dim=1)
+        grid = F.affine_grid(theta, list(x.shape), align_corners=False)
+        return F.grid_sample(x, grid, mode='bilinear', padding_mode='zeros', align_corners=False)
+
+    def jitter(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        Brightness, contrast and saturation as one per-image colour matrix
+
+        brightness b:  x -> b x
+        contrast c:    x -> c x + (1 - c) mean(gray)
+        saturation s:  x -> s x + (1 - s) gray = S x,  S = s I + (1 - s) 1 luma^T
+        All three are linear and S maps a grey level to itself, so the chain
+        is x -> c b S x + (1 - c) b mean(gray(x)): one batched 3x3 matmul and
+        an offset. It is clamped once at the end instead of after each step,
+        which only differs where brightness pushed highlights past 1.0.
+        """
+        n = x.shape[0]
+        ones = torch.ones(n, device=x.device)
+        b = self._uniform(n, 1 - self.brightness, 1 + self.brightness, x.device) if self.brightness else ones
+        c = self._uniform(n, 1 - self.contrast, 1 + self.contrast, x.device) if self.contrast else ones
+        s = self._uniform(n, 1 - self.saturation, 1 + self.saturation, x.device) if self.saturation else ones
+
+        luma = torch.tensor(_LUMA, device=x.device)
+        eye = torch.eye(3, device=x.device)
+        saturation = s.view(n, 1, 1) * eye + (1 - s).view(n, 1, 1) * luma.view(1, 1, 3)
+        matrix = (c * b).view(n, 1, 1) * saturation
+        mean_gray = x.mean(dim=(2, 3)) @ luma
+        offset = ((1 - c) * b * mean_gray).view(n, 1, 1)
+
+        h, w = x.shape[2:]
+        out = torch.baddbmm(offset, matrix, x.reshape(n, 3, h * w))
+        return out.view(n, 3, h, w).clamp_(0.0, 1.0)
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        """
+        Augment a batch
+
+        Args:
+            batch: (N, H, W, 3) uint8 or (N, 3, H, W) float in [0, 1]
+
+        Returns:
+            (N, 3, H, W) float32 batch, normalized unless normalize=False
+        """
+        x = to_float_nchw(batch)
+        if self.degrees:
+            flip = self._flip_mask(x.shape[0], x.device) if self.flip_p else None
+            x = self.rotate(x, flip)
+        elif self.flip_p:
+            x = self.flip(x.clone() if x is batch else x)
+        if self.brightness or self.contrast or self.saturation:
+            x = self.jitter(x)
+        if self.normalize:
+            mean = torch.as_tensor(IMAGENET_MEAN, device=x.device).view(1, 3, 1, 1)
+            std = torch.as_tensor(IMAGENET_STD, device=x.device).view(1, 3, 1, 1)
+            x = x.sub_(mean).div_(std)
+        return x
@@ -0,0 +1,284 @@
+"""
+CPU latency benchmarks for the plant disease models
+Helps trade a little accuracy for faster offline diagnosis
+"""
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import torch
+
+# Allow running as a script (python ml_model/benchmark.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.architectures import ARCHITECTURES, PlantDiseaseModel
+from ml_model.preprocessing import load_batch
+
+
+def time_callable(fn, warmup: int = 3, iterations: int = 20) -> Dict[str, float]:
+    """
+    Time a zero-argument callable
+
+    Returns:
+        Dictionary with mean/p50/p90 latency in milliseconds
+    """
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p90_ms': timings[min(len(timings) - 1, int(len(timings) * 0.9))],
+    }
+
+
+def benchmark_architectures(
+    archs: Sequence[str] = tuple(ARCHITECTURES),
+    num_classes: int = 38,
+    batch_sizes: Sequence[int] = (1, 8),
+    image_size: int = 224,
+    iterations: int = 20,
+    precision: str = 'fp32',
+    channels_last: bool = False
+) -> List[Dict]:
+    """
+    Measure CPU forward latency for each registered architecture
+
+    Args:
+        archs: Architecture names to benchmark
+        num_classes: Size of the classification head
+        batch_sizes: Batch sizes to measure
+        image_size: Input resolution
+        iterations: Timed iterations per measurement
+        precision: 'fp32' or 'bf16' (CPU autocast)
+        channels_last: Use NHWC memory format for model and inputs
+
+    Returns:
+        List of result dictionaries, one per (arch, batch size)
+    """
+    results = []
+    for arch in archs:
+        model = PlantDiseaseModel(num_classes=num_classes, pretrained=False, arch=arch).eval()
+        memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        model = model.to(memory_format=memory_format)
+        dtype = torch.bfloat16 if precision == 'bf16' else None
+        num_params = sum(p.numel() for p in model.parameters())
+
+        for batch_size in batch_sizes:
+            batch = torch.randn(batch_size, 3, image_size, image_size)
+            batch = batch.contiguous(memory_format=memory_format)
+
+            def forward():
+                with torch.no_grad(), torch.autocast('cpu', dtype=dtype, enabled=dtype is not None):
+                    model(batch)
+
+            timing = time_callable(forward, iterations=iterations)
+            results.append({
+                'arch': arch,
+                'precision': precision,
+                'channels_last': channels_last,
+                'params_millions': round(num_params / 1e6, 2),
+                'batch_size': batch_size,
+                'latency_ms': round(timing['mean_ms'], 2),
+                'p90_ms': round(timing['p90_ms'], 2),
+                'ms_per_image': round(timing['mean_ms'] / batch_size, 2),
+                'images_per_sec': round(1000 * batch_size / timing['mean_ms'], 1),
+            })
+            print(f"⏱️  {arch:<20} batch={batch_size:<3} "
+                  f"{timing['mean_ms']:8.1f} ms ({timing['mean_ms'] / batch_size:6.1f} ms/image)")
+
+    return results
+
+
+def benchmark_preprocessing(
+    image_paths: Sequence[str],
+    image_size: int = 224,
+    batch_size: int = 32,
+    iterations: int = 5
+) -> Dict:
+    """
+    Compare per-image torchvision transforms with the uint8 batch fast path
+
+    Args:
+        image_paths: Sample images (e.g. a validation directory)
+        image_size: Output resolution
+        batch_size: Images per preprocessed batch
+        iterations: Timed passes over the images
+
+    Returns:
+        Dictionary with microseconds per image for both paths and the
+        difference between their outputs
+    """
+    from PIL import Image
+    from torchvision import transforms
+
+    image_paths = list(image_paths)
+    reference = transforms.Compose([
+        transforms.Resize((image_size, image_size)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406],
+                             std=[0.229, 0.224, 0.225])
+    ])
+    chunks = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+
+    def torchvision_path():
+        for chunk in chunks:
+            torch.stack([reference(Image.open(p).convert('RGB')) for p in chunk])
+
+    def fast_path():
+        for chunk in chunks:
+            load_batch(chunk, image_size)
+
+    baseline = time_callable(torchvision_path, warmup=1, iterations=iterations)
+    fast = time_callable(fast_path, warmup=1, iterations=iterations)
+
+    diffs = []
+    for chunk in chunks:
+        expected = torch.stack([reference(Image.open(p).convert('RGB')) for p in chunk]).numpy()
+        actual = load_batch(chunk, image_size)[0]
+        diffs.append(np.abs(expected - actual))
+    diffs = np.concatenate(diffs)
+
+    per_image = 1000 / len(image_paths)
+    result = {
+        'images': len(image_paths),
+        'batch_size': batch_size,
+        'torchvision_us_per_image': round(baseline['mean_ms'] * per_image, 1),
+        'fast_path_us_per_image': round(fast['mean_ms'] * per_image, 1),
+        'speedup': round(baseline['mean_ms'] / fast['mean_ms'], 2),
+        'max_abs_diff': round(float(diffs.max()), 4),
+        'mean_abs_diff': round(float(diffs.mean()), 5),
+    }
+    print(f"⏱️  torchvision: {result['torchvision_us_per_image']:.0f} µs/image | "
+          f"fast path: {result['fast_path_us_per_image']:.0f} µs/image "
+          f"({result['speedup']}x)")
+    print(f"📏 Output difference: max {result['max_abs_diff']}, mean {result['mean_abs_diff']}")
+    return result
+
+
+def benchmark_tiling(
+    model,
+    image_path: str,
+    tile_sizes: Sequence[int] = (224, 336, 448, 672),
+    overlap: float = 0.25,
+    max_batch: int = 32,
+    iterations: int = 5
+) -> List[Dict]:
+    """
+    Measure tiled-inference latency against the number of tiles
+
+    Args:
+        model: Inference backend with predict_probabilities
+        image_path: Wide field photo
+        tile_sizes: Window sizes (image pixels) to compare
+        overlap: Fraction of a tile shared with its neighbour
+        max_batch: Maximum tiles per forward pass
+        iterations: Timed runs per configuration
+
+    Returns:
+        List of result dictionaries, one per tile size
+    """
+    from ml_model.tiled_inference import TiledInference
+
+    results = []
+    for tile_size in tile_sizes:
+        stride = max(1, int(tile_size * (1 - overlap)))
+        tiled = TiledInference(model, tile_size, stride, max_batch)
+        num_tiles = tiled.predict(image_path)['tiles']['num_tiles']
+        timing = time_callable(lambda: tiled.predict(image_path), warmup=1, iterations=iterations)
+        results.append({
+            'tile_size': tile_size,
+            'stride': stride,
+            'num_tiles': num_tiles,
+            'latency_ms': round(timing['mean_ms'], 2),
+            'p90_ms': round(timing['p90_ms'], 2),
+            'ms_per_tile': round(timing['mean_ms'] / num_tiles, 2),
+        })
+        print(f"⏱️  tile={tile_size:<4} stride={stride:<4} tiles={num_tiles:<4} "
+              f"{timing['mean_ms']:8.1f} ms ({timing['mean_ms'] / num_tiles:6.1f} ms/tile)")
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark plant disease models on CPU')
+    parser.add_argument('--archs', type=str, nargs='+', default=list(ARCHITECTURES),
+                       choices=sorted(ARCHITECTURES),
+                       help='Architectures to benchmark')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8],
+                       help='Batch sizes to measure')
+    parser.add_argument('--num-classes', type=int, default=38,
+                       help='Number of output classes')
+    parser.add_argument('--iterations', type=int, default=20,
+                       help='Timed iterations per measurement')
+    parser.add_argument('--threads', type=int, default=None,
+                       help='torch intra-op threads (default: torch default)')
+    parser.add_argument('--output', type=str, default=None,
+                       help='Optional JSON file for results')
+    parser.add_argument('--precision', type=str, default='fp32', choices=['fp32', 'bf16'],
+                       help='Compute precision (bf16 uses CPU autocast)')
+    parser.add_argument('--channels-last', action='store_true',
+                       help='Run with channels_last memory format')
+    parser.add_argument('--tiled-image', type=str, default=None,
+                       help='Benchmark tiled inference on this image instead')
+    parser.add_argument('--model', type=str, default=None,
+                       help='Model file for --tiled-image (default: registry active model)')
+    parser.add_argument('--tile-sizes', type=int, nargs='+', default=[224, 336, 448, 672],
+                       help='Tile sizes for --tiled-image')
+    parser.add_argument('--preprocess-dir', type=str, default=None,
+                       help='Benchmark image preprocessing on images under this directory instead')
+    parser.add_argument('--max-images', type=int, default=256,
+                       help='Images to use for the preprocessing benchmark')
+
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    print(f"🖥️  CPU threads: {torch.get_num_threads()}")
+
+    if args.tiled_image:
+        from ml_model.registry import get_inference_model
+        results = benchmark_tiling(
+            get_inference_model(args.model),
+            args.tiled_image,
+            tile_sizes=args.tile_sizes,
+            max_batch=max(args.batch_sizes),
+            iterations=args.iterations
+        )
+    elif args.preprocess_dir:
+        paths = sorted(
+            p for p in Path(args.preprocess_dir).rglob('*')
+            if p.suffix.lower() in ('.jpg', '.jpeg', '.png')
+        )[:args.max_images]
+        results = benchmark_preprocessing(
+            paths,
+            batch_size=max(args.batch_sizes),
+            iterations=args.iterations
+        )
+    else:
+        results = benchmark_architectures(
+            archs=args.archs,
+            num_classes=args.num_classes,
+            batch_sizes=args.batch_sizes,
+            iterations=args.iterations,
+            precision=args.precision,
+            channels_last=args.channels_last
+        )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Results saved to: {args.output}")
@@ -0,0 +1,343 @@
+"""
+Confidence calibration with temperature scaling
+Fits a single temperature on the validation set so softmax confidences
+match observed accuracy, stores it in the checkpoint, and reports
+calibration quality (reliability diagram, ECE) and the confidence threshold
+that sends a target share of traffic to the cloud fallback
+"""
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Allow running as a script (python ml_model/calibration.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.dataset_cache import scan_image_folder
+from ml_model.preprocessing import load_batch
+
+# Accuracy of accepted predictions that defines the confidence bands used
+# for the "High / Moderate / Low confidence" message
+CONFIDENCE_BAND_ACCURACY = {'high': 0.95, 'moderate': 0.8}
+
+
+def softmax(logits: np.ndarray, temperature: float = 1.0) -> np.ndarray:
+    """Row-wise softmax of logits / temperature"""
+    scaled = np.asarray(logits, dtype=np.float64) / temperature
+    scaled -= scaled.max(axis=1, keepdims=True)
+    exp = np.exp(scaled)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def negative_log_likelihood(logits: np.ndarray, labels: np.ndarray,
+                            temperature: float = 1.0) -> float:
+    """Mean cross-entropy of temperature-scaled logits"""
+    scaled = np.asarray(logits, dtype=np.float64) / temperature
+    scaled -= scaled.max(axis=1, keepdims=True)
+    log_norm = np.log(np.exp(scaled).sum(axis=1))
+    return float(np.mean(log_norm - scaled[np.arange(len(labels)), labels]))
+
+
+def fit_temperature(logits: np.ndarray, labels: np.ndarray,
+                    bounds: Tuple[float, float] = (0.05, 20.0),
+                    tolerance: float = 1e-4) -> float:
+    """
+    Temperature minimizing validation NLL
+
+    The NLL is unimodal in log(temperature), so a golden-section search
+    over that interval finds the optimum without gradients.
+
+    Args:
+        logits: (N, C) validation logits (any per-row offset is fine)
+        labels: (N,) true class indices
+        bounds: Search interval for the temperature
+        tolerance: Stop when the log-temperature interval is this small
+
+    Returns:
+        Fitted temperature (> 1 softens overconfident models)
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    low, high = np.log(bounds[0]), np.log(bounds[1])
+    ratio = (np.sqrt(5) - 1) / 2
+
+    def loss(log_t):
+        return negative_log_likelihood(logits, labels, np.exp(log_t))
+
+    a = high - ratio * (high - low)
+    b = low + ratio * (high - low)
+    loss_a, loss_b = loss(a), loss(b)
+    while high - low > tolerance:
+        if loss_a < loss_b:
+            high, b, loss_b = b, a, loss_a
+            a = high - ratio * (high - low)
+            loss_a = loss(a)
+        else:
+            low, a, loss_a = a, b, loss_b
+            b = low + ratio * (high - low)
+            loss_b = loss(b)
+    return float(np.exp((low + high) / 2))
+
+
+def reliability_report(confidences, correct, num_bins: int = 15) -> Dict:
+    """
+    Bin predictions by confidence and compare with accuracy
+
+    Returns:
+        Dictionary with expected calibration error (ece, weighted mean
+        |accuracy - confidence| over bins), maximum calibration error (mce),
+        mean confidence, accuracy and per-bin statistics
+    """
+    confidences = np.asarray(confidences, dtype=np.float64)
+    correct = np.asarray(correct, dtype=np.float64)
+    edges = np.linspace(0.0, 1.0, num_bins + 1)
+    bin_index = np.clip(np.digitize(confidences, edges[1:-1], right=True), 0, num_bins - 1)
+
+    counts = np.bincount(bin_index, minlength=num_bins)
+    confidence_sum = np.bincount(bin_index, weights=confidences, minlength=num_bins)
+    correct_sum = np.bincount(bin_index, weights=correct, minlength=num_bins)
+    occupied = counts > 0
+    mean_confidence = np.divide(confidence_sum, counts, out=np.zeros(num_bins), where=occupied)
+    accuracy = np.divide(correct_sum, counts, out=np.zeros(num_bins), where=occupied)
+    gap = np.abs(accuracy - mean_confidence)
+
+    total = max(len(confidences), 1)
+    return {
+        'num_samples': len(confidences),
+        'accuracy': round(float(correct.mean()) if len(correct) else 0.0, 4),
+        'mean_confidence': round(float(confidences.mean()) if len(confidences) else 0.0, 4),
+        'ece': round(float((gap * counts).sum() / total), 4),
+        'mce': round(float(gap[occupied].max()) if occupied.any() else 0.0, 4),
+        'bins': [
+            {
+                'lower': round(float(edges[i]), 4),
+                'upper': round(float(edges[i + 1]), 4),
+                'count': int(counts[i]),
+                'mean_confidence': round(float(mean_confidence[i]), 4),
+                'accuracy': round(float(accuracy[i]), 4)
+            }
+            for i in range(num_bins)
+        ]
+    }
+
+
+def escalation_threshold(confidences, target_rate: float) -> float:
+    """Confidence below which ``target_rate`` of the predictions fall"""
+    if not 0.0 <= target_rate <= 1.0:
+        raise ValueError("target_rate must be between 0 and 1")
+    return float(np.quantile(np.asarray(confidences, dtype=np.float64), target_rate))
+
+
+def render_reliability_diagram(reports: Dict[str, Dict], output_path: str, size: int = 480):
+    """
+    Draw reliability diagrams side by side (e.g. before / after scaling)
+
+    Bars show per-bin accuracy; the diagonal is perfect calibration.
+    """
+    margin = 40
+    panel = size - 2 * margin
+    image = Image.new('RGB', (size * len(reports), size), 'white')
+    draw = ImageDraw.Draw(image)
+
+    for p, (title, report) in enumerate(reports.items()):
+        x0, y0 = p * size + margin, size - margin
+
+        def point(x, y):
+            return x0 + x * panel, y0 - y * panel
+
+        for bin_stats in report['bins']:
+            if not bin_stats['count']:
+                continue
+            left, top = point(bin_stats['lower'], bin_stats['accuracy'])
+            right, bottom = point(bin_stats['upper'], 0.0)
+            draw.rectangle((left, top, right, bottom), fill=(70, 130, 180), outline='white')
+            # Shade the gap to the bin's mean confidence
+            _, conf_y = point(0.0, bin_stats['mean_confidence'])
+            draw.rectangle((left, min(top, conf_y), right, max(top, conf_y)),
+                           outline=(220, 60, 60))
+
+        draw.line((*point(0, 0), *point(1, 1)), fill='gray', width=1)
+        draw.rectangle((*point(0, 1), *point(1, 0)), outline='black')
+        draw.text((x0, margin / 2 - 6), f"{title}  ECE {report['ece']:.3f}", fill='black')
+        draw.text((x0, y0 + 8), "confidence", fill='black')
+        draw.text((x0 - margin + 4, margin), "acc", fill='black')
+
+    image.save(output_path)
+
+
+def labelled_samples(val_dir: str, class_to_idx: Dict[str, int],
+                     manifest_path: Optional[str] = None) -> List[Tuple[str, int]]:
+    """
+    (image path, class index) for every image in class sub-directories
+
+    Listed like the training data (dataset_cache.scan_image_folder): the
+    folder's manifest if it has one, or an explicit manifest such as the
+    deduplicated one written by dedup.py.
+    """
+    classes = sorted(class_to_idx, key=class_to_idx.get)
+    return scan_image_folder(val_dir, classes, manifest_path)[1]
+
+
+def collect_logits(model, val_dir: str, batch_size: int = 32,
+                   manifest_path: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Uncalibrated logits and labels of a model on a labelled directory
+
+    Backends with supports_logits (PyTorch, TorchScript, ONNX) return the
+    model's real logits. Others (e.g. the sidecar client) fall back to
+    log-probabilities times the model's current temperature. Those equal
+    the logits up to a per-row constant, which softmax ignores, but float32
+    probabilities underflow for confident predictions. Their log is then
+    clipped at log(1e-30), which biases the fitted temperature.
+    """
+    samples = labelled_samples(val_dir, model.class_to_idx, manifest_path)
+    if not samples:
+        raise ValueError(f"No labelled images found in {val_dir}")
+
+    temperature = getattr(model, 'temperature', 1.0)
+    real_logits = getattr(model, 'supports_logits', False)
+    logits, labels = [], []
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        batch, _, positions, _ = load_batch([path for path, _ in chunk], model.image_size)
+        if not positions:
+            continue
+        if real_logits:
+            logits.append(model.predict_logits(batch).astype(np.float64))
+        else:
+            probabilities = model.predict_probabilities(batch)
+            logits.append(np.log(np.maximum(probabilities, 1e-30)) * temperature)
+        labels.extend(chunk[i][1] for i in positions)
+    return np.concatenate(logits), np.asarray(labels, dtype=np.int64)
+
+
+def calibrate(logits: np.ndarray, labels: np.ndarray,
+              target_escalation_rate: float = 0.15, num_bins: int = 15) -> Dict:
+    """
+    Fit a temperature and derive confidence thresholds from validation logits
+
+    Returns:
+        Calibration dictionary stored in the checkpoint: temperature,
+        escalation_threshold, confidence_bands and before/after reports
+    """
+    from ml_model.inference import fit_confidence_threshold
+
+    temperature = fit_temperature(logits, labels)
+    before = softmax(logits)
+    after = softmax(logits, temperature)
+
+    confidences = after.max(axis=1)
+    correct = after.argmax(axis=1) == labels
+    threshold = escalation_threshold(confidences, target_escalation_rate)
+    accepted = confidences >= threshold
+
+    return {
+        'temperature': round(temperature, 4),
+        'nll_before': round(negative_log_likelihood(logits, labels), 4),
+        'nll_after': round(negative_log_likelihood(logits, labels, temperature), 4),
+        'target_escalation_rate': target_escalation_rate,
+        'escalation_threshold': round(threshold, 4),
+        'escalation_rate': round(float(1.0 - accepted.mean()), 4),
+        'accepted_accuracy': round(float(correct[accepted].mean()) if accepted.any() else 0.0, 4),
+        'confidence_bands': {
+            band: round(fit_confidence_threshold(confidences, correct, accuracy), 4)
+            for band, accuracy in CONFIDENCE_BAND_ACCURACY.items()
+        },
+        'reliability_before': reliability_report(before.max(axis=1), before.argmax(axis=1) == labels, num_bins),
+        'reliability_after': reliability_report(confidences, correct, num_bins),
+    }
+
+
+def calibrate_checkpoint(checkpoint_path: str, val_dir: str,
+                         target_escalation_rate: float = 0.15,
+                         batch_size: int = 32,
+                         report_dir: Optional[str] = None,
+                         val_manifest: Optional[str] = None) -> Dict:
+    """
+    Calibrate a trained checkpoint on a validation directory and store the result
+
+    The checkpoint gains 'temperature' and 'calibration' entries (picked up
+    by PlantDiseaseInference and the ONNX export). A JSON report and a
+    reliability diagram are written to report_dir (default: next to the
+    checkpoint).
+
+    Args:
+        checkpoint_path: best_model.pth produced by train_model.py
+        val_dir: Validation directory with one sub-directory per class
+        target_escalation_rate: Share of validation images that should fall
+            below the escalation threshold (sent to the cloud model)
+        batch_size: Images per forward pass
+        report_dir: Where to write calibration_report.json and
+            reliability_diagram.png
+        val_manifest: Dataset manifest selecting the validation images
+            (e.g. val/manifest_dedup.npz from dedup.py)
+
+    Returns:
+        Calibration dictionary
+    """
+    import torch
+    from ml_model.architectures import save_checkpoint
+    from ml_model.inference import PlantDiseaseInference
+
+    checkpoint_path = Path(checkpoint_path)
+    model = PlantDiseaseInference(str(checkpoint_path), precision='fp32', channels_last=False)
+    model.temperature = 1.0
+
+    logits, labels = collect_logits(model, val_dir, batch_size, val_manifest)
+    calibration = calibrate(logits, labels, target_escalation_rate)
+    del model
+
+    # Rewrite the checkpoint atomically; it was loaded memory-mapped above
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    checkpoint['temperature'] = calibration['temperature']
+    checkpoint['calibration'] = {
+        key: value for key, value in calibration.items()
+        if not key.startswith('reliability_')
+    }
+    save_checkpoint(checkpoint, checkpoint_path)
+
+    report_dir = Path(report_dir) if report_dir else checkpoint_path.parent
+    report_dir.mkdir(parents=True, exist_ok=True)
+    with open(report_dir / 'calibration_report.json', 'w') as f:
+        json.dump(calibration, f, indent=2)
+    render_reliability_diagram(
+        {'Before': calibration['reliability_before'], 'After': calibration['reliability_after']},
+        str(report_dir / 'reliability_diagram.png')
+    )
+
+    print(f"🌡️  Temperature {calibration['temperature']:.3f} on {len(labels)} validation images "
+          f"(NLL {calibration['nll_before']:.4f} -> {calibration['nll_after']:.4f}, "
+          f"ECE {calibration['reliability_before']['ece']:.3f} -> "
+          f"{calibration['reliability_after']['ece']:.3f})")
+    print(f"🎯 Escalation threshold {calibration['escalation_threshold']:.3f} sends "
+          f"{calibration['escalation_rate']*100:.1f}% to the cloud; accepted accuracy "
+          f"{calibration['accepted_accuracy']*100:.1f}%")
+    print(f"✅ Calibration saved to {checkpoint_path} and {report_dir}")
+    return calibration
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Calibrate model confidences (temperature scaling)')
+    parser.add_argument('--model', type=str, default='ml_model/checkpoints/best_model.pth',
+                       help='Checkpoint to calibrate (updated in place)')
+    parser.add_argument('--val-dir', type=str, required=True,
+                       help='Validation directory with one sub-directory per class')
+    parser.add_argument('--target-escalation-rate', type=float, default=0.15,
+                       help='Share of images the hybrid agent should send to the cloud')
+    parser.add_argument('--batch-size', type=int, default=32,
+                       help='Images per forward pass')
+    parser.add_argument('--report-dir', type=str, default=None,
+                       help='Directory for the JSON report and reliability diagram')
+    parser.add_argument('--val-manifest', type=str, default=None,
+                       help='Dataset manifest selecting the validation images (e.g. from dedup.py)')
+
+    args = parser.parse_args()
+
+    calibrate_checkpoint(args.model, args.val_dir, args.target_escalation_rate,
+                         args.batch_size, args.report_dir, args.val_manifest)
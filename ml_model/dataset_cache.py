@@ -0,0 +1,310 @@
+"""
+Pre-decoded, memory-mapped image cache for training
+Every image is decoded and resized once into uint8 shards (np.memmap) with
+a JSON index, so epochs read pixels straight from the page cache instead of
+decoding each JPEG again
+
+Layout of a cache directory:
+    index.json          size, classes, shard sizes, source paths, failures
+    labels.npy          int64 label per row
+    shard_00000.u8      (rows, size, size, 3) uint8, C order
+    shard_00001.u8      ...
+"""
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Allow running as a script (python ml_model/dataset_cache.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.dataset_manifest import is_image_file, load_manifest
+from ml_model.preprocessing import IMAGE_SIZE, load_image_uint8
+
+INDEX_FILE = 'index.json'
+LABELS_FILE = 'labels.npy'
+
+
+def _shard_name(shard: int) -> str:
+    return f'shard_{shard:05d}.u8'
+
+
+def _manifest_key(manifest_path: Optional[str]) -> Optional[List]:
+    """Identifies an explicit manifest file (path and mtime) in the index"""
+    if not manifest_path:
+        return None
+    path = Path(manifest_path).resolve()
+    return [str(path), path.stat().st_mtime_ns]
+
+
+def scan_image_folder(data_dir: str, classes: Optional[Sequence[str]] = None,
+                      manifest_path: Optional[str] = None) -> Tuple[List[str], List[Tuple[str, int]]]:
+    """
+    List (path, label) pairs of a class-per-directory image folder
+
+    Args:
+        data_dir: Directory with one sub-directory per class
+        classes: Class order to use (e.g. the training classes for a
+            validation folder); defaults to the sorted sub-directory names
+        manifest_path: Manifest to read instead of the folder's default one
+            (e.g. the deduplicated manifest written by dedup.py)
+
+    Uses the folder's manifest (dataset_manifest.py) when one exists.
+
+    Returns:
+        Tuple of (classes, samples)
+    """
+    root = Path(data_dir)
+    manifest = load_manifest(data_dir, manifest_path)
+    if manifest is not None:
+        if classes is None:
+            classes = manifest.classes
+        remap = {manifest.class_to_idx[name]: label for label, name in enumerate(classes)
+                 if name in manifest.class_to_idx}
+        samples = [(str(path), remap[label]) for path, label in manifest.samples() if label in remap]
+        return list(classes), samples
+
+    if classes is None:
+        classes = sorted(d.name for d in root.iterdir() if d.is_dir())
+    samples = []
+    for label, class_name in enumerate(classes):
+        class_dir = root / class_name
+        if not class_dir.is_dir():
+            continue
+        for path in sorted(class_dir.iterdir()):
+            if is_image_file(path.name):
+                samples.append((str(path), label))
+    return list(classes), samples
+
+
+# Worker state: open shard memmaps, reused across tasks
+_worker_shards: Dict[str, np.memmap] = {}
+
+
+def _write_image(task) -> Tuple[int, Optional[str]]:
+    """Decode one image into its shard row (runs in a pool worker)"""
+    row, path, shard_path, offset, rows, size = task
+    try:
+        array, _ = load_image_uint8(path, size)
+    except Exception as e:
+        return row, str(e)
+    shard = _worker_shards.get(shard_path)
+    if shard is None:
+        shard = np.memmap(shard_path, dtype=np.uint8, mode='r+', shape=(rows, size, size, 3))
+        _worker_shards[shard_path] = shard
+    # Shared mapping: the row is visible to readers once written
+    shard[offset] = array
+    return row, None
+
+
+def build_cache(data_dir: str, output_dir: str, size: int = IMAGE_SIZE,
+                shard_size: int = 4096, workers: Optional[int] = None,
+                classes: Optional[Sequence[str]] = None,
+                manifest_path: Optional[str] = None) -> Dict:
+    """
+    Decode an image folder once into memory-mapped uint8 shards
+
+    Decoding runs in a process pool; each worker writes its rows directly
+    into the shard files, so pixels are never pickled between processes.
+
+    Args:
+        data_dir: Directory with one sub-directory per class
+        output_dir: Cache directory to create
+        size: Canonical square resolution stored in the cache
+        shard_size: Images per shard file
+        workers: Decoding processes (default: all CPUs)
+        classes: Class order (pass the training classes when caching validation)
+        manifest_path: Manifest selecting the images (default: the folder's own)
+
+    Returns:
+        The index dictionary
+    """
+    start = time.perf_counter()
+    classes, samples = scan_image_folder(data_dir, classes, manifest_path)
+    if not samples:
+        raise ValueError(f"No images found in {data_dir}")
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    (output / INDEX_FILE).unlink(missing_ok=True)
+    for stale in output.glob('shard_*.u8'):
+        stale.unlink()
+
+    shards = []
+    tasks = []
+    for shard, first in enumerate(range(0, len(samples), shard_size)):
+        rows = min(shard_size, len(samples) - first)
+        shard_path = str(output / _shard_name(shard))
+        # Preallocate the file; workers open it r+ and fill their rows
+        np.memmap(shard_path, dtype=np.uint8, mode='w+', shape=(rows, size, size, 3)).flush()
+        shards.append(rows)
+        tasks.extend(
+            (first + offset, samples[first + offset][0], shard_path, offset, rows, size)
+            for offset in range(rows)
+        )
+
+    workers = workers or os.cpu_count() or 1
+    failures = {}
+    with Pool(workers) as pool:
+        for done, (row, error) in enumerate(
+                pool.imap_unordered(_write_image, tasks, chunksize=64), 1):
+            if error:
+                failures[row] = error
+            if done % 5000 == 0:
+                print(f"   {done}/{len(tasks)} images decoded")
+
+    np.save(output / LABELS_FILE, np.array([label for _, label in samples], dtype=np.int64))
+    index = {
+        'source': str(Path(data_dir).resolve()),
+        'manifest': _manifest_key(manifest_path),
+        'size': size,
+        'shard_size': shard_size,
+        'shards': shards,
+        'classes': classes,
+        'class_to_idx': {name: i for i, name in enumerate(classes)},
+        'paths': [path for path, _ in samples],
+        'failed': {str(row): error for row, error in sorted(failures.items())},
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    # Written last: an index only exists for a complete cache
+    with open(output / INDEX_FILE, 'w') as f:
+        json.dump(index, f)
+
+    elapsed = time.perf_counter() - start
+    total_mb = sum(shards) * size * size * 3 / 1024 / 1024
+    print(f"✅ Cached {len(samples) - len(failures)} images ({len(shards)} shards, "
+          f"{total_mb:.0f} MB) to {output} in {elapsed:.1f}s "
+          f"({len(samples) / elapsed:.0f} images/s)")
+    if failures:
+        print(f"⚠️ {len(failures)} images could not be decoded and are excluded")
+    return index
+
+
+def load_index(cache_dir: str) -> Optional[Dict]:
+    """Index of a complete cache, or None if the directory is not a cache"""
+    index_path = Path(cache_dir) / INDEX_FILE
+    if not index_path.exists():
+        return None
+    with open(index_path) as f:
+        return json.load(f)
+
+
+class MemmapImageDataset:
+    """
+    Dataset over a memory-mapped cache built by build_cache
+
+    Items are zero-copy views into the shards (HWC uint8). Shards are
+    opened lazily in each DataLoader worker with copy-on-write mapping, so
+    the pages are shared through the OS page cache and views are writable
+    without touching the files.
+
+    Implements the torch Dataset protocol (__len__/__getitem__) without
+    importing torch.
+    """
+
+    def __init__(self, cache_dir: str, transform=None):
+        """
+        Initialize dataset
+
+        Args:
+            cache_dir: Directory written by build_cache
+            transform: Optional callable applied to a PIL image (for
+                torchvision augmentation). Without it items are uint8 arrays
+                to be normalized per batch with normalize_batch.
+        """
+        self.cache_dir = Path(cache_dir)
+        index = load_index(cache_dir)
+        if index is None:
+            raise FileNotFoundError(f"No dataset cache index in {cache_dir}")
+        self.size = index['size']
+        self.shard_size = index['shard_size']
+        self.shard_rows = index['shards']
+        self.classes = index['classes']
+        self.class_to_idx = index['class_to_idx']
+        self.paths = index['paths']
+        self.transform = transform
+
+        labels = np.load(self.cache_dir / LABELS_FILE)
+        failed = np.array([int(row) for row in index['failed']], dtype=np.int64)
+        self.rows = np.setdiff1d(np.arange(len(labels)), failed)
+        self.labels = labels[self.rows]
+        self.targets = self.labels.tolist()
+        self._shards: Dict[int, np.memmap] = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _shard(self, shard: int) -> np.memmap:
+        mapped = self._shards.get(shard)
+        if mapped is None:
+            mapped = np.memmap(self.cache_dir / _shard_name(shard), dtype=np.uint8, mode='c',
+                               shape=(self.shard_rows[shard], self.size, self.size, 3))
+            self._shards[shard] = mapped
+        return mapped
+
+    def image(self, idx: int) -> np.ndarray:
+        """HWC uint8 view of one cached image"""
+        row = int(self.rows[idx])
+        return self._shard(row // self.shard_size)[row % self.shard_size]
+
+    def __getitem__(self, idx):
+        image = self.image(idx)
+        if self.transform is not None:
+            from PIL import Image
+            image = self.transform(Image.fromarray(image))
+        return image, int(self.labels[idx])
+
+    def __getstate__(self):
+        # DataLoader workers reopen the shards instead of pickling mappings
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+
+def ensure_cache(data_dir: str, cache_dir: str, size: int = IMAGE_SIZE,
+                 classes: Optional[Sequence[str]] = None, manifest_path: Optional[str] = None,
+                 **kwargs) -> Dict:
+    """Reuse a cache built from the same folder, manifest and size, else build it"""
+    index = load_index(cache_dir)
+    if (index is not None and index['source'] == str(Path(data_dir).resolve())
+            and index.get('manifest') == _manifest_key(manifest_path)
+            and index['size'] == size and (classes is None or index['classes'] == list(classes))):
+        print(f"📦 Using dataset cache {cache_dir} ({len(index['paths'])} images)")
+        return index
+    print(f"📦 Building dataset cache {cache_dir} from {data_dir}...")
+    return build_cache(data_dir, cache_dir, size, classes=classes, manifest_path=manifest_path, **kwargs)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Decode an image folder into a memory-mapped training cache')
+    parser.add_argument('--data-dir', type=str, required=True,
+                       help='Image folder with one sub-directory per class')
+    parser.add_argument('--output-dir', type=str, required=True,
+                       help='Cache directory to write')
+    parser.add_argument('--size', type=int, default=IMAGE_SIZE,
+                       help='Canonical square resolution')
+    parser.add_argument('--shard-size', type=int, default=4096,
+                       help='Images per shard file')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Decoding processes (default: all CPUs)')
+    parser.add_argument('--classes-from', type=str, default=None,
+                       help='Existing cache whose class order to reuse (e.g. train cache for val)')
+    parser.add_argument('--manifest', type=str, default=None,
+                       help='Manifest selecting the images (e.g. manifest_dedup.npz from dedup.py)')
+
+    args = parser.parse_args()
+
+    classes = None
+    if args.classes_from:
+        classes = load_index(args.classes_from)['classes']
+    build_cache(args.data_dir, args.output_dir, args.size, args.shard_size, args.workers, classes,
+                args.manifest)
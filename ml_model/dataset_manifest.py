@@ -0,0 +1,285 @@
+"""
+Persistent dataset manifest
+One parallel scan records every image's path, label, file size, mtime,
+content hash and pixel dimensions in a compact .npz file. Later scans only
+re-hash files whose size or mtime changed, and datasets load the manifest
+in milliseconds instead of walking the class directories
+
+The content hash (BLAKE2b, 128 bit) also identifies exact duplicates.
+"""
+import hashlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Allow running as a script (python ml_model/dataset_manifest.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+MANIFEST_NAME = 'manifest.npz'
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def is_image_file(name: str) -> bool:
+    """Image extension check, case-insensitive (.jpg, .JPG, .jpeg, .png)"""
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def default_manifest_path(data_dir: str) -> Path:
+    return Path(data_dir) / MANIFEST_NAME
+
+
+class Manifest:
+    """
+    Column-oriented manifest of an image folder
+
+    Attributes (one entry per image, sorted by path):
+        paths: Paths relative to the data directory (unicode array)
+        labels: Class index per image (int32)
+        file_sizes: Bytes (int64)
+        mtimes: Modification time in ns (int64)
+        hashes: BLAKE2b-128 content digest (S16)
+        widths, heights: Pixel dimensions, 0 if the file could not be read
+        classes: Class names (sorted sub-directory names)
+    """
+
+    COLUMNS = ('paths', 'labels', 'file_sizes', 'mtimes', 'hashes', 'widths', 'heights')
+
+    def __init__(self, root: str, classes: Sequence[str], **columns):
+        self.root = Path(root)
+        self.classes = list(classes)
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @property
+    def class_to_idx(self) -> Dict[str, int]:
+        return {name: i for i, name in enumerate(self.classes)}
+
+    @property
+    def readable(self) -> np.ndarray:
+        """Mask of entries whose image header could be parsed"""
+        return self.widths > 0
+
+    def samples(self) -> List[Tuple[str, int]]:
+        """(absolute path, label) for every readable image"""
+        keep = self.readable
+        paths = np.char.add(str(self.root) + os.sep, self.paths[keep])
+        return list(zip(paths.tolist(), self.labels[keep].tolist()))
+
+    def save(self, manifest_path: str):
+        """Write compressed, atomically (tmp file + rename)"""
+        manifest_path = Path(manifest_path)
+        # Per-process temp name: several training processes may refresh it at once
+        tmp_path = manifest_path.with_name(f"{manifest_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, classes=np.array(self.classes, dtype=str),
+                                **{name: getattr(self, name) for name in self.COLUMNS})
+        os.replace(tmp_path, manifest_path)
+
+    @classmethod
+    def load(cls, manifest_path: str, root: Optional[str] = None) -> 'Manifest':
+        manifest_path = Path(manifest_path)
+        with np.load(manifest_path, allow_pickle=False) as data:
+            columns = {name: data[name] for name in cls.COLUMNS}
+            classes = data['classes'].tolist()
+        return cls(root or manifest_path.parent, classes, **columns)
+
+
+def _scan_class_dir(args) -> List[Tuple[str, int, int, int]]:
+    """(relative path, label, size, mtime_ns) for the images of one class directory"""
+    root, class_name, label = args
+    entries = []
+    with os.scandir(os.path.join(root, class_name)) as it:
+        for entry in it:
+            if entry.is_file() and is_image_file(entry.name):
+                stat = entry.stat()
+                entries.append((f"{class_name}/{entry.name}", label, stat.st_size, stat.st_mtime_ns))
+    return entries
+
+
+def _list_images(root: Path, classes: Sequence[str], pool) -> List[Tuple[str, int, int, int]]:
+    """(relative path, label, size, mtime_ns) of every image, sorted by path"""
+    listed = [entry for entries in pool.map(
+        _scan_class_dir, [(str(root), name, label) for label, name in enumerate(classes)])
+        for entry in entries]
+    listed.sort()
+    return listed
+
+
+def folder_signature(data_dir: str, workers: Optional[int] = None) -> str:
+    """
+    Digest of a class-per-directory folder's listing (class, path, size, mtime)
+
+    Changes whenever an image is added, removed, replaced or relabelled;
+    only directory entries are read, not the images.
+    """
+    root = Path(data_dir)
+    classes = sorted(d.name for d in root.iterdir() if d.is_dir())
+    with ThreadPoolExecutor(workers or 2 * (os.cpu_count() or 1)) as pool:
+        listed = _list_images(root, classes, pool)
+    digest = hashlib.blake2b(digest_size=16)
+    for entry in listed:
+        digest.update(('\0'.join(map(str, entry)) + '\n').encode())
+    return digest.hexdigest()
+
+
+def _hash_file(path: str) -> Tuple[bytes, int, int]:
+    """Content digest and pixel dimensions (header only) of one file"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+    except Exception:
+        width, height = 0, 0
+    return digest, width, height
+
+
+def update_manifest(data_dir: str, manifest_path: Optional[str] = None,
+                    workers: Optional[int] = None) -> Manifest:
+    """
+    Build or incrementally refresh the manifest of a class-per-directory folder
+
+    Directories are listed in parallel; only files that are new or whose
+    size or mtime changed are read and hashed (also in parallel). Removed
+    files drop out.
+
+    Args:
+        data_dir: Directory with one sub-directory per class
+        manifest_path: Manifest file (default: <data_dir>/manifest.npz)
+        workers: Threads for listing and hashing (default: 2x CPUs, I/O bound)
+
+    Returns:
+        The updated manifest (also written to manifest_path)
+    """
+    start = time.perf_counter()
+    root = Path(data_dir)
+    manifest_path = Path(manifest_path) if manifest_path else default_manifest_path(root)
+    workers = workers or 2 * (os.cpu_count() or 1)
+
+    previous, previous_classes = {}, None
+    if manifest_path.exists():
+        old = Manifest.load(manifest_path, root)
+        previous_classes = old.classes
+        previous = {
+            path: (int(size), int(mtime), digest, int(w), int(h))
+            for path, size, mtime, digest, w, h in zip(
+                old.paths.tolist(), old.file_sizes, old.mtimes, old.hashes, old.widths, old.heights)
+        }
+
+    classes = sorted(d.name for d in root.iterdir() if d.is_dir())
+    with ThreadPoolExecutor(workers) as pool:
+        listed = _list_images(root, classes, pool)
+
+        stale = [
+            i for i, (path, _, size, mtime) in enumerate(listed)
+            if path not in previous or previous[path][:2] != (size, mtime)
+        ]
+        hashed = dict(zip(stale, pool.map(
+            _hash_file, [str(root / listed[i][0]) for i in stale], chunksize=32)))
+
+    n = len(listed)
+    columns = {
+        'paths': np.array([e[0] for e in listed], dtype=str),
+        'labels': np.array([e[1] for e in listed], dtype=np.int32),
+        'file_sizes': np.array([e[2] for e in listed], dtype=np.int64),
+        'mtimes': np.array([e[3] for e in listed], dtype=np.int64),
+        'hashes': np.empty(n, dtype='S16'),
+        'widths': np.empty(n, dtype=np.int32),
+        'heights': np.empty(n, dtype=np.int32),
+    }
+    for i, (path, *_rest) in enumerate(listed):
+        digest, width, height = hashed[i] if i in hashed else previous[path][2:]
+        columns['hashes'][i] = digest
+        columns['widths'][i] = width
+        columns['heights'][i] = height
+
+    manifest = Manifest(root, classes, **columns)
+    removed = len(set(previous) - set(columns['paths'].tolist()))
+    # Unchanged folders leave the file alone (training processes call this on start)
+    if stale or removed or classes != previous_classes:
+        manifest.save(manifest_path)
+
+    unreadable = int((~manifest.readable).sum())
+    print(f"📇 Manifest {manifest_path}: {n} images in {len(classes)} classes "
+          f"({len(stale)} hashed, {n - len(stale)} unchanged, {removed} removed) "
+          f"in {time.perf_counter() - start:.2f}s")
+    if unreadable:
+        print(f"⚠️ {unreadable} files could not be read as images and will be skipped")
+    return manifest
+
+
+def _reconcile(manifest: Manifest, manifest_path: Path, workers: Optional[int] = None) -> Manifest:
+    """
+    Check an explicit manifest (a selection such as dedup.py's) against its folder
+
+    Entries whose file was deleted are dropped. Images added since the
+    selection was made are not added (it is a selection), only counted.
+    """
+    with ThreadPoolExecutor(workers or 2 * (os.cpu_count() or 1)) as pool:
+        classes = [name for name in manifest.classes if (manifest.root / name).is_dir()]
+        listed = _list_images(manifest.root, classes, pool)
+    present = {entry[0] for entry in listed}
+    keep = np.array([path in present for path in manifest.paths.tolist()], dtype=bool)
+    missing = int((~keep).sum())
+    if missing:
+        print(f"⚠️ {missing} images in {manifest_path} no longer exist and are skipped")
+        manifest = Manifest(manifest.root, manifest.classes,
+                            **{name: getattr(manifest, name)[keep] for name in Manifest.COLUMNS})
+    # Images left out on purpose predate the manifest; newer ones were added since
+    written = manifest_path.stat().st_mtime_ns
+    selected = set(manifest.paths.tolist())
+    added = sum(1 for path, _, _, mtime in listed if mtime > written and path not in selected)
+    if added:
+        print(f"⚠️ {added} images added to {manifest.root} after {manifest_path} was written "
+              "are not used (re-create it, e.g. with dedup.py, to include them)")
+    return manifest
+
+
+def load_manifest(data_dir: str, manifest_path: Optional[str] = None) -> Optional[Manifest]:
+    """
+    Manifest of a data directory, or None if it has not been built
+
+    The folder's own manifest is refreshed incrementally (new, changed and
+    deleted files), so it never goes stale. An explicit manifest is a fixed
+    selection: deleted files are dropped from it, new ones are not added.
+    """
+    if manifest_path is None:
+        if not default_manifest_path(data_dir).exists():
+            return None
+        return update_manifest(data_dir)
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return None
+    return _reconcile(Manifest.load(manifest_path, data_dir), manifest_path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build or refresh a dataset manifest')
+    parser.add_argument('--data-dir', type=str, nargs='+', required=True,
+                       help='Image folder(s) with one sub-directory per class')
+    parser.add_argument('--manifest', type=str, default=None,
+                       help='Manifest file (single data dir only; default: <data-dir>/manifest.npz)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Threads for listing and hashing')
+
+    args = parser.parse_args()
+    if args.manifest and len(args.data_dir) > 1:
+        parser.error('--manifest can only be used with a single --data-dir')
+
+    for data_dir in args.data_dir:
+        update_manifest(data_dir, args.manifest, args.workers)
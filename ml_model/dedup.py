@@ -0,0 +1,385 @@
+"""
+Duplicate detection and train/val leakage check for image folders
+Exact duplicates share the manifest's content hash (dataset_manifest.py);
+near-duplicates (re-encoded, resized or slightly edited copies) are found
+with a 64-bit DCT perceptual hash. Images connected by either relation form
+one cluster. A cluster with members in both train and val is leakage: the
+model is validated on images it trained on, which inflates the accuracy
+that selects best_model.pth.
+
+The deduplicated manifests keep one image per cluster and class in each
+split and drop leaked images from one side. Datasets and the cache read
+them via --train-manifest / --val-manifest in train_model.py.
+"""
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Allow running as a script (python ml_model/dedup.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.dataset_manifest import Manifest, update_manifest
+
+DEDUP_MANIFEST_NAME = 'manifest_dedup.npz'
+PHASH_CACHE_NAME = 'phashes.npz'
+REPORT_NAME = 'dedup_report.json'
+
+# Hamming distance (of 64 bits) up to which two images count as near-duplicates
+DEFAULT_MAX_DISTANCE = 4
+
+_DCT_SIZE = 32
+_HASH_SIZE = 8
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis (rows are frequencies)"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix.astype(np.float32)
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+
+def perceptual_hash(path: str) -> int:
+    """
+    64-bit DCT perceptual hash (pHash) of an image
+
+    The image is reduced to 32x32 grayscale (JPEGs are decoded at reduced
+    scale), transformed with a 2-D DCT, and the 8x8 lowest frequencies are
+    thresholded at their median. Re-encoding, resizing and small edits
+    flip only a few bits.
+    """
+    with Image.open(path) as image:
+        image.draft('L', (2 * _DCT_SIZE, 2 * _DCT_SIZE))
+        pixels = np.asarray(image.convert('L').resize((_DCT_SIZE, _DCT_SIZE), Image.BILINEAR),
+                            dtype=np.float32)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:_HASH_SIZE, :_HASH_SIZE].ravel()
+    # The DC term only encodes mean brightness
+    bits = coefficients > np.median(coefficients[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def _hash_worker(path: str) -> Optional[int]:
+    try:
+        return perceptual_hash(path)
+    except Exception:
+        return None
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Number of set bits of every uint64"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.int64)
+    as_bytes = values.astype(np.uint64).view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1).astype(np.int64)
+
+
+def compute_phashes(manifest: Manifest, workers: Optional[int] = None,
+                    cache_path: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Perceptual hash of every manifest entry, decoded in a process pool
+
+    Hashes are cached by content hash, so unchanged (or moved) files are
+    not decoded again.
+
+    Returns:
+        Tuple of (uint64 hashes, bool mask of entries that could be hashed)
+    """
+    cache_path = Path(cache_path) if cache_path else manifest.root / PHASH_CACHE_NAME
+    cache = {}
+    if cache_path.exists():
+        with np.load(cache_path, allow_pickle=False) as data:
+            cache = dict(zip(data['digests'].tolist(), data['phashes'].tolist()))
+
+    digests = manifest.hashes.tolist()
+    todo = sorted({i for i, digest in enumerate(digests)
+                   if digest not in cache and manifest.readable[i]})
+    if todo:
+        paths = [str(manifest.root / manifest.paths[i]) for i in todo]
+        with ProcessPoolExecutor(workers or os.cpu_count() or 1) as pool:
+            for i, value in zip(todo, pool.map(_hash_worker, paths, chunksize=64)):
+                if value is not None:
+                    cache[digests[i]] = value
+        tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, digests=np.array(list(cache), dtype='S16'),
+                     phashes=np.array(list(cache.values()), dtype=np.uint64))
+        os.replace(tmp_path, cache_path)
+
+    valid = np.array([digest in cache for digest in digests], dtype=bool)
+    hashes = np.array([cache.get(digest, 0) for digest in digests], dtype=np.uint64)
+    print(f"🔑 Perceptual hashes for {manifest.root}: {len(todo)} computed, "
+          f"{len(digests) - len(todo)} cached")
+    return hashes, valid
+
+
+def near_duplicate_pairs(hashes: np.ndarray, max_distance: int) -> np.ndarray:
+    """
+    Index pairs linking hashes that differ in at most max_distance bits
+
+    Pigeonhole: split the 64 bits into max_distance + 1 bands, and two
+    hashes within the distance agree exactly on at least one band. Only
+    hashes sharing a band value are compared, instead of all pairs.
+    Entries with identical hashes are linked to the first of them rather
+    than to each other, which yields the same clusters.
+
+    Returns:
+        (P, 2) int64 array of pairs into hashes
+    """
+    if not 0 <= max_distance < 32:
+        raise ValueError("max_distance must be between 0 and 31 bits")
+    # Identical hashes are compared once, through their first entry
+    unique, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    bands = max_distance + 1
+    edges = np.linspace(0, 64, bands + 1).astype(np.uint64)
+
+    close = []
+    for low, high in zip(edges[:-1], edges[1:]):
+        keys = (unique >> low) & np.uint64((1 << int(high - low)) - 1)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(order)])
+        # Buckets of equal size are expanded to pairs together
+        for size in np.unique(sizes[sizes > 1]).tolist():
+            members = order[starts[sizes == size][:, None] + np.arange(size)]
+            a, b = np.triu_indices(size, 1)
+            left, right = members[:, a].ravel(), members[:, b].ravel()
+            keep = popcount64(unique[left] ^ unique[right]) <= max_distance
+            close.append(np.minimum(left, right)[keep] * len(unique) + np.maximum(left, right)[keep])
+
+    # Entries sharing a hash value are linked to that value's first entry
+    same = np.flatnonzero(first[inverse] != np.arange(len(hashes)))
+    pairs = [np.stack([first[inverse[same]], same], axis=1)]
+    if close:
+        # Pairs agreeing on several bands were found more than once
+        close = np.unique(np.concatenate(close))
+        pairs.append(first[np.stack([close // len(unique), close % len(unique)], axis=1)])
+    return np.concatenate(pairs).astype(np.int64)
+
+
+def connected_components(n: int, pairs: np.ndarray) -> np.ndarray:
+    """Component id of each of n nodes linked by pairs (union-find)"""
+    parent = list(range(n))
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    for a, b in pairs.tolist():
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return np.array([find(i) for i in range(n)])
+
+
+def find_duplicates(manifests: Dict[str, Manifest], max_distance: int = DEFAULT_MAX_DISTANCE,
+                    workers: Optional[int] = None) -> Dict:
+    """
+    Cluster exact and near-duplicate images across splits
+
+    Args:
+        manifests: Split name ('train', 'val') -> manifest
+        max_distance: Perceptual-hash Hamming distance for near-duplicates
+        workers: Decoding processes for perceptual hashes
+
+    Returns:
+        Dictionary with per-entry arrays (split, index, cluster, digest)
+        and the list of clusters with more than one member
+    """
+    splits, indices, digests, phashes, valid, class_names = [], [], [], [], [], []
+    for split, manifest in manifests.items():
+        hashes, ok = compute_phashes(manifest, workers)
+        keep = np.flatnonzero(manifest.readable)
+        splits.extend([split] * len(keep))
+        indices.append(keep)
+        digests.append(manifest.hashes[keep])
+        phashes.append(hashes[keep])
+        valid.append(ok[keep])
+        class_names.extend(manifest.classes[label] for label in manifest.labels[keep].tolist())
+
+    indices = np.concatenate(indices)
+    digests = np.concatenate(digests)
+    phashes = np.concatenate(phashes)
+    valid = np.concatenate(valid)
+    n = len(indices)
+
+    # Exact duplicates: same content hash, linked to the first occurrence
+    _, first, inverse = np.unique(digests, return_index=True, return_inverse=True)
+    exact = np.flatnonzero(first[inverse] != np.arange(n))
+    pairs = [np.stack([first[inverse[exact]], exact], axis=1)]
+    # Near duplicates among entries that could be decoded
+    hashed = np.flatnonzero(valid)
+    near = near_duplicate_pairs(phashes[hashed], max_distance)
+    pairs.append(hashed[near])
+    cluster = connected_components(n, np.concatenate(pairs))
+
+    clusters = []
+    order = np.argsort(cluster, kind='stable')
+    starts = np.flatnonzero(np.r_[True, cluster[order][1:] != cluster[order][:-1]])
+    for members in np.split(order, starts[1:]):
+        if len(members) < 2:
+            continue
+        clusters.append({
+            'members': members.tolist(),
+            'exact': len(set(digests[members].tolist())) == 1,
+            'splits': sorted({splits[i] for i in members}),
+            'classes': sorted({class_names[i] for i in members}),
+        })
+    return {
+        'split': splits,
+        'index': indices,
+        'digest': digests,
+        'class_name': class_names,
+        'cluster': cluster,
+        'clusters': clusters,
+    }
+
+
+def deduplicate(train_dir: str, val_dir: Optional[str] = None,
+                max_distance: int = DEFAULT_MAX_DISTANCE, drop_leaked_from: str = 'val',
+                workers: Optional[int] = None, report_path: Optional[str] = None) -> Dict:
+    """
+    Report duplicates and train/val leakage and write deduplicated manifests
+
+    Args:
+        train_dir: Training image folder
+        val_dir: Validation image folder (leakage check; optional)
+        max_distance: Perceptual-hash Hamming distance for near-duplicates
+            (0 = only identical perceptual hashes)
+        drop_leaked_from: 'val' or 'train': which side loses images that
+            occur in both splits
+        workers: Threads for hashing files and processes for decoding
+        report_path: JSON report (default: <train_dir>/dedup_report.json)
+
+    Returns:
+        Report dictionary with counts, duplicate clusters, leaked and
+        label-conflicting images
+    """
+    if drop_leaked_from not in ('val', 'train'):
+        raise ValueError("drop_leaked_from must be 'val' or 'train'")
+    start = time.perf_counter()
+    dirs = {'train': Path(train_dir)}
+    if val_dir:
+        dirs['val'] = Path(val_dir)
+    # Exact content hashes come from the (incrementally refreshed) manifests
+    manifests = {split: update_manifest(str(path), workers=workers) for split, path in dirs.items()}
+    found = find_duplicates(manifests, max_distance, workers)
+
+    split, index, class_name = found['split'], found['index'], found['class_name']
+
+    def describe(i):
+        return f"{split[i]}/{manifests[split[i]].paths[index[i]]}"
+
+    drop = np.zeros(len(split), dtype=bool)
+    leaked, conflicts, groups = [], [], []
+    for cluster in found['clusters']:
+        members = cluster['members']
+        groups.append({'exact': cluster['exact'], 'images': [describe(i) for i in members]})
+        if len(cluster['classes']) > 1:
+            conflicts.append({'classes': cluster['classes'], 'images': [describe(i) for i in members]})
+        if len(cluster['splits']) > 1:
+            leaked.extend(describe(i) for i in members if split[i] == 'val')
+            for i in members:
+                if split[i] == drop_leaked_from:
+                    drop[i] = True
+        # One image per class and split survives (the first by path)
+        seen = set()
+        for i in members:
+            key = (split[i], class_name[i])
+            if drop[i]:
+                continue
+            if key in seen:
+                drop[i] = True
+            seen.add(key)
+
+    outputs = {}
+    counts = {}
+    is_split = np.array(split)
+    for name, manifest in manifests.items():
+        removed = index[(is_split == name) & drop]
+        keep = np.ones(len(manifest), dtype=bool)
+        keep[removed] = False
+        deduplicated = Manifest(manifest.root, manifest.classes,
+                                **{column: getattr(manifest, column)[keep] for column in Manifest.COLUMNS})
+        output_path = dirs[name] / DEDUP_MANIFEST_NAME
+        deduplicated.save(output_path)
+        outputs[name] = str(output_path)
+        counts[name] = {'images': int(manifest.readable.sum()),
+                        'kept': int(deduplicated.readable.sum()),
+                        'removed': len(removed)}
+
+    exact_groups = sum(1 for g in groups if g['exact'])
+    report = {
+        'max_distance': max_distance,
+        'drop_leaked_from': drop_leaked_from,
+        'counts': counts,
+        'duplicate_clusters': len(groups),
+        'exact_clusters': exact_groups,
+        'near_clusters': len(groups) - exact_groups,
+        'leaked_val_images': len(leaked),
+        'label_conflicts': len(conflicts),
+        'manifests': outputs,
+        'seconds': round(time.perf_counter() - start, 2),
+        'leaked': leaked,
+        'conflicts': conflicts,
+        'clusters': groups,
+    }
+    report_path = Path(report_path) if report_path else dirs['train'] / REPORT_NAME
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n🧬 {len(groups)} duplicate clusters ({exact_groups} exact, "
+          f"{len(groups) - exact_groups} near, Hamming <= {max_distance})")
+    for name, count in counts.items():
+        print(f"   {name}: {count['images']} images -> {count['kept']} kept ({count['removed']} removed)")
+    if val_dir:
+        share = len(leaked) / max(1, counts['val']['images'])
+        print(f"{'⚠️' if leaked else '✅'} Train/val leakage: {len(leaked)} validation images "
+              f"({share * 100:.1f}%) also occur in train; dropped from {drop_leaked_from}")
+    if conflicts:
+        print(f"⚠️ {len(conflicts)} clusters span several classes (label conflicts); see the report")
+    print(f"✅ Report saved to: {report_path}")
+    flags = ' '.join(f"--{name}-manifest {path}" for name, path in outputs.items())
+    print(f"🚀 Train on the deduplicated data with: {flags}")
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Find exact/near-duplicate images and train/val leakage; write deduplicated manifests')
+    parser.add_argument('--train-dir', type=str, required=True,
+                       help='Training image folder (one sub-directory per class)')
+    parser.add_argument('--val-dir', type=str, default=None,
+                       help='Validation image folder to check for leakage')
+    parser.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE,
+                       help='Perceptual-hash Hamming distance for near-duplicates (0-31)')
+    parser.add_argument('--drop-leaked-from', type=str, default='val', choices=['val', 'train'],
+                       help='Split that loses images occurring in both')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Hashing threads / decoding processes')
+    parser.add_argument('--report', type=str, default=None,
+                       help='Report JSON (default: <train-dir>/dedup_report.json)')
+
+    args = parser.parse_args()
+
+    deduplicate(args.train_dir, args.val_dir, args.max_distance, args.drop_leaked_from,
+                args.workers, args.report)
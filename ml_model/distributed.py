@@ -0,0 +1,167 @@
+"""
+Multi-process CPU data-parallel training helpers (torch.distributed, gloo)
+Processes are started by torchrun (RANK, WORLD_SIZE, MASTER_ADDR and
+MASTER_PORT come from the environment) or by the built-in spawner, which
+starts one process per rank on this machine and sets the same variables
+"""
+import json
+import os
+import socket
+import tempfile
+import time
+from typing import Callable, Dict, List, Sequence
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+BACKEND = 'gloo'
+
+
+def get_rank() -> int:
+    return dist.get_rank() if dist.is_available() and dist.is_initialized() else 0
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if dist.is_available() and dist.is_initialized() else 1
+
+
+def is_main_process() -> bool:
+    return get_rank() == 0
+
+
+def init_distributed() -> bool:
+    """
+    Join the process group when launched with WORLD_SIZE > 1
+
+    Also splits the machine's cores between the local processes, since
+    every process would otherwise start one intra-op thread per core.
+
+    Returns:
+        True if this process is part of a multi-process group
+    """
+    if int(os.environ.get('WORLD_SIZE', '1')) <= 1:
+        return False
+    if not dist.is_initialized():
+        dist.init_process_group(backend=BACKEND)
+    local_world_size = int(os.environ.get('LOCAL_WORLD_SIZE', dist.get_world_size()))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+    return True
+
+
+def cleanup_distributed():
+    if dist.is_available() and dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def all_reduce_sum(*values: float) -> List[float]:
+    """Sum scalars over all ranks (returned unchanged in a single process)"""
+    if get_world_size() == 1:
+        return list(values)
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.tolist()
+
+
+def broadcast_int(value: int, src: int = 0) -> int:
+    """Rank src's value on every rank"""
+    if get_world_size() == 1:
+        return value
+    tensor = torch.tensor([value], dtype=torch.int64)
+    dist.broadcast(tensor, src=src)
+    return int(tensor.item())
+
+
+def all_gather_objects(value) -> List:
+    """Every rank's (picklable) value, indexed by rank"""
+    if get_world_size() == 1:
+        return [value]
+    values = [None] * get_world_size()
+    dist.all_gather_object(values, value)
+    return values
+
+
+def barrier():
+    if get_world_size() > 1:
+        dist.barrier()
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _spawned_worker(local_rank: int, nproc: int, port: int, fn: Callable, kwargs: Dict):
+    os.environ.update({
+        'RANK': str(local_rank),
+        'LOCAL_RANK': str(local_rank),
+        'WORLD_SIZE': str(nproc),
+        'LOCAL_WORLD_SIZE': str(nproc),
+        'MASTER_ADDR': '127.0.0.1',
+        'MASTER_PORT': str(port),
+    })
+    fn(**kwargs)
+
+
+def spawn(fn: Callable, nproc: int, **kwargs):
+    """
+    Run fn(**kwargs) in nproc local processes forming one gloo process group
+
+    fn must be importable (module level) and call init_distributed().
+    """
+    mp.spawn(_spawned_worker, args=(nproc, _free_port(), fn, kwargs), nprocs=nproc, join=True)
+
+
+def _benchmark_worker(target: Callable, result_path: str, kwargs: Dict):
+    """Spawned benchmark rank: run target and let rank 0 store its summary"""
+    summary = target(**kwargs)
+    if is_main_process():
+        with open(result_path, 'w') as f:
+            json.dump(summary, f)
+
+
+def scaling_benchmark(fn: Callable, process_counts: Sequence[int], **kwargs) -> List[Dict]:
+    """
+    Measure throughput of fn at several process counts
+
+    fn is run with the built-in spawner for every count and must return a
+    dictionary with 'images_per_sec' on rank 0 (train_model does).
+    Efficiency is throughput(N) / (N * throughput(1)); below 1.0 the extra
+    processes are losing time to communication, memory bandwidth or data
+    loading.
+
+    Returns:
+        One row per process count with images_per_sec, speedup and efficiency
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for nproc in process_counts:
+            result_path = os.path.join(tmp, f'{nproc}.json')
+            start = time.perf_counter()
+            if nproc == 1:
+                _benchmark_worker(fn, result_path, kwargs)
+            else:
+                spawn(_benchmark_worker, nproc, target=fn, result_path=result_path, kwargs=kwargs)
+            with open(result_path) as f:
+                summary = json.load(f)
+            results.append({
+                'processes': nproc,
+                'images_per_sec': summary['images_per_sec'],
+                'wall_seconds': time.perf_counter() - start,
+            })
+
+    baseline = next((r for r in results if r['processes'] == 1), results[0])
+    per_process = baseline['images_per_sec'] / baseline['processes']
+    for row in results:
+        row['speedup'] = row['images_per_sec'] / baseline['images_per_sec']
+        row['efficiency'] = row['images_per_sec'] / (row['processes'] * per_process)
+    return results
+
+
+def print_scaling_report(results: Sequence[Dict]):
+    print(f"\n{'Processes':>9} {'images/s':>10} {'speedup':>8} {'efficiency':>11}")
+    print("-" * 42)
+    for row in results:
+        print(f"{row['processes']:>9} {row['images_per_sec']:>10.1f} "
+              f"{row['speedup']:>7.2f}x {row['efficiency']*100:>10.0f}%")
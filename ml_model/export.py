@@ -0,0 +1,359 @@
+"""
+Post-training export of every served inference variant
+Turns a trained checkpoint into FP32, TorchScript, int8 and ONNX models,
+checks each against the FP32 top-1 prediction on the validation set,
+benchmarks CPU latency/throughput at batch sizes 1/8/32 and records
+everything in a manifest the model registry (ml_model/registry.py) loads
+"""
+import copy
+import json
+import shutil
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+# Allow running as a script (python ml_model/export.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.architectures import load_checkpoint, save_checkpoint
+from ml_model.benchmark import time_callable
+from ml_model.calibration import labelled_samples
+from ml_model.preprocessing import IMAGE_SIZE, load_batch
+from ml_model.registry import DEFAULT_MODEL_ID, add_manifest_entry, default_manifest_path, load_inference_backend
+from ml_model.torchscript_inference import save_torchscript
+
+VARIANTS = ('fp32', 'torchscript', 'int8', 'onnx')
+DEFAULT_BATCH_SIZES = (1, 8, 32)
+# Variants whose validation top-1 agrees with FP32 less often are not activated
+MIN_AGREEMENT = 0.99
+
+# Checkpoint entries dropped from the FP32 variant
+TRAINING_ONLY_KEYS = ('optimizer_state_dict', 'resume')
+
+# Output file name and registry format of each variant
+VARIANT_FILES = {
+    'fp32': ('model_fp32.pth', 'pytorch'),
+    'torchscript': ('model_torchscript.pt', 'torchscript'),
+    'int8': ('model_int8.pt', 'torchscript'),
+    'onnx': ('model.onnx', 'onnx'),
+}
+
+
+def _metadata(inference, precision: str) -> Dict:
+    """Checkpoint details stored inside exported TorchScript models"""
+    metadata = {'arch': inference.arch, 'temperature': inference.temperature, 'precision': precision}
+    if inference.calibration:
+        metadata['calibration'] = inference.calibration
+    return metadata
+
+
+def export_torchscript(model: torch.nn.Module, output_path: Path, example: torch.Tensor,
+                       metadata: Dict) -> Path:
+    """Trace and freeze the FP32 model (constants folded, dropout removed)"""
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(model, example))
+    return save_torchscript(traced, output_path, metadata)
+
+
+def export_int8(model: torch.nn.Module, output_path: Path, calibration_batches: Sequence[np.ndarray],
+                metadata: Dict) -> Path:
+    """
+    Static post-training int8 quantization (FX graph mode), saved as TorchScript
+
+    Weights are quantized per channel and activation ranges are observed on
+    the calibration batches, so convolutions run on int8 kernels end to
+    end. The FP32 model is left untouched.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = torch.backends.quantized.engine
+    example = torch.from_numpy(calibration_batches[0])
+    with warnings.catch_warnings():
+        # FX quantization is deprecated in favour of torchao but still the
+        # only int8 path that ships with torch itself
+        warnings.simplefilter('ignore')
+        prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine),
+                              example_inputs=(example,))
+        with torch.no_grad():
+            for batch in calibration_batches:
+                prepared(torch.from_numpy(batch))
+            quantized = convert_fx(prepared)
+            traced = torch.jit.freeze(torch.jit.trace(quantized, example))
+    return save_torchscript(traced, output_path, {**metadata, 'quantized_engine': engine})
+
+
+def _validation_samples(val_dir: str, class_to_idx: Dict[str, int],
+                        max_images: Optional[int] = None, val_manifest: Optional[str] = None) -> List:
+    """Labelled validation images, evenly subsampled to at most max_images"""
+    samples = labelled_samples(val_dir, class_to_idx, val_manifest)
+    if not samples:
+        raise ValueError(f"No labelled images found in {val_dir}")
+    if max_images and len(samples) > max_images:
+        samples = [samples[i] for i in np.linspace(0, len(samples) - 1, max_images).astype(int)]
+    return samples
+
+
+def _load_batches(samples, batch_size: int):
+    """Yield (NCHW float32 batch, labels) for chunks of labelled samples"""
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        batch, _, positions, _ = load_batch([path for path, _ in chunk], IMAGE_SIZE)
+        if positions:
+            yield batch, np.array([chunk[i][1] for i in positions])
+
+
+def check_agreement(backends: Dict, reference: str, samples, batch_size: int = 32) -> Dict[str, Dict]:
+    """
+    Top-1 agreement with the reference variant and accuracy of every variant
+
+    Every validation batch is decoded once and run through all backends.
+    """
+    agree = dict.fromkeys(backends, 0)
+    correct = dict.fromkeys(backends, 0)
+    total = 0
+    for batch, labels in _load_batches(samples, batch_size):
+        predictions = {name: backend.predict_probabilities(batch).argmax(axis=1)
+                       for name, backend in backends.items()}
+        for name, predicted in predictions.items():
+            agree[name] += int((predicted == predictions[reference]).sum())
+            correct[name] += int((predicted == labels).sum())
+        total += len(labels)
+    return {
+        name: {'top1_agreement': round(agree[name] / total, 4),
+               'val_accuracy': round(correct[name] / total, 4),
+               'val_images': total}
+        for name in backends
+    }
+
+
+def benchmark_backend(backend, images: np.ndarray, batch_sizes: Sequence[int],
+                      iterations: int = 20) -> Dict[str, Dict]:
+    """Latency and throughput of predict_probabilities at each batch size"""
+    results = {}
+    for batch_size in batch_sizes:
+        batch = np.ascontiguousarray(np.resize(images, (batch_size,) + images.shape[1:]))
+        timing = time_callable(lambda: backend.predict_probabilities(batch), iterations=iterations)
+        results[str(batch_size)] = {
+            'latency_ms': round(timing['mean_ms'], 2),
+            'p50_ms': round(timing['p50_ms'], 2),
+            'p90_ms': round(timing['p90_ms'], 2),
+            'images_per_sec': round(1000 * batch_size / timing['mean_ms'], 1),
+        }
+    return results
+
+
+def export_model(
+    model_path: str,
+    val_dir: str,
+    output_dir: str = None,
+    manifest_path: str = None,
+    version: str = None,
+    model_id: str = DEFAULT_MODEL_ID,
+    variants: Sequence[str] = VARIANTS,
+    batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+    max_val_images: int = None,
+    calibration_images: int = 256,
+    min_agreement: float = MIN_AGREEMENT,
+    iterations: int = 20,
+    activate: str = 'fp32',
+    val_manifest: str = None
+) -> Dict:
+    """
+    Export, verify and benchmark every inference variant of a checkpoint
+
+    Args:
+        model_path: Trained checkpoint (best_model.pth)
+        val_dir: Validation directory with one sub-directory per class
+        output_dir: Where the variants go (default:
+            <checkpoint dir>/export/<version>)
+        manifest_path: Registry manifest to add the variants to (default:
+            the one the registry reads, MODEL_MANIFEST_PATH or
+            ml_model/checkpoints/manifest.json)
+        version: Version label (default: export timestamp); each variant is
+            registered as "<version>-<variant>"
+        model_id: Registry model id
+        variants: Subset of VARIANTS to export
+        batch_sizes: Batch sizes for the latency benchmark
+        max_val_images: Evenly subsample the validation set for the
+            agreement check (default: all images)
+        calibration_images: Validation images used to observe int8
+            activation ranges
+        min_agreement: Minimum top-1 agreement with FP32 for a variant to
+            count as verified
+        iterations: Timed iterations per benchmark measurement
+        activate: Variant to make active in the manifest; falls back to
+            fp32 if it did not pass verification
+        val_manifest: Dataset manifest selecting the validation images
+            (e.g. val/manifest_dedup.npz from dedup.py)
+
+    Returns:
+        Export report (also written to <output_dir>/export_report.json)
+    """
+    from ml_model.export_onnx import export_onnx
+    from ml_model.inference import PlantDiseaseInference
+
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        raise ValueError(f"Unknown variants: {', '.join(sorted(unknown))}. Available: {', '.join(VARIANTS)}")
+    # FP32 is the reference for the agreement check
+    variants = ['fp32'] + [v for v in VARIANTS if v in variants and v != 'fp32']
+
+    model_path = Path(model_path)
+    version = version or time.strftime('%Y%m%d-%H%M%S')
+    output_dir = Path(output_dir) if output_dir else model_path.parent / 'export' / version
+    manifest_path = Path(manifest_path) if manifest_path else default_manifest_path()
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    # The FP32 variant is a frozen copy (retraining overwrites best_model.pth)
+    # without optimizer and resume state, which inference never reads
+    class_mapping_path = output_dir / 'class_mapping.json'
+    shutil.copyfile(model_path.parent / 'class_mapping.json', class_mapping_path)
+    checkpoint = load_checkpoint(model_path, mmap=False)
+    paths = {'fp32': save_checkpoint(
+        {k: v for k, v in checkpoint.items() if k not in TRAINING_ONLY_KEYS},
+        output_dir / VARIANT_FILES['fp32'][0]
+    )}
+    del checkpoint
+
+    reference = PlantDiseaseInference(str(paths['fp32']), str(class_mapping_path),
+                                      precision='fp32', channels_last=False)
+    model = reference.model.to('cpu').eval()
+    arch = reference.arch
+    samples = _validation_samples(val_dir, reference.class_to_idx, max_val_images, val_manifest)
+    calibration_samples = _validation_samples(val_dir, reference.class_to_idx, calibration_images,
+                                              val_manifest)
+    example = torch.from_numpy(next(_load_batches(samples, 8))[0])
+
+    print(f"\n📦 Exporting {', '.join(variants)} to {output_dir}")
+    if 'torchscript' in variants:
+        paths['torchscript'] = export_torchscript(
+            model, output_dir / VARIANT_FILES['torchscript'][0], example, _metadata(reference, 'fp32'))
+    if 'int8' in variants:
+        calibration_batches = [batch for batch, _ in _load_batches(calibration_samples, 32)]
+        paths['int8'] = export_int8(
+            model, output_dir / VARIANT_FILES['int8'][0], calibration_batches, _metadata(reference, 'int8'))
+    if 'onnx' in variants:
+        paths['onnx'] = export_onnx(str(paths['fp32']), str(output_dir / VARIANT_FILES['onnx'][0]),
+                                    str(class_mapping_path), verify=False)
+    del reference, model
+
+    # Verify and benchmark through the same backends the registry serves with
+    backends = {name: load_inference_backend(paths[name], class_mapping_path, VARIANT_FILES[name][1])
+                for name in variants}
+    print(f"\n🔍 Checking top-1 agreement with FP32 on {len(samples)} validation images...")
+    checks = check_agreement(backends, 'fp32', samples)
+
+    bench_images = next(_load_batches(samples, max(batch_sizes)))[0]
+    report = {'version': version, 'model_id': model_id, 'arch': arch, 'source': str(model_path),
+              'threads': torch.get_num_threads(), 'variants': {}}
+    for name in variants:
+        print(f"⏱️  Benchmarking {name}...")
+        path = Path(paths[name])
+        report['variants'][name] = {
+            'path': path.name,
+            'format': VARIANT_FILES[name][1],
+            'size_mb': round(path.stat().st_size / 1024 / 1024, 2),
+            **checks[name],
+            'verified': checks[name]['top1_agreement'] >= min_agreement,
+            'benchmark': benchmark_backend(backends[name], bench_images, batch_sizes, iterations),
+        }
+    del backends
+
+    if not report['variants'].get(activate, {}).get('verified'):
+        if activate != 'fp32':
+            print(f"⚠️ {activate} not verified; activating fp32 instead")
+        activate = 'fp32'
+    report['active'] = f"{version}-{activate}"
+    # The active variant is registered last (add_manifest_entry activates it)
+    for name in sorted(variants, key=lambda v: v == activate):
+        entry = report['variants'][name]
+        add_manifest_entry(
+            manifest_path, output_dir / entry['path'], f"{version}-{name}", model_id,
+            class_mapping_path, arch, entry['format'],
+            extra={'variant': name, **{k: v for k, v in entry.items() if k not in ('path', 'format')}}
+        )
+
+    with open(output_dir / 'export_report.json', 'w') as f:
+        json.dump(report, f, indent=2)
+    print_export_report(report, batch_sizes)
+    print(f"✅ Manifest updated: {manifest_path} (active: {report['active']})")
+    return report
+
+
+def print_export_report(report: Dict, batch_sizes: Sequence[int]):
+    header = ' '.join(f"{'b' + str(b) + ' ms':>9} {'img/s':>7}" for b in batch_sizes)
+    print(f"\n{'Variant':<12} {'MB':>7} {'agree':>7} {'acc':>7} {header}")
+    print("-" * (36 + 18 * len(batch_sizes)))
+    for name, entry in report['variants'].items():
+        timings = ' '.join(f"{entry['benchmark'][str(b)]['latency_ms']:>9.1f} "
+                           f"{entry['benchmark'][str(b)]['images_per_sec']:>7.1f}" for b in batch_sizes)
+        flag = '' if entry['verified'] else '  ⚠️ below agreement threshold'
+        print(f"{name:<12} {entry['size_mb']:>7.1f} {entry['top1_agreement']*100:>6.1f}% "
+              f"{entry['val_accuracy']*100:>6.1f}% {timings}{flag}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Export FP32, TorchScript, int8 and ONNX models with verification and benchmarks')
+    parser.add_argument('--model', type=str, default='ml_model/checkpoints/best_model.pth',
+                       help='Trained checkpoint to export')
+    parser.add_argument('--val-dir', type=str, required=True,
+                       help='Validation directory with one sub-directory per class')
+    parser.add_argument('--output-dir', type=str, default=None,
+                       help='Output directory (default: <checkpoint dir>/export/<version>)')
+    parser.add_argument('--manifest', type=str, default=None,
+                       help='Registry manifest to update (default: MODEL_MANIFEST_PATH or ml_model/checkpoints/manifest.json)')
+    parser.add_argument('--version', type=str, default=None,
+                       help='Version label (default: timestamp)')
+    parser.add_argument('--model-id', type=str, default=DEFAULT_MODEL_ID,
+                       help='Registry model id')
+    parser.add_argument('--variants', type=str, nargs='+', default=list(VARIANTS), choices=VARIANTS,
+                       help='Variants to export (fp32 is always included as the reference)')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(DEFAULT_BATCH_SIZES),
+                       help='Batch sizes for the latency benchmark')
+    parser.add_argument('--max-val-images', type=int, default=None,
+                       help='Subsample the validation set for the agreement check')
+    parser.add_argument('--calibration-images', type=int, default=256,
+                       help='Validation images for int8 activation calibration')
+    parser.add_argument('--min-agreement', type=float, default=MIN_AGREEMENT,
+                       help='Minimum top-1 agreement with FP32 for a variant to be verified')
+    parser.add_argument('--iterations', type=int, default=20,
+                       help='Timed iterations per benchmark measurement')
+    parser.add_argument('--activate', type=str, default='fp32', choices=VARIANTS,
+                       help='Variant to make active in the manifest (if verified)')
+    parser.add_argument('--val-manifest', type=str, default=None,
+                       help='Dataset manifest selecting the validation images (e.g. from dedup.py)')
+    parser.add_argument('--threads', type=int, default=None,
+                       help='torch intra-op threads (default: torch default)')
+
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    export_model(
+        model_path=args.model,
+        val_dir=args.val_dir,
+        output_dir=args.output_dir,
+        manifest_path=args.manifest,
+        version=args.version,
+        model_id=args.model_id,
+        variants=args.variants,
+        batch_sizes=args.batch_sizes,
+        max_val_images=args.max_val_images,
+        calibration_images=args.calibration_images,
+        min_agreement=args.min_agreement,
+        iterations=args.iterations,
+        activate=args.activate,
+        val_manifest=args.val_manifest
+    )
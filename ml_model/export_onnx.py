@@ -0,0 +1,141 @@
+"""
+Export trained plant disease model checkpoint to ONNX
+The exported model is served by ml_model/onnx_inference.py
+"""
+import json
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+
+# Allow running as a script (python ml_model/export_onnx.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.inference import PlantDiseaseInference
+
+
+def export_onnx(
+    model_path: str,
+    output_path: str = None,
+    class_mapping_path: str = None,
+    opset_version: int = 17,
+    verify: bool = True
+) -> Path:
+    """
+    Export a trained checkpoint to ONNX with a dynamic batch dimension
+
+    Args:
+        model_path: Path to trained model checkpoint (.pth file)
+        output_path: Destination .onnx file (defaults to model_path with .onnx suffix)
+        class_mapping_path: Path to class mapping JSON file
+        opset_version: ONNX opset to target
+        verify: Compare ONNX Runtime output against PyTorch after export
+
+    Returns:
+        Path to the exported ONNX model
+    """
+    model_path = Path(model_path)
+    output_path = Path(output_path) if output_path else model_path.with_suffix('.onnx')
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Reuse the inference loader so the exported graph matches what we serve
+    inference = PlantDiseaseInference(
+        str(model_path), class_mapping_path, precision='fp32', channels_last=False
+    )
+    model = inference.model.to('cpu').eval()
+
+    dummy_input = torch.randn(2, 3, 224, 224)
+    torch.onnx.export(
+        model,
+        dummy_input,
+        str(output_path),
+        input_names=['input'],
+        output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=opset_version,
+        do_constant_folding=True
+    )
+    metadata = {'arch': inference.arch, 'temperature': inference.temperature}
+    if inference.calibration:
+        metadata['calibration'] = json.dumps(inference.calibration)
+    _add_metadata(output_path, metadata)
+    print(f"✅ Exported ONNX model to: {output_path}")
+
+    # ONNX inference looks for class_mapping.json next to the model
+    if class_mapping_path is None:
+        class_mapping_path = model_path.parent / 'class_mapping.json'
+    mapping_dest = output_path.parent / 'class_mapping.json'
+    if Path(class_mapping_path).resolve() != mapping_dest.resolve():
+        shutil.copyfile(class_mapping_path, mapping_dest)
+
+    if verify:
+        _verify_export(model, output_path, dummy_input)
+
+    return output_path
+
+
+def _add_metadata(output_path: Path, metadata: dict):
+    """Record checkpoint details (e.g. architecture) in the ONNX model"""
+    import onnx
+
+    # Also reads weights the exporter wrote to an external data file
+    onnx_model = onnx.load(str(output_path))
+    for key, value in metadata.items():
+        entry = onnx_model.metadata_props.add()
+        entry.key = key
+        entry.value = str(value)
+    onnx.save(onnx_model, str(output_path))
+    # The weights are stored inline now; drop the stale external copy
+    # (written by the dynamo-based exporter of newer torch versions)
+    external_data = output_path.with_name(output_path.name + '.data')
+    if external_data.exists():
+        external_data.unlink()
+
+
+def _verify_export(model: torch.nn.Module, output_path: Path, sample: torch.Tensor):
+    """Check that ONNX Runtime reproduces the PyTorch logits"""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("⚠️ onnxruntime not installed - skipping export verification")
+        return
+
+    with torch.no_grad():
+        expected = model(sample).numpy()
+
+    session = ort.InferenceSession(str(output_path), providers=['CPUExecutionProvider'])
+    actual = session.run(None, {session.get_inputs()[0].name: sample.numpy()})[0]
+
+    max_diff = float(np.abs(expected - actual).max())
+    same_top1 = bool((expected.argmax(1) == actual.argmax(1)).all())
+    print(f"🔍 Max logit difference vs PyTorch: {max_diff:.2e} (top-1 match: {same_top1})")
+    if not same_top1 or max_diff > 1e-3:
+        raise RuntimeError(f"ONNX export verification failed (max diff {max_diff:.2e})")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Export plant disease model to ONNX')
+    parser.add_argument('--model', type=str,
+                       default='ml_model/checkpoints/best_model.pth',
+                       help='Path to model checkpoint')
+    parser.add_argument('--output', type=str, default=None,
+                       help='Output .onnx path (default: next to checkpoint)')
+    parser.add_argument('--opset', type=int, default=17,
+                       help='ONNX opset version')
+    parser.add_argument('--no-verify', action='store_true',
+                       help='Skip ONNX Runtime verification')
+
+    args = parser.parse_args()
+
+    export_onnx(
+        model_path=args.model,
+        output_path=args.output,
+        opset_version=args.opset,
+        verify=not args.no_verify
+    )
@@ -0,0 +1,406 @@
+"""
+Head-only training on cached backbone features
+The frozen backbone runs once over the dataset and the pooled features are
+cached to disk; the classification head is then trained on the cached
+features in seconds per epoch and folded back into a full checkpoint that
+PlantDiseaseInference loads like any other best_model.pth
+
+    extract   backbone features of an image folder -> features.npz
+    train     head on cached train/val features    -> head.pth
+    fold      head + backbone                      -> best_model.pth
+"""
+import copy
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader
+
+# Allow running as a script (python ml_model/head_training.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.architectures import (
+    ARCHITECTURES, DEFAULT_ARCH, PlantDiseaseModel, build_head, load_checkpoint,
+    load_checkpoint_model, save_checkpoint
+)
+from ml_model.dataset_manifest import folder_signature
+from ml_model.preprocessing import IMAGE_SIZE, normalize_batch
+
+IMAGENET_BACKBONE = 'imagenet'
+
+
+def backbone_name(backbone: Optional[str] = None) -> str:
+    """'imagenet' or the absolute checkpoint path, as recorded with cached features"""
+    if backbone in (None, IMAGENET_BACKBONE):
+        return IMAGENET_BACKBONE
+    return str(Path(backbone).resolve())
+
+
+def load_backbone(arch: str = DEFAULT_ARCH, backbone: Optional[str] = None) -> PlantDiseaseModel:
+    """
+    Model whose backbone provides the frozen features
+
+    Args:
+        arch: Architecture for ImageNet weights (ignored for a checkpoint,
+            which records its own)
+        backbone: None or 'imagenet' for torchvision's pretrained weights,
+            otherwise a trained checkpoint whose backbone is reused
+    """
+    if backbone in (None, IMAGENET_BACKBONE):
+        model = PlantDiseaseModel(num_classes=1, pretrained=True, arch=arch)
+    else:
+        checkpoint = load_checkpoint(backbone, mmap=False)
+        # The last weight in the state dict is the head's output layer
+        num_classes = [v for k, v in checkpoint['model_state_dict'].items()
+                       if k.endswith('.weight')][-1].shape[0]
+        model = load_checkpoint_model(checkpoint, num_classes)
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad = False
+    return model
+
+
+def _image_dataset(data_dir: str, image_cache: Optional[str], transform=None):
+    """Image folder (or its memory-mapped cache) yielding uint8 arrays or transformed tensors"""
+    from ml_model.dataset_cache import MemmapImageDataset
+    from ml_model.preprocessing import Uint8ImageLoader
+    from ml_model.train_model import PlantDiseaseDataset
+
+    if image_cache:
+        return MemmapImageDataset(image_cache, transform=transform)
+    if transform is not None:
+        return PlantDiseaseDataset(data_dir, transform=transform)
+    return PlantDiseaseDataset(data_dir, loader=Uint8ImageLoader(IMAGE_SIZE))
+
+
+@torch.no_grad()
+def extract_features(model: PlantDiseaseModel, dataset, batch_size: int = 64,
+                     num_workers: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pooled backbone features for every item of a dataset
+
+    Returns:
+        Tuple of (float16 features of shape (N, num_features), int64 labels)
+    """
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers)
+    features = np.empty((len(dataset), model.spec.num_features), dtype=np.float16)
+    labels = np.empty(len(dataset), dtype=np.int64)
+    row = 0
+    start = time.perf_counter()
+    for images, targets in loader:
+        if images.dtype == torch.uint8:
+            images = torch.from_numpy(normalize_batch(images.numpy()))
+        batch = model.forward_features(images).numpy()
+        features[row:row + len(batch)] = batch
+        labels[row:row + len(batch)] = targets.numpy()
+        row += len(batch)
+        print(f"\r   {row}/{len(dataset)} images "
+              f"({row / (time.perf_counter() - start):.0f} images/s)", end='', flush=True)
+    print()
+    return features, labels
+
+
+def build_feature_cache(data_dir: str, output_path: str, arch: str = DEFAULT_ARCH,
+                        backbone: Optional[str] = None, classes: Optional[Sequence[str]] = None,
+                        batch_size: int = 64, augment_views: int = 0,
+                        image_cache: Optional[str] = None, num_workers: int = 2,
+                        model: Optional[PlantDiseaseModel] = None) -> Dict:
+    """
+    Run the frozen backbone over an image folder and save the features
+
+    Args:
+        data_dir: Directory with one sub-directory per class
+        output_path: .npz file to write
+        arch: Backbone architecture (ImageNet weights)
+        backbone: None/'imagenet' or a checkpoint whose backbone to reuse
+        classes: Expected class order (the training classes for validation)
+        batch_size: Images per forward pass
+        augment_views: Extra passes with training augmentation appended to
+            the clean features (the head otherwise never sees augmentation)
+        image_cache: Optional memory-mapped cache of data_dir (dataset_cache.py)
+        num_workers: DataLoader workers
+        model: Already loaded backbone model (skips load_backbone)
+
+    Returns:
+        Summary with the number of rows, classes and elapsed seconds
+    """
+    start = time.perf_counter()
+    signature = folder_signature(data_dir)
+    model = model or load_backbone(arch, backbone)
+    dataset = _image_dataset(data_dir, image_cache)
+    if classes is not None and list(dataset.classes) != list(classes):
+        raise ValueError(f"Classes in {data_dir} do not match the training classes")
+
+    print(f"🧊 Extracting {model.arch} features from {data_dir} ({len(dataset)} images)")
+    features, labels = extract_features(model, dataset, batch_size, num_workers)
+
+    if augment_views:
+        from ml_model.train_model import get_transforms
+        augmented = _image_dataset(data_dir, image_cache, transform=get_transforms()[0])
+        views = [features]
+        for view in range(augment_views):
+            print(f"   Augmented view {view + 1}/{augment_views}")
+            views.append(extract_features(model, augmented, batch_size, num_workers)[0])
+        features = np.concatenate(views)
+        labels = np.tile(labels, augment_views + 1)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(output_path, features=features, labels=labels,
+             classes=np.array(dataset.classes, dtype=str), arch=model.arch,
+             backbone=backbone_name(backbone), augment_views=augment_views,
+             data_dir=str(Path(data_dir).resolve()), data_signature=signature)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Saved {features.shape[0]} x {features.shape[1]} features to {output_path} "
+          f"({features.nbytes / 1024 / 1024:.0f} MB) in {elapsed:.1f}s")
+    return {'rows': int(features.shape[0]), 'classes': list(dataset.classes), 'seconds': elapsed}
+
+
+def load_features(path: str) -> Dict:
+    """Cached features, labels and the backbone they were extracted with"""
+    with np.load(path, allow_pickle=False) as data:
+        return {
+            'features': torch.from_numpy(data['features'].astype(np.float32)),
+            'labels': torch.from_numpy(data['labels']),
+            'classes': data['classes'].tolist(),
+            'arch': str(data['arch']),
+            'backbone': str(data['backbone']),
+        }
+
+
+def train_head(train_features: str, val_features: str, output_path: str,
+               num_epochs: int = 30, batch_size: int = 256,
+               learning_rate: float = 0.001) -> Dict:
+    """
+    Train the classification head on cached features
+
+    Args:
+        train_features: .npz written by build_feature_cache for training data
+        val_features: .npz for validation data (same backbone and classes)
+        output_path: head.pth to write (head weights plus backbone metadata)
+        num_epochs: Training epochs
+        batch_size: Feature vectors per step
+        learning_rate: Adam learning rate
+
+    Returns:
+        The saved head checkpoint dictionary (without weights)
+    """
+    train = load_features(train_features)
+    val = load_features(val_features)
+    if (train['arch'], train['backbone']) != (val['arch'], val['backbone']):
+        raise ValueError("Train and validation features come from different backbones")
+    if train['classes'] != val['classes']:
+        raise ValueError("Train and validation features have different classes")
+
+    num_features = train['features'].shape[1]
+    head = build_head(num_features, len(train['classes']))
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(head.parameters(), lr=learning_rate)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='max', factor=0.5, patience=5)
+
+    print(f"🎯 Training {train['arch']} head on {len(train['labels'])} cached features "
+          f"({len(train['classes'])} classes)")
+    best_accuracy, best_epoch, best_state = -1.0, 0, None
+    for epoch in range(num_epochs):
+        start = time.perf_counter()
+        head.train()
+        train_loss, train_correct = 0.0, 0
+        for idx in torch.randperm(len(train['labels'])).split(batch_size):
+            features, labels = train['features'][idx], train['labels'][idx]
+            optimizer.zero_grad()
+            outputs = head(features)
+            loss = criterion(outputs, labels)
+            loss.backward()
+            optimizer.step()
+            train_loss += loss.item() * len(labels)
+            train_correct += (outputs.argmax(1) == labels).sum().item()
+
+        head.eval()
+        with torch.no_grad():
+            outputs = head(val['features'])
+            val_loss = criterion(outputs, val['labels']).item()
+            val_accuracy = 100. * (outputs.argmax(1) == val['labels']).float().mean().item()
+        scheduler.step(val_accuracy)
+
+        n = len(train['labels'])
+        print(f"Epoch {epoch + 1}/{num_epochs}: train loss {train_loss / n:.4f}, "
+              f"acc {100. * train_correct / n:.2f}% | val loss {val_loss:.4f}, "
+              f"acc {val_accuracy:.2f}% ({time.perf_counter() - start:.2f}s)")
+        if val_accuracy > best_accuracy:
+            best_accuracy, best_epoch = val_accuracy, epoch
+            best_state = copy.deepcopy(head.state_dict())
+
+    checkpoint = {
+        'epoch': best_epoch,
+        'accuracy': best_accuracy,
+        'classes': train['classes'],
+        'arch': train['arch'],
+        'backbone': train['backbone'],
+        'num_features': num_features,
+    }
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    torch.save({**checkpoint, 'head_state_dict': best_state}, output_path)
+    print(f"✅ Saved head with validation accuracy {best_accuracy:.2f}% to {output_path}")
+    return checkpoint
+
+
+def fold_head(head_path: str, output_path: str,
+              model: Optional[PlantDiseaseModel] = None) -> Path:
+    """
+    Combine a trained head with its backbone into a full checkpoint
+
+    The result has the same layout as train_model.py's best_model.pth and
+    a class_mapping.json is written next to it, so PlantDiseaseInference,
+    calibration and the ONNX export load it unchanged.
+
+    Args:
+        head_path: head.pth written by train_head
+        output_path: Full checkpoint to write
+        model: Already loaded backbone model (skips load_backbone)
+    """
+    head_checkpoint = torch.load(head_path, map_location='cpu')
+    classes = head_checkpoint['classes']
+    model = model or load_backbone(head_checkpoint['arch'], head_checkpoint['backbone'])
+    if model.arch != head_checkpoint['arch']:
+        raise ValueError(f"Head was trained on {head_checkpoint['arch']} features, "
+                         f"backbone is {model.arch}")
+
+    head = build_head(model.spec.num_features, len(classes))
+    head.load_state_dict(head_checkpoint['head_state_dict'])
+    setattr(model.backbone, model.spec.head_attr, head)
+
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    save_checkpoint({
+        'epoch': head_checkpoint['epoch'],
+        'model_state_dict': model.state_dict(),
+        'accuracy': head_checkpoint['accuracy'],
+        'classes': classes,
+        'arch': head_checkpoint['arch'],
+        'teacher': None,
+        'head_only': {'backbone': head_checkpoint['backbone']},
+    }, output_path)
+    with open(output_path.parent / 'class_mapping.json', 'w') as f:
+        json.dump({'classes': classes,
+                   'class_to_idx': {name: i for i, name in enumerate(classes)}}, f, indent=2)
+    print(f"✅ Folded head into full checkpoint: {output_path}")
+    return output_path
+
+
+def train_head_only(train_dir: str, val_dir: str, output_dir: str,
+                    arch: str = DEFAULT_ARCH, backbone: Optional[str] = None,
+                    num_epochs: int = 30, batch_size: int = 256, learning_rate: float = 0.001,
+                    cache_dir: Optional[str] = None, augment_views: int = 0,
+                    extract_batch_size: int = 64) -> Path:
+    """
+    Extract (or reuse) cached features, train the head and fold it into best_model.pth
+
+    Features are stored in <output_dir>/features and reused when they exist
+    for the same backbone and the same, unchanged data directory, so
+    re-running with other head hyperparameters skips the backbone entirely.
+    """
+    output = Path(output_dir)
+    feature_dir = output / 'features'
+    source = backbone_name(backbone)
+    num_workers = min(4, os.cpu_count() or 1)
+
+    model = None
+    classes = None
+    for split, data_dir in (('train', train_dir), ('val', val_dir)):
+        path = feature_dir / f'{split}.npz'
+        if path.exists():
+            with np.load(path, allow_pickle=False) as data:
+                # Older caches without a data signature are rebuilt
+                reusable = ('data_signature' in data.files
+                            and str(data['data_dir']) == str(Path(data_dir).resolve())
+                            and str(data['data_signature']) == folder_signature(data_dir)
+                            and str(data['backbone']) == source
+                            and (source != IMAGENET_BACKBONE or str(data['arch']) == arch)
+                            and (split == 'val' or int(data['augment_views']) == augment_views))
+                cached_classes = data['classes'].tolist()
+            if reusable:
+                print(f"🧊 Reusing cached {split} features: {path}")
+                classes = classes or cached_classes
+                continue
+        model = model or load_backbone(arch, backbone)
+        image_cache = None
+        if cache_dir:
+            from ml_model.dataset_cache import ensure_cache
+            image_cache = Path(cache_dir) / split
+            ensure_cache(data_dir, image_cache, IMAGE_SIZE, classes=classes)
+        summary = build_feature_cache(
+            data_dir, path, arch, backbone, classes, extract_batch_size,
+            augment_views if split == 'train' else 0, image_cache, num_workers, model
+        )
+        classes = classes or summary['classes']
+
+    head_path = output / 'head.pth'
+    train_head(feature_dir / 'train.npz', feature_dir / 'val.npz', head_path,
+               num_epochs, batch_size, learning_rate)
+    return fold_head(head_path, output / 'best_model.pth', model)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Head-only training on cached backbone features')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract = subparsers.add_parser('extract', help='Cache frozen backbone features of an image folder')
+    extract.add_argument('--data-dir', type=str, required=True,
+                        help='Image folder with one sub-directory per class')
+    extract.add_argument('--output', type=str, required=True,
+                        help='Feature file to write (.npz)')
+    extract.add_argument('--arch', type=str, default=DEFAULT_ARCH, choices=sorted(ARCHITECTURES),
+                        help='Backbone architecture (ImageNet weights)')
+    extract.add_argument('--backbone', type=str, default=None,
+                        help='Trained checkpoint whose backbone to use instead of ImageNet weights')
+    extract.add_argument('--classes-from', type=str, default=None,
+                        help='Feature file whose class order must match (e.g. train features for val)')
+    extract.add_argument('--batch-size', type=int, default=64,
+                        help='Images per forward pass')
+    extract.add_argument('--augment-views', type=int, default=0,
+                        help='Extra augmented passes over the data (training features)')
+    extract.add_argument('--image-cache', type=str, default=None,
+                        help='Memory-mapped cache of --data-dir (dataset_cache.py)')
+
+    train = subparsers.add_parser('train', help='Train the head on cached features')
+    train.add_argument('--train-features', type=str, required=True)
+    train.add_argument('--val-features', type=str, required=True)
+    train.add_argument('--output', type=str, default='ml_model/checkpoints/head.pth',
+                      help='Head checkpoint to write')
+    train.add_argument('--epochs', type=int, default=30)
+    train.add_argument('--batch-size', type=int, default=256)
+    train.add_argument('--lr', type=float, default=0.001)
+
+    fold = subparsers.add_parser('fold', help='Fold a trained head into a full checkpoint')
+    fold.add_argument('--head', type=str, required=True,
+                     help='Head checkpoint written by the train command')
+    fold.add_argument('--output', type=str, default='ml_model/checkpoints/best_model.pth',
+                     help='Full checkpoint to write (class_mapping.json goes next to it)')
+
+    args = parser.parse_args()
+
+    if args.command == 'extract':
+        classes = None
+        if args.classes_from:
+            with np.load(args.classes_from, allow_pickle=False) as data:
+                classes = data['classes'].tolist()
+        build_feature_cache(args.data_dir, args.output, args.arch, args.backbone, classes,
+                            args.batch_size, args.augment_views, args.image_cache,
+                            min(4, os.cpu_count() or 1))
+    elif args.command == 'train':
+        train_head(args.train_features, args.val_features, args.output,
+                   args.epochs, args.batch_size, args.lr)
+    else:
+        fold_head(args.head, args.output)
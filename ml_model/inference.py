@@ -3,256 +3,561 @@ Inference module for trained plant disease detection model
 Replaces API calls with local model predictions
 """
 import torch
-import torch.nn as nn
-from torchvision import transforms, models
-from PIL import Image
+import contextlib
 import json
+import os
+import sys
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Tuple, List
+from typing import Callable, Dict, Tuple, List, Optional
 import numpy as np
 
+# Allow running as a script (python ml_model/inference.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
 
-class PlantDiseaseInference:
+from ml_model.architectures import DEFAULT_ARCH, load_checkpoint, load_checkpoint_model
+from ml_model.base_inference import BaseInference
+from ml_model.preprocessing import load_and_preprocess
+from ml_model.resource_usage import format_memory_usage, get_memory_usage
+
+# Cascade thresholds fitted by --calibrate-dir, stored next to the full model
+CASCADE_THRESHOLDS_FILE = 'cascade_thresholds.json'
+
+
+class PlantDiseaseInference(BaseInference):
     """Inference wrapper for plant disease detection model"""
     
-    def __init__(self, model_path: str, class_mapping_path: str = None):
+    backend = "pytorch"
+    supports_embeddings = True
+    supports_logits = True
+    
+    PRECISIONS = ('fp32', 'bf16')
+    
+    def __init__(self, model_path: str, class_mapping_path: str = None,
+                 image_size: int = 224, precision: Optional[str] = None,
+                 channels_last: Optional[bool] = None):
         """
         Initialize inference module
         
         Args:
             model_path: Path to trained model checkpoint (.pth file)
             class_mapping_path: Path to class mapping JSON file
+            image_size: Input resolution (lower is faster, e.g. for a cascade's first tier)
+            precision: 'fp32' or 'bf16' (CPU autocast). Defaults to the
+                INFERENCE_PRECISION environment variable, then 'fp32'.
+            channels_last: Run convolutions in NHWC memory format. Defaults
+                to the INFERENCE_CHANNELS_LAST environment variable.
         """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
         # Load class mapping
-        if class_mapping_path is None:
-            class_mapping_path = Path(model_path).parent / 'class_mapping.json'
-        
-        with open(class_mapping_path, 'r') as f:
-            mapping = json.load(f)
-            self.classes = mapping['classes']
-            self.class_to_idx = mapping['class_to_idx']
-            self.idx_to_class = {v: k for k, v in self.class_to_idx.items()}
+        self._load_class_mapping(model_path, class_mapping_path)
         
         # Load model
+        start = time.perf_counter()
         self.model = self._load_model(model_path, len(self.classes))
         self.model.eval()
+        self.load_time_s = time.perf_counter() - start
+        
+        # Preprocessing resolution (see ml_model/preprocessing.py)
+        self.image_size = image_size
         
-        # Setup transforms
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], 
-                               std=[0.229, 0.224, 0.225])
-        ])
+        # Optional bf16 autocast / channels-last execution, verified against FP32
+        if precision is None:
+            precision = os.getenv('INFERENCE_PRECISION', 'fp32').lower()
+        if channels_last is None:
+            channels_last = os.getenv('INFERENCE_CHANNELS_LAST', 'false').lower() == 'true'
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Unknown precision '{precision}'. Available: {', '.join(self.PRECISIONS)}")
+        self.precision = 'fp32'
+        self.channels_last = False
+        if precision != 'fp32' or channels_last:
+            self._select_execution_mode(precision, channels_last)
         
-        print(f"✅ Model loaded successfully on {self.device}")
+        print(f"✅ Model loaded successfully on {self.device} ({self.arch}, "
+              f"{self.precision}{', channels_last' if self.channels_last else ''})")
         print(f"📊 Trained on {len(self.classes)} disease classes")
+        if self.temperature != 1.0:
+            print(f"🌡️  Calibrated confidences (temperature {self.temperature:.3f})")
+        print(f"⏱️  Load time {self.load_time_s*1000:.0f} ms | {format_memory_usage(get_memory_usage())}")
     
     def _load_model(self, model_path: str, num_classes: int):
         """Load trained model from checkpoint"""
-        # Create model architecture
-        model = models.resnet50(pretrained=False)
-        num_features = model.fc.in_features
-        model.fc = nn.Sequential(
-            nn.Dropout(0.5),
-            nn.Linear(num_features, 512),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(512, num_classes)
+        # Build the architecture recorded in the checkpoint and load weights.
+        # On CPU the weights are memory-mapped and adopted without copying, so
+        # workers loading the same file share the pages.
+        checkpoint = load_checkpoint(model_path, self.device)
+        self.arch = checkpoint.get('arch', DEFAULT_ARCH)
+        self.temperature = float(checkpoint.get('temperature', 1.0))
+        self.calibration = checkpoint.get('calibration')
+        model = load_checkpoint_model(
+            checkpoint, num_classes, share_memory=self.device.type == 'cpu'
         )
-        
-        # Load weights
-        checkpoint = torch.load(model_path, map_location=self.device)
-        model.load_state_dict(checkpoint['model_state_dict'])
         model = model.to(self.device)
         
         return model
     
-    def predict(self, image_path: str, top_k: int = 3) -> Dict:
+    def _autocast(self):
+        """Autocast context for the configured precision"""
+        if self.precision == 'bf16':
+            return torch.autocast(self.device.type, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+    
+    def _forward(self, inputs: torch.Tensor, return_embedding: bool = False):
+        """
+        Logits (float32) for an NCHW input using the configured execution mode
+        
+        With return_embedding, also returns the penultimate-layer activations
+        (the 512-d hidden layer of the classification head).
+        """
+        if self.channels_last:
+            inputs = inputs.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad(), self._autocast():
+            if not return_embedding:
+                return self.model(inputs).float()
+            head = self.model.head
+            embedding = head[:-1](self.model.forward_features(inputs))
+            return head[-1](embedding).float(), embedding.float()
+    
+    def _select_execution_mode(self, precision: str, channels_last: bool,
+                               tolerance: float = 0.02, probe_batch_size: int = 8):
+        """
+        Enable bf16/channels-last only if it is accurate and faster on this host
+        
+        Runs a fixed probe batch in FP32 and in the requested mode. Falls
+        back to FP32 (and contiguous NCHW) when bf16 is unsupported, when
+        probabilities differ by more than ``tolerance`` or top-1 changes, or
+        when the requested mode is not faster, e.g. on CPUs without native
+        bf16 instructions (AVX512-BF16/AMX) where bf16 is emulated.
+        
+        Note that channels_last copies the convolution weights, so they are
+        no longer shared through the memory-mapped checkpoint.
+        """
+        if precision == 'bf16' and self.device.type == 'cpu':
+            try:
+                supported = torch.ops.mkldnn._is_mkldnn_bf16_supported()
+            except (AttributeError, RuntimeError):
+                supported = False
+            if not supported:
+                print("⚠️ CPU has no fast bfloat16 support, keeping FP32")
+                precision = 'fp32'
+        if precision == 'fp32' and not channels_last:
+            return
+        
+        generator = torch.Generator().manual_seed(0)
+        probe = torch.randn(probe_batch_size, 3, self.image_size, self.image_size,
+                            generator=generator).to(self.device)
+        
+        def probe_run():
+            return torch.nn.functional.softmax(self._forward(probe), dim=1)
+        
+        reference = probe_run()
+        fp32_ms = min(self._time_ms(probe_run) for _ in range(3))
+        
+        self.precision = precision
+        self.channels_last = channels_last
+        if channels_last:
+            self.model = self.model.to(memory_format=torch.channels_last)
+        
+        candidate = probe_run()
+        candidate_ms = min(self._time_ms(probe_run) for _ in range(3))
+        max_diff = (candidate - reference).abs().max().item()
+        same_top1 = torch.equal(candidate.argmax(dim=1), reference.argmax(dim=1))
+        
+        mode = f"{precision}{' + channels_last' if channels_last else ''}"
+        if max_diff > tolerance or not same_top1 or candidate_ms >= fp32_ms:
+            print(f"⚠️ {mode} rejected (max prob diff {max_diff:.4f}, "
+                  f"{candidate_ms:.1f} ms vs FP32 {fp32_ms:.1f} ms), using FP32")
+            self.precision = 'fp32'
+            self.channels_last = False
+            if channels_last:
+                self.model = self.model.to(memory_format=torch.contiguous_format)
+            return
+        
+        print(f"⚡ {mode} enabled: {fp32_ms / candidate_ms:.2f}x faster than FP32 "
+              f"on probe batch (max prob diff {max_diff:.4f})")
+    
+    @staticmethod
+    def _time_ms(fn) -> float:
+        start = time.perf_counter()
+        fn()
+        return (time.perf_counter() - start) * 1000
+    
+    def predict_logits(self, batch: np.ndarray) -> np.ndarray:
+        """Uncalibrated logits for a preprocessed NCHW float32 batch"""
+        return self._forward(torch.from_numpy(batch).to(self.device)).cpu().numpy()
+    
+    def _probabilities(self, batch: np.ndarray) -> np.ndarray:
+        """Class probabilities for a preprocessed NCHW float32 batch"""
+        outputs = self._forward(torch.from_numpy(batch).to(self.device))
+        return torch.nn.functional.softmax(outputs / self.temperature, dim=1).cpu().numpy()
+    
+    def _probabilities_and_embeddings(self, batch: np.ndarray):
+        """Class probabilities and penultimate-layer embeddings for a batch"""
+        outputs, embeddings = self._forward(torch.from_numpy(batch).to(self.device),
+                                            return_embedding=True)
+        probabilities = torch.nn.functional.softmax(outputs / self.temperature, dim=1)
+        return probabilities.cpu().numpy(), embeddings.cpu().numpy()
+    
+    def predict(self, image_path: str, top_k: int = 3,
+                return_embedding: bool = False) -> Dict:
         """
         Predict disease from plant image
         
         Args:
             image_path: Path to plant image
             top_k: Number of top predictions to return
+            return_embedding: Include the penultimate-layer embedding
+                (numpy float32) as result['embedding']
             
         Returns:
             Dictionary with prediction results
         """
-        # Load and preprocess image
-        image = Image.open(image_path).convert('RGB')
-        original_size = image.size
-        image_tensor = self.transform(image).unsqueeze(0).to(self.device)
-        
-        # Predict
-        with torch.no_grad():
-            outputs = self.model(image_tensor)
-            probabilities = torch.nn.functional.softmax(outputs, dim=1)
-            top_probs, top_indices = torch.topk(probabilities, top_k)
-        
-        # Format results
-        predictions = []
-        for prob, idx in zip(top_probs[0], top_indices[0]):
-            class_name = self.idx_to_class[idx.item()]
-            disease_info = self._parse_class_name(class_name)
-            
-            predictions.append({
-                'disease': disease_info['disease'],
-                'plant': disease_info['plant'],
-                'confidence': float(prob.item()),
-                'confidence_percent': f"{prob.item() * 100:.2f}%"
-            })
-        
-        # Primary prediction
-        primary = predictions[0]
-        
-        return {
-            'primary_prediction': {
-                'plant': primary['plant'],
-                'disease': primary['disease'],
-                'confidence': primary['confidence'],
-                'severity': self._estimate_severity(primary['confidence'])
-            },
-            'alternative_predictions': predictions[1:],
-            'all_predictions': predictions,
-            'model_info': {
-                'device': str(self.device),
-                'num_classes': len(self.classes),
-                'image_size': original_size
-            }
-        }
+        array, original_size = load_and_preprocess(image_path, self.image_size)
+        return self.predict_preprocessed(
+            array[np.newaxis], [original_size], top_k, return_embedding
+        )[0]
     
-    def _parse_class_name(self, class_name: str) -> Dict[str, str]:
-        """
-        Parse class name into plant and disease
-        Format: "Plant___Disease" (e.g., "Tomato___Early_Blight")
+    def batch_predict(self, image_paths: List[str], top_k: int = 3,
+                      return_embedding: bool = False) -> List[Dict]:
         """
-        parts = class_name.split('___')
-        if len(parts) == 2:
-            plant = parts[0].replace('_', ' ')
-            disease = parts[1].replace('_', ' ')
-        else:
-            plant = class_name.replace('_', ' ')
-            disease = "Unknown"
+        Predict diseases for multiple images in a single forward pass
         
-        return {
-            'plant': plant,
-            'disease': disease,
-            'full_name': class_name
-        }
+        Args:
+            image_paths: List of image paths
+            top_k: Number of top predictions per image
+            return_embedding: Include per-image embeddings (see predict)
+            
+        Returns:
+            List of prediction dictionaries
+        """
+        return self._predict_paths(image_paths, top_k, return_embedding)
+
+
+class CascadeInference(BaseInference):
+    """
+    Confidence cascade: cheap model first, full model only when uncertain
     
-    def _estimate_severity(self, confidence: float) -> str:
-        """Estimate disease severity based on confidence"""
-        if confidence > 0.9:
-            return "High confidence detection - Immediate action recommended"
-        elif confidence > 0.7:
-            return "Moderate confidence - Monitor closely"
-        else:
-            return "Low confidence - Consider consulting expert"
+    Tier 1 is a small backbone (or the full model at low resolution). If its
+    top-1 probability or top-1/top-2 margin is below threshold, the image is
+    escalated to the full model, and then to the cloud vision model if that
+    is also uncertain. Per-tier traffic and latency are tracked.
+    """
     
-    def get_disease_description(self, disease_name: str) -> Dict[str, str]:
-        """
-        Get detailed description of disease
-        This is a basic implementation - can be enhanced with a knowledge base
+    backend = "cascade"
+    TIERS = ('fast', 'full', 'cloud')
+    
+    def __init__(
+        self,
+        fast_model: BaseInference,
+        full_model: BaseInference,
+        cloud_predictor: Optional[Callable[[str], Dict]] = None,
+        fast_confidence: float = 0.85,
+        fast_margin: float = 0.3,
+        full_confidence: float = 0.6,
+        full_margin: float = 0.0
+    ):
         """
-        # Load disease knowledge base
-        knowledge_base_path = Path(__file__).parent / 'disease_knowledge.json'
-        
-        if knowledge_base_path.exists():
-            with open(knowledge_base_path, 'r') as f:
-                knowledge = json.load(f)
-                return knowledge.get(disease_name, {
-                    'name': disease_name,
-                    'description': 'Description not available',
-                    'treatment': 'Consult agricultural expert',
-                    'prevention': 'Follow general plant health practices'
-                })
+        Initialize cascade
         
-        return {
-            'name': disease_name,
-            'description': 'Description not available',
-            'treatment': 'Consult agricultural expert',
-            'prevention': 'Follow general plant health practices'
+        Args:
+            fast_model: Cheap first-tier inference model
+            full_model: Full-size model used when the fast tier is uncertain
+            cloud_predictor: Optional callable(image_path) -> prediction dict for
+                the last tier. Without it, uncertain results are returned with
+                cascade.escalate_to_cloud = True so the caller can call the API.
+            fast_confidence: Minimum top-1 probability to accept the fast tier
+            fast_margin: Minimum top-1 minus top-2 probability for the fast tier
+            full_confidence: Minimum top-1 probability to accept the full model
+            full_margin: Minimum top-1/top-2 margin for the full model
+        """
+        self.fast_model = fast_model
+        self.full_model = full_model
+        self.cloud_predictor = cloud_predictor
+        self.thresholds = {
+            'fast': (fast_confidence, fast_margin),
+            'full': (full_confidence, full_margin),
         }
+        self.classes = full_model.classes
+        self.arch = f"{getattr(fast_model, 'arch', 'unknown')}->{getattr(full_model, 'arch', 'unknown')}"
+        
+        self._lock = threading.Lock()
+        self.reset_stats()
+    
+    @staticmethod
+    def _confidence_and_margin(prediction: Dict) -> Tuple[float, float]:
+        """Top-1 probability and gap to the runner-up"""
+        predictions = prediction['all_predictions']
+        top1 = predictions[0]['confidence']
+        top2 = predictions[1]['confidence'] if len(predictions) > 1 else 0.0
+        return top1, top1 - top2
+    
+    def _is_confident(self, prediction: Dict, tier: str) -> bool:
+        min_confidence, min_margin = self.thresholds[tier]
+        confidence, margin = self._confidence_and_margin(prediction)
+        return confidence >= min_confidence and margin >= min_margin
     
-    def batch_predict(self, image_paths: List[str], top_k: int = 3) -> List[Dict]:
+    def predict(self, image_path: str, top_k: int = 3) -> Dict:
         """
-        Predict diseases for multiple images
+        Predict disease, escalating through the tiers only when uncertain
         
         Args:
-            image_paths: List of image paths
-            top_k: Number of top predictions per image
+            image_path: Path to plant image
+            top_k: Number of top predictions to return (at least 2 are
+                computed internally to measure the margin)
             
         Returns:
-            List of prediction dictionaries
+            Prediction dictionary from the tier that served the request, with
+            a "cascade" entry describing the tier and latency
         """
-        results = []
-        for image_path in image_paths:
-            try:
-                result = self.predict(image_path, top_k)
-                result['image_path'] = image_path
-                result['status'] = 'success'
-                results.append(result)
-            except Exception as e:
-                results.append({
-                    'image_path': image_path,
-                    'status': 'error',
-                    'error': str(e)
-                })
+        start = time.perf_counter()
+        k = max(top_k, 2)
+        escalate_to_cloud = False
+        
+        tier = 'fast'
+        result = self.fast_model.predict(image_path, k)
+        
+        if not self._is_confident(result, 'fast'):
+            tier = 'full'
+            result = self.full_model.predict(image_path, k)
+            
+            if not self._is_confident(result, 'full'):
+                tier = 'cloud'
+                if self.cloud_predictor is not None:
+                    result = self.cloud_predictor(image_path)
+                else:
+                    escalate_to_cloud = True
+        
+        latency_ms = (time.perf_counter() - start) * 1000
+        self._record(tier, latency_ms)
         
-        return results
+        if 'all_predictions' in result:
+            result['alternative_predictions'] = result['all_predictions'][1:top_k]
+            result['all_predictions'] = result['all_predictions'][:top_k]
+        result['cascade'] = {
+            'tier': tier,
+            'latency_ms': round(latency_ms, 2),
+            'escalate_to_cloud': escalate_to_cloud
+        }
+        return result
+    
+    def _record(self, tier: str, latency_ms: float):
+        with self._lock:
+            self._tier_counts[tier] += 1
+            self._total_latency_ms += latency_ms
+    
+    def record_cloud_latency(self, latency_ms: float):
+        """Add the latency of a cloud call made by the caller after escalation"""
+        with self._lock:
+            self._total_latency_ms += latency_ms
+    
+    def reset_stats(self):
+        """Clear traffic and latency counters"""
+        with self._lock:
+            self._tier_counts = {tier: 0 for tier in self.TIERS}
+            self._total_latency_ms = 0.0
+    
+    def get_stats(self) -> Dict:
+        """
+        Fraction of traffic served at each tier and mean end-to-end latency
+        """
+        with self._lock:
+            total = sum(self._tier_counts.values())
+            return {
+                'total_requests': total,
+                'tier_counts': dict(self._tier_counts),
+                'tier_fractions': {
+                    tier: (count / total if total else 0.0)
+                    for tier, count in self._tier_counts.items()
+                },
+                'mean_latency_ms': self._total_latency_ms / total if total else 0.0
+            }
 
 
-# Singleton instance for reuse
-_inference_instance = None
+def fit_confidence_threshold(confidences, correct, target_accuracy: float = 0.95) -> float:
+    """
+    Calibrate a tier's confidence threshold on validation data
+    
+    Picks the lowest threshold such that the predictions the tier would
+    accept (confidence >= threshold) reach the target accuracy, so as much
+    traffic as possible stays on the cheaper tier.
+    
+    Args:
+        confidences: Top-1 probabilities on a validation set
+        correct: Whether each top-1 prediction was right
+        target_accuracy: Required accuracy of accepted predictions
+        
+    Returns:
+        Confidence threshold (1.0 if the target cannot be reached)
+    """
+    confidences = np.asarray(confidences, dtype=np.float64)
+    correct = np.asarray(correct, dtype=np.float64)
+    order = np.argsort(-confidences)
+    
+    # Accuracy of the top-n most confident predictions for every n
+    accepted_accuracy = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    reaching = np.nonzero(accepted_accuracy >= target_accuracy)[0]
+    if len(reaching) == 0:
+        return 1.0
+    return float(confidences[order][reaching[-1]])
 
 
-def get_inference_model(model_path: str = None) -> PlantDiseaseInference:
+def calibrate_thresholds_on_directory(model: BaseInference, val_dir: str,
+                                      target_accuracy: float = 0.95,
+                                      batch_size: int = 32) -> Dict[str, float]:
     """
-    Get or create inference model instance (singleton pattern)
+    Fit a cascade tier's confidence and margin thresholds on a labelled directory
+    
+    Both are fitted the same way (see fit_confidence_threshold): the margin
+    (top-1 minus top-2 probability) gets the lowest threshold whose accepted
+    predictions reach the target accuracy.
     
     Args:
-        model_path: Path to model checkpoint. If None, uses default path.
+        model: Inference model for the tier being calibrated
+        val_dir: Directory with one sub-directory per class ("Plant___Disease")
+        target_accuracy: Required accuracy of predictions the tier accepts
+        batch_size: Images per batch_predict call
+        
+    Returns:
+        Dictionary with confidence and margin thresholds and the share of
+        validation images the tier accepts with both
+    """
+    from ml_model.calibration import labelled_samples
+    
+    # Same images as temperature fitting (calibration.py)
+    samples = [(path, model.idx_to_class[label])
+               for path, label in labelled_samples(val_dir, model.class_to_idx)]
+    
+    confidences, margins, correct = [], [], []
+    for start in range(0, len(samples), batch_size):
+        chunk = samples[start:start + batch_size]
+        results = model.batch_predict([path for path, _ in chunk], top_k=2)
+        for result, (_, class_name) in zip(results, chunk):
+            if result['status'] != 'success':
+                continue
+            expected = model._parse_class_name(class_name)
+            primary = result['primary_prediction']
+            confidence, margin = CascadeInference._confidence_and_margin(result)
+            confidences.append(confidence)
+            margins.append(margin)
+            correct.append(primary['plant'] == expected['plant']
+                           and primary['disease'] == expected['disease'])
+    
+    confidence_threshold = fit_confidence_threshold(confidences, correct, target_accuracy)
+    margin_threshold = fit_confidence_threshold(margins, correct, target_accuracy)
+    confidences, margins, correct = map(np.asarray, (confidences, margins, correct))
+    accepted = (confidences >= confidence_threshold) & (margins >= margin_threshold)
+    accepted_accuracy = float(correct[accepted].mean()) if accepted.any() else 0.0
+    print(f"🎯 Confidence >= {confidence_threshold:.3f} and margin >= {margin_threshold:.3f} "
+          f"keep {accepted.mean()*100:.1f}% of traffic at {accepted_accuracy*100:.1f}% accuracy "
+          f"(target {target_accuracy*100:.1f}%)")
+    return {
+        'confidence': round(confidence_threshold, 4),
+        'margin': round(margin_threshold, 4),
+        'accepted_fraction': round(float(accepted.mean()), 4),
+    }
+
+
+def save_cascade_thresholds(path, thresholds: Dict[str, Dict], **details) -> Path:
+    """Write fitted per-tier thresholds ({'fast': {...}, 'full': {...}}) to JSON"""
+    path = Path(path)
+    with open(path, 'w') as f:
+        json.dump({'tiers': thresholds, **details}, f, indent=2)
+    return path
+
+
+def load_cascade_thresholds(path) -> Dict[str, float]:
+    """
+    CascadeInference keyword arguments from a thresholds file
     
     Returns:
-        PlantDiseaseInference instance
+        e.g. {'fast_confidence': 0.82, 'fast_margin': 0.41, ...}; empty if
+        the file does not exist
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        tiers = json.load(f).get('tiers', {})
+    return {
+        f"{tier}_{name}": float(values[name])
+        for tier, values in tiers.items() if tier in CascadeInference.TIERS
+        for name in ('confidence', 'margin') if name in values
+    }
+
+
+def get_inference_model(model_path: str = None):
     """
-    global _inference_instance
+    Get an inference model instance from the versioned model registry
     
-    if _inference_instance is None:
-        if model_path is None:
-            # Default model path
-            model_path = Path(__file__).parent / 'checkpoints' / 'best_model.pth'
-        
-        if not Path(model_path).exists():
-            raise FileNotFoundError(
-                f"Model not found at {model_path}. "
-                "Please train the model first using train_model.py or download a pre-trained model."
-            )
-        
-        _inference_instance = PlantDiseaseInference(model_path)
+    Args:
+        model_path: Path to model file (.pth, .pt or .onnx). If None, uses
+            the manifest's active version or the default checkpoint path.
     
-    return _inference_instance
+    Returns:
+        ModelHandle with the PlantDiseaseInference interface that follows
+        hot swaps of the underlying model (see ml_model/registry.py)
+    """
+    from ml_model.registry import get_inference_model as get_registered_model
+    return get_registered_model(model_path)
 
 
 if __name__ == '__main__':
     import argparse
     
     parser = argparse.ArgumentParser(description='Test plant disease inference')
-    parser.add_argument('--image', type=str, required=True,
+    parser.add_argument('--image', type=str, default=None,
                        help='Path to plant image')
     parser.add_argument('--model', type=str, 
                        default='ml_model/checkpoints/best_model.pth',
                        help='Path to model checkpoint')
     parser.add_argument('--top-k', type=int, default=3,
                        help='Number of top predictions to show')
+    parser.add_argument('--fast-model', type=str, default=None,
+                       help='Optional small model checkpoint to run as a cascade first tier')
+    parser.add_argument('--fast-image-size', type=int, default=224,
+                       help='Input resolution for the cascade first tier')
+    parser.add_argument('--calibrate-dir', type=str, default=None,
+                       help='Labelled validation directory to calibrate cascade thresholds on')
+    parser.add_argument('--target-accuracy', type=float, default=0.95,
+                       help='Accuracy a cascade tier must reach on what it accepts')
+    parser.add_argument('--thresholds', type=str, default=None,
+                       help='Cascade thresholds JSON written by --calibrate-dir and read by the cascade '
+                            f'(default: {CASCADE_THRESHOLDS_FILE} next to --model)')
     
     args = parser.parse_args()
     
     # Load model and predict
     model = get_inference_model(args.model)
+    thresholds_path = args.thresholds or Path(args.model).parent / CASCADE_THRESHOLDS_FILE
+    
+    if args.calibrate_dir:
+        tiers = [('full', model)]
+        if args.fast_model:
+            tiers.insert(0, ('fast', PlantDiseaseInference(
+                args.fast_model, image_size=args.fast_image_size)))
+        thresholds = {}
+        for name, tier_model in tiers:
+            print(f"\n📐 Calibrating {name} tier")
+            thresholds[name] = calibrate_thresholds_on_directory(
+                tier_model, args.calibrate_dir, args.target_accuracy)
+        save_cascade_thresholds(thresholds_path, thresholds, target_accuracy=args.target_accuracy,
+                                calibrated_on=str(args.calibrate_dir))
+        print(f"\n✅ Thresholds saved to: {thresholds_path}")
+        sys.exit(0)
+    
+    if not args.image:
+        parser.error('--image is required unless --calibrate-dir is given')
+    
+    if args.fast_model:
+        model = CascadeInference(
+            PlantDiseaseInference(args.fast_model, image_size=args.fast_image_size),
+            model,
+            **load_cascade_thresholds(thresholds_path)
+        )
     result = model.predict(args.image, args.top_k)
     
     # Print results
@@ -265,6 +570,9 @@ if __name__ == '__main__':
     print(f"🦠 Disease: {primary['disease']}")
     print(f"📊 Confidence: {primary['confidence']*100:.2f}%")
     print(f"⚠️  Severity: {primary['severity']}")
+    if 'cascade' in result:
+        print(f"🪜 Served by tier: {result['cascade']['tier']} "
+              f"({result['cascade']['latency_ms']:.1f} ms)")
     
     if result['alternative_predictions']:
         print(f"\n📋 Alternative possibilities:")
@@ -0,0 +1,433 @@
+"""
+Local inference sidecar shared by all web/CLI workers
+One process owns the model and a micro-batching loop; workers send
+preprocessed images through shared memory over HTTP on a Unix socket
+(raw probabilities come back through the same shared memory block)
+"""
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Allow running as a script (python ml_model/inference_server.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.base_inference import BaseInference
+from ml_model.preprocessing import load_and_preprocess
+
+DEFAULT_SOCKET_PATH = '/tmp/krishi-inference.sock'
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to a block owned by the client without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: stop the resource tracker from unlinking the
+        # client's block when this process exits
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+        return shm
+
+
+class _Request:
+    """One worker request waiting in the batch queue"""
+
+    def __init__(self, batch: np.ndarray, original_sizes, top_k: int,
+                 probabilities: bool = False):
+        self.batch = batch
+        self.original_sizes = original_sizes
+        self.top_k = top_k
+        # Raw (N, num_classes) probabilities instead of prediction dicts
+        self.probabilities = probabilities
+        self.done = threading.Event()
+        self.results = None
+        self.error: Optional[Exception] = None
+
+
+class MicroBatcher:
+    """
+    Collects requests from all workers into shared forward passes
+
+    A batch is run as soon as ``max_batch`` images are queued or the oldest
+    request has waited ``max_wait_ms``.
+    """
+
+    def __init__(self, model, max_batch: int = 16, max_wait_ms: float = 10.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self.batches_run = 0
+        self.images_run = 0
+
+        self._thread = threading.Thread(target=self._loop, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, batch: np.ndarray, original_sizes, top_k: int = 3) -> List[Dict]:
+        """Queue images and block until their predictions are ready"""
+        return self._wait(_Request(batch, original_sizes, top_k))
+
+    def submit_probabilities(self, batch: np.ndarray) -> np.ndarray:
+        """Queue images and block until their (N, num_classes) probabilities are ready"""
+        return self._wait(_Request(batch, None, 0, probabilities=True))
+
+    def _wait(self, request: _Request):
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _collect(self) -> List[_Request]:
+        pending = [self._queue.get()]
+        count = len(pending[0].batch)
+        deadline = time.monotonic() + self.max_wait
+
+        while count < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(request)
+            count += len(request.batch)
+        return pending
+
+    def _loop(self):
+        while True:
+            pending = self._collect()
+            # Prediction and probability requests run as (at most) two passes
+            for group in ([r for r in pending if not r.probabilities],
+                          [r for r in pending if r.probabilities]):
+                if group:
+                    self._run(group)
+
+    def _run(self, pending: List[_Request]):
+        try:
+            batch = np.concatenate([r.batch for r in pending])
+            if pending[0].probabilities:
+                results = self.model.predict_probabilities(batch)
+            else:
+                sizes = [size for r in pending for size in r.original_sizes]
+                top_k = max(r.top_k for r in pending)
+                results = self.model.predict_preprocessed(batch, sizes, top_k)
+
+            offset = 0
+            for request in pending:
+                request.results = results[offset:offset + len(request.batch)]
+                offset += len(request.batch)
+                if request.probabilities:
+                    continue
+                for result in request.results:
+                    result['all_predictions'] = result['all_predictions'][:request.top_k]
+                    result['alternative_predictions'] = result['all_predictions'][1:]
+
+            with self._stats_lock:
+                self.batches_run += 1
+                self.images_run += len(batch)
+        except Exception as e:
+            for request in pending:
+                request.error = e
+        finally:
+            for request in pending:
+                request.done.set()
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                'batches_run': self.batches_run,
+                'images_run': self.images_run,
+                'mean_batch_size': self.images_run / self.batches_run if self.batches_run else 0.0,
+                'queued': self._queue.qsize(),
+            }
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _InferenceRequestHandler(BaseHTTPRequestHandler):
+    """HTTP endpoints: GET /info, POST /predict, POST /probabilities"""
+
+    server_version = 'KrishiInference/1.0'
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address
+        return 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/info':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        model = self.server.model
+        self._send_json(200, {
+            'classes': model.classes,
+            'class_to_idx': model.class_to_idx,
+            'arch': getattr(model, 'arch', 'unknown'),
+            'device': str(model.device),
+            'temperature': getattr(model, 'temperature', 1.0),
+            'calibration': getattr(model, 'calibration', None),
+            'batching': self.server.batcher.stats(),
+        })
+
+    def do_POST(self):
+        if self.path not in ('/predict', '/probabilities'):
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+
+            shm = _attach_shared_memory(request['shm_name'])
+            try:
+                view = np.ndarray(tuple(request['shape']), dtype=np.float32, buffer=shm.buf)
+                batch = view.copy()
+                del view
+
+                if self.path == '/probabilities':
+                    probabilities = np.ascontiguousarray(
+                        self.server.batcher.submit_probabilities(batch), dtype=np.float32)
+                    if probabilities.nbytes > shm.size:
+                        self._send_json(200, {'probabilities': probabilities.tolist()})
+                        return
+                    # Written over the (already copied) input in the client's block
+                    out = np.ndarray(probabilities.shape, dtype=np.float32, buffer=shm.buf)
+                    out[:] = probabilities
+                    del out
+                    self._send_json(200, {'shape': list(probabilities.shape)})
+                    return
+            finally:
+                shm.close()
+
+            results = self.server.batcher.submit(
+                batch,
+                [tuple(size) for size in request['original_sizes']],
+                int(request.get('top_k', 3))
+            )
+            self._send_json(200, {'results': results})
+        except Exception as e:
+            self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH, model_path: Optional[str] = None,
+          max_batch: int = 16, max_wait_ms: float = 10.0, verbose: bool = False):
+    """
+    Run the inference sidecar until interrupted
+
+    Args:
+        socket_path: Unix socket to listen on
+        model_path: Model file (default: registry's active model)
+        max_batch: Maximum images per forward pass
+        max_wait_ms: Longest time a request waits for a batch to fill
+        verbose: Log every request
+    """
+    from ml_model.registry import get_local_inference_model
+
+    model = get_local_inference_model(model_path)
+    batcher = MicroBatcher(model, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = _ThreadingUnixHTTPServer(socket_path, _InferenceRequestHandler)
+    server.model = model
+    server.batcher = batcher
+    server.verbose = verbose
+    os.chmod(socket_path, 0o660)
+
+    print(f"🚀 Inference service listening on {socket_path} "
+          f"(max batch {max_batch}, max wait {max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Shutting down inference service")
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket"""
+
+    def __init__(self, socket_path: str, timeout: float = 60.0):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class InferenceClient(BaseInference):
+    """
+    Thin client for the inference sidecar
+
+    Implements the PlantDiseaseInference predict/batch_predict interface.
+    Images are preprocessed in the calling worker and handed over through
+    multiprocessing.shared_memory, so only a small JSON header crosses the
+    socket. Does not import torch.
+    """
+
+    backend = "sidecar"
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, timeout: float = 60.0):
+        """
+        Initialize client
+
+        Args:
+            socket_path: Unix socket of the inference service
+            timeout: Seconds to wait for a response
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+        info = self._request('GET', '/info')
+        self.classes = info['classes']
+        self.class_to_idx = info['class_to_idx']
+        self.idx_to_class = {v: k for k, v in self.class_to_idx.items()}
+        self.arch = info['arch']
+        self.device = info['device']
+        # Probabilities come back already temperature-scaled by the sidecar
+        self.temperature = info.get('temperature', 1.0)
+        self.calibration = info.get('calibration')
+
+    def _request(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        connection = _UnixHTTPConnection(self.socket_path, self.timeout)
+        try:
+            body = json.dumps(payload).encode() if payload is not None else None
+            headers = {'Content-Type': 'application/json'} if body else {}
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read())
+        finally:
+            connection.close()
+
+        if response.status != 200:
+            raise RuntimeError(f"Inference service error: {data.get('error')}")
+        return data
+
+    def predict_preprocessed(self, batch: np.ndarray, original_sizes,
+                             top_k: int = 3) -> List[Dict]:
+        """Send a preprocessed NCHW float32 batch to the service"""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=batch.nbytes)
+        try:
+            np.ndarray(batch.shape, dtype=np.float32, buffer=shm.buf)[:] = batch
+            response = self._request('POST', '/predict', {
+                'shm_name': shm.name,
+                'shape': list(batch.shape),
+                'original_sizes': [list(size) for size in original_sizes],
+                'top_k': top_k,
+            })
+        finally:
+            shm.close()
+            shm.unlink()
+        return response['results']
+
+    def predict_probabilities(self, batch: np.ndarray) -> np.ndarray:
+        """Raw (N, num_classes) probabilities, returned through the shared memory block"""
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        shm = shared_memory.SharedMemory(create=True, size=batch.nbytes)
+        try:
+            np.ndarray(batch.shape, dtype=np.float32, buffer=shm.buf)[:] = batch
+            response = self._request('POST', '/probabilities', {
+                'shm_name': shm.name,
+                'shape': list(batch.shape),
+            })
+            if 'probabilities' in response:
+                return np.asarray(response['probabilities'], dtype=np.float32)
+            view = np.ndarray(tuple(response['shape']), dtype=np.float32, buffer=shm.buf)
+            probabilities = view.copy()
+            del view
+            return probabilities
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def predict(self, image_path: str, top_k: int = 3) -> Dict:
+        """
+        Predict disease from plant image
+
+        Args:
+            image_path: Path to plant image
+            top_k: Number of top predictions to return
+
+        Returns:
+            Dictionary with prediction results
+        """
+        array, original_size = load_and_preprocess(image_path, self.image_size)
+        return self.predict_preprocessed(array[np.newaxis], [original_size], top_k)[0]
+
+    def batch_predict(self, image_paths: List[str], top_k: int = 3) -> List[Dict]:
+        """
+        Predict diseases for multiple images in one service call
+
+        Args:
+            image_paths: List of image paths
+            top_k: Number of top predictions per image
+
+        Returns:
+            List of prediction dictionaries
+        """
+        return self._predict_paths(image_paths, top_k)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the shared local inference service')
+    parser.add_argument('--socket', type=str,
+                       default=os.environ.get('INFERENCE_SOCKET', DEFAULT_SOCKET_PATH),
+                       help='Unix socket path')
+    parser.add_argument('--model', type=str, default=None,
+                       help='Model file (default: active model in the registry)')
+    parser.add_argument('--max-batch', type=int, default=16,
+                       help='Maximum images per forward pass')
+    parser.add_argument('--max-wait-ms', type=float, default=10.0,
+                       help='Maximum time to wait for a batch to fill')
+    parser.add_argument('--verbose', action='store_true',
+                       help='Log every request')
+
+    args = parser.parse_args()
+
+    serve(
+        socket_path=args.socket,
+        model_path=args.model,
+        max_batch=args.max_batch,
+        max_wait_ms=args.max_wait_ms,
+        verbose=args.verbose
+    )
@@ -0,0 +1,136 @@
+"""
+ONNX Runtime inference backend for the plant disease detection model
+Same interface as PlantDiseaseInference without importing torch/torchvision
+"""
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Allow running as a script (python ml_model/onnx_inference.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.base_inference import BaseInference
+from ml_model.preprocessing import load_and_preprocess
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    """Numerically stable softmax over the last axis"""
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class PlantDiseaseInferenceONNX(BaseInference):
+    """Inference wrapper that runs an exported ONNX model with ONNX Runtime"""
+
+    backend = "onnxruntime"
+    supports_logits = True
+
+    def __init__(self, model_path: str, class_mapping_path: str = None,
+                 num_threads: Optional[int] = None):
+        """
+        Initialize ONNX Runtime inference module
+
+        Args:
+            model_path: Path to exported model (.onnx file)
+            class_mapping_path: Path to class mapping JSON file
+            num_threads: Intra-op threads for ONNX Runtime (defaults to
+                the ORT_NUM_THREADS environment variable, then ORT's default)
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError(
+                "onnxruntime is required for ONNX inference. "
+                "Install with: pip install onnxruntime"
+            ) from e
+
+        # Load class mapping
+        self._load_class_mapping(model_path, class_mapping_path)
+
+        # Create session with full CPU graph optimizations
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads is None and os.environ.get('ORT_NUM_THREADS'):
+            num_threads = int(os.environ['ORT_NUM_THREADS'])
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=['CPUExecutionProvider']
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.arch = metadata.get('arch', 'unknown')
+        self.temperature = float(metadata.get('temperature', 1.0))
+        if 'calibration' in metadata:
+            self.calibration = json.loads(metadata['calibration'])
+        self.device = 'cpu'
+
+        print(f"✅ ONNX model loaded successfully ({self.backend})")
+        print(f"📊 Trained on {len(self.classes)} disease classes")
+
+    def predict_logits(self, batch: np.ndarray) -> np.ndarray:
+        """Uncalibrated logits for an NCHW float32 batch"""
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def _probabilities(self, batch: np.ndarray) -> np.ndarray:
+        """Run the model on an NCHW float32 batch and return probabilities"""
+        return _softmax(self.predict_logits(batch) / self.temperature)
+
+    def predict(self, image_path: str, top_k: int = 3) -> Dict:
+        """
+        Predict disease from plant image
+
+        Args:
+            image_path: Path to plant image
+            top_k: Number of top predictions to return
+
+        Returns:
+            Dictionary with prediction results
+        """
+        array, original_size = load_and_preprocess(image_path, self.image_size)
+        return self.predict_preprocessed(array[np.newaxis], [original_size], top_k)[0]
+
+    def batch_predict(self, image_paths: List[str], top_k: int = 3) -> List[Dict]:
+        """
+        Predict diseases for multiple images in a single forward pass
+
+        Args:
+            image_paths: List of image paths
+            top_k: Number of top predictions per image
+
+        Returns:
+            List of prediction dictionaries
+        """
+        return self._predict_paths(image_paths, top_k)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Test plant disease inference with ONNX Runtime')
+    parser.add_argument('--image', type=str, required=True,
+                       help='Path to plant image')
+    parser.add_argument('--model', type=str,
+                       default='ml_model/checkpoints/best_model.onnx',
+                       help='Path to exported ONNX model')
+    parser.add_argument('--top-k', type=int, default=3,
+                       help='Number of top predictions to show')
+
+    args = parser.parse_args()
+
+    model = PlantDiseaseInferenceONNX(args.model)
+    result = model.predict(args.image, args.top_k)
+
+    primary = result['primary_prediction']
+    print(f"\n🌱 Plant: {primary['plant']}")
+    print(f"🦠 Disease: {primary['disease']}")
+    print(f"📊 Confidence: {primary['confidence']*100:.2f}%")
+    print(f"⚠️  Severity: {primary['severity']}")
@@ -0,0 +1,151 @@
+"""
+Image preprocessing shared by all inference backends and training validation
+NumPy/PIL only, so it can be used without importing torch
+
+Images are decoded at reduced resolution where the format allows it, resized
+and kept as uint8 until a whole batch is stacked, then converted to
+normalized float32 in one pass per channel.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+IMAGE_SIZE = 224
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# (x / 255 - mean) / std == x * SCALE + BIAS
+_SCALE = (1.0 / (255.0 * IMAGENET_STD)).astype(np.float32)
+_BIAS = (-IMAGENET_MEAN / IMAGENET_STD).astype(np.float32)
+
+# Decode/reduce to no less than this multiple of the target size before the
+# final bilinear resize; keeps results within a few uint8 levels of a
+# full-resolution resize while skipping most of the work for large photos
+REDUCING_GAP = 2.0
+
+
+def load_image(image_path: str) -> Image.Image:
+    """Open an image file as RGB"""
+    return Image.open(image_path).convert('RGB')
+
+
+def resize_uint8(image: Image.Image, size: int = IMAGE_SIZE) -> np.ndarray:
+    """
+    Resize a PIL image to size x size and return it as an HWC uint8 array
+
+    Large images are first shrunk with Image.reduce (integer box filter),
+    which is much cheaper than a full-resolution bilinear resize.
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image = image.resize((size, size), Image.BILINEAR, reducing_gap=REDUCING_GAP)
+    return np.array(image, dtype=np.uint8)
+
+
+def load_image_uint8(image_path: str, size: int = IMAGE_SIZE) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decode and resize an image file without leaving uint8
+
+    JPEGs are decoded directly at a reduced scale with Image.draft, so a
+    4000x3000 field photo never materializes at full resolution.
+
+    Returns:
+        Tuple of (HWC uint8 array, original (width, height))
+    """
+    with Image.open(image_path) as image:
+        original_size = image.size
+        target = int(size * REDUCING_GAP)
+        image.draft('RGB', (target, target))
+        return resize_uint8(image, size), original_size
+
+
+def normalize_batch(batch: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Convert a stacked NHWC uint8 batch into normalized NCHW float32
+
+    The uint8 -> float conversion, scaling and mean/std normalization are
+    fused into one multiply-add per channel that writes straight into the
+    NCHW output, instead of ToTensor + Normalize allocating intermediates
+    per image.
+
+    Args:
+        batch: (N, H, W, 3) uint8 array
+        out: Optional preallocated (N, 3, H, W) float32 array to fill
+
+    Returns:
+        (N, 3, H, W) contiguous float32 array
+    """
+    n, h, w, _ = batch.shape
+    if out is None:
+        out = np.empty((n, 3, h, w), dtype=np.float32)
+    for c in range(3):
+        np.multiply(batch[..., c], _SCALE[c], out=out[:, c], dtype=np.float32)
+        out[:, c] += _BIAS[c]
+    return out
+
+
+def preprocess_image(image: Image.Image, size: int = IMAGE_SIZE) -> np.ndarray:
+    """
+    Convert a PIL image into a normalized CHW float32 array
+
+    Equivalent (within resampling tolerance) to torchvision
+    Resize((size, size)) -> ToTensor -> Normalize with the ImageNet
+    statistics used during training.
+    """
+    return normalize_batch(resize_uint8(image, size)[np.newaxis])[0]
+
+
+def load_and_preprocess(image_path: str, size: int = IMAGE_SIZE) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Load an image file and preprocess it for the model
+
+    Returns:
+        Tuple of (CHW float32 array, original (width, height))
+    """
+    array, original_size = load_image_uint8(image_path, size)
+    return normalize_batch(array[np.newaxis])[0], original_size
+
+
+def load_batch(image_paths: Sequence[str], size: int = IMAGE_SIZE
+               ) -> Tuple[np.ndarray, List[Tuple[int, int]], List[int], Dict[int, str]]:
+    """
+    Load and preprocess several images into one batch
+
+    Images that fail to load are skipped and reported in the errors dict.
+
+    Returns:
+        Tuple of (NCHW float32 batch, original sizes, indices into
+        image_paths of the batch rows, {index: error message})
+    """
+    arrays, sizes, positions, errors = [], [], [], {}
+    for i, image_path in enumerate(image_paths):
+        try:
+            array, original_size = load_image_uint8(image_path, size)
+        except Exception as e:
+            errors[i] = str(e)
+            continue
+        arrays.append(array)
+        sizes.append(original_size)
+        positions.append(i)
+
+    if arrays:
+        batch = normalize_batch(np.stack(arrays))
+    else:
+        batch = np.empty((0, 3, size, size), dtype=np.float32)
+    return batch, sizes, positions, errors
+
+
+class Uint8ImageLoader:
+    """
+    Dataset loader returning resized HWC uint8 arrays
+
+    Used for validation so DataLoader workers only decode and resize; the
+    collated uint8 batch is normalized once with normalize_batch.
+    """
+
+    def __init__(self, size: int = IMAGE_SIZE):
+        self.size = size
+
+    def __call__(self, image_path) -> np.ndarray:
+        return load_image_uint8(str(image_path), self.size)[0]
@@ -0,0 +1,164 @@
+"""
+Progressive-resolution training schedule and time-to-accuracy log
+Early epochs train on downscaled batches (e.g. 128px), later ones ramp up
+to the full 224px. Activation memory grows with batch size x height x
+width, so the batch is scaled by (224 / size)^2 to keep peak memory about
+constant, while each image costs roughly (size / 224)^2 of the compute.
+
+Schedules are comma-separated SIZE:EPOCHS phases, e.g. "128:10,176:5,224".
+The last phase runs until the end of training, so its epoch count may be
+omitted. Validation always runs at full resolution, so accuracies from
+different schedules are comparable.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import torch
+import torch.nn.functional as F
+
+from ml_model.preprocessing import IMAGE_SIZE
+
+
+class ResolutionPhase(NamedTuple):
+    """One block of epochs trained at a fixed resolution"""
+    size: int
+    start_epoch: int        # first epoch of the phase (0-based)
+    end_epoch: int          # first epoch after the phase
+    batch_size: int
+
+
+def parse_schedule(spec: str) -> List[Tuple[int, Optional[int]]]:
+    """'128:10,176:5,224' -> [(128, 10), (176, 5), (224, None)]"""
+    phases = []
+    for part in spec.split(','):
+        size, _, epochs = part.strip().partition(':')
+        try:
+            phases.append((int(size), int(epochs) if epochs else None))
+        except ValueError:
+            raise ValueError(f"Invalid resolution phase '{part}' (expected SIZE:EPOCHS)")
+    return phases
+
+
+def adapted_batch_size(size: int, base_batch_size: int, base_size: int = IMAGE_SIZE,
+                       multiple: int = 8) -> int:
+    """
+    Batch size at size px with the activation memory of base_batch_size at base_size
+
+    Rounded down to a multiple of `multiple` (vectorized kernels prefer it),
+    but never below base_batch_size.
+    """
+    scaled = int(base_batch_size * (base_size / size) ** 2)
+    if scaled >= multiple:
+        scaled -= scaled % multiple
+    return max(base_batch_size, scaled)
+
+
+class ResolutionSchedule:
+    """Resolution and batch size for every epoch of a run"""
+
+    def __init__(self, phases: Sequence[Tuple[int, Optional[int]]], num_epochs: int,
+                 base_batch_size: int, base_size: int = IMAGE_SIZE):
+        """
+        Initialize schedule
+
+        Args:
+            phases: (size, epochs) pairs in training order; epochs may be
+                None for the last phase (all remaining epochs)
+            num_epochs: Total epochs of the run
+            base_batch_size: Batch size at base_size
+            base_size: Resolution the loaders produce (and validation uses)
+        """
+        if not phases:
+            raise ValueError("Resolution schedule has no phases")
+        self.base_size = base_size
+        self.phases: List[ResolutionPhase] = []
+        start = 0
+        for i, (size, epochs) in enumerate(phases):
+            if not 32 <= size <= base_size:
+                raise ValueError(f"Resolution {size} outside 32..{base_size} "
+                                 f"(loaders produce {base_size}px images)")
+            if epochs is None:
+                if i != len(phases) - 1:
+                    raise ValueError("Only the last resolution phase may omit its epoch count")
+                epochs = num_epochs - start
+            if epochs <= 0 or start >= num_epochs:
+                raise ValueError(f"Resolution schedule leaves no epochs for {size}px "
+                                 f"(run has {num_epochs} epochs)")
+            end = min(start + epochs, num_epochs)
+            self.phases.append(ResolutionPhase(size, start, end,
+                                               adapted_batch_size(size, base_batch_size, base_size)))
+            start = end
+        # A last phase with an explicit count shorter than the run is extended
+        last = self.phases[-1]
+        self.phases[-1] = last._replace(end_epoch=max(last.end_epoch, num_epochs))
+
+    @classmethod
+    def from_string(cls, spec: str, num_epochs: int, base_batch_size: int) -> 'ResolutionSchedule':
+        return cls(parse_schedule(spec), num_epochs, base_batch_size)
+
+    @classmethod
+    def constant(cls, num_epochs: int, batch_size: int) -> 'ResolutionSchedule':
+        """Full resolution throughout (the default)"""
+        return cls([(IMAGE_SIZE, None)], num_epochs, batch_size)
+
+    def phase(self, epoch: int) -> ResolutionPhase:
+        for phase in self.phases:
+            if epoch < phase.end_epoch:
+                return phase
+        return self.phases[-1]
+
+    def describe(self) -> str:
+        return ', '.join(f"epochs {p.start_epoch + 1}-{p.end_epoch}: {p.size}px x {p.batch_size}"
+                         for p in self.phases)
+
+
+def resize_batch(images: torch.Tensor, size: int) -> torch.Tensor:
+    """Downscale an (N, 3, H, W) batch to size x size (antialiased bilinear)"""
+    if images.shape[-1] == size and images.shape[-2] == size:
+        return images
+    return F.interpolate(images, size=(size, size), mode='bilinear',
+                         align_corners=False, antialias=True)
+
+
+class TimeToAccuracyLog:
+    """
+    Validation accuracy against cumulative wall-clock time
+
+    Written after every epoch to <output_dir>/time_to_accuracy.json, so
+    runs with different schedules can be compared by how long they take
+    to reach a given accuracy rather than by epoch count.
+    """
+
+    def __init__(self, path: Optional[Path], schedule: ResolutionSchedule):
+        self.path = Path(path) if path else None
+        self.schedule = schedule
+        self.records: List[Dict] = []
+
+    @property
+    def elapsed(self) -> float:
+        """Training time already logged (carried over on resume)"""
+        return self.records[-1]['elapsed_s'] if self.records else 0.0
+
+    def record(self, epoch: int, epoch_seconds: float, val_accuracy: float,
+               best_accuracy: float):
+        phase = self.schedule.phase(epoch)
+        self.records.append({
+            'epoch': epoch + 1,
+            'size': phase.size,
+            'batch_size': phase.batch_size,
+            'epoch_s': round(epoch_seconds, 3),
+            'elapsed_s': round(self.elapsed + epoch_seconds, 3),
+            'val_accuracy': round(val_accuracy, 4),
+            'best_accuracy': round(best_accuracy, 4),
+        })
+        if self.path:
+            with open(self.path, 'w') as f:
+                json.dump({'schedule': self.schedule.describe(), 'epochs': self.records}, f, indent=2)
+
+    def time_to(self, accuracy: float) -> Optional[float]:
+        """Seconds until validation accuracy first reached accuracy, None if never"""
+        for record in self.records:
+            if record['val_accuracy'] >= accuracy:
+                return record['elapsed_s']
+        return None
@@ -0,0 +1,661 @@
+"""
+Versioned model registry with hot reload
+Replaces the module-level inference singleton: models are keyed by id and
+version, described by a manifest, swapped atomically and evicted LRU
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Allow running as a script (python ml_model/registry.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+DEFAULT_MODEL_ID = 'plant-disease'
+DEFAULT_MANIFEST_PATH = Path(__file__).parent / 'checkpoints' / 'manifest.json'
+DEFAULT_MODEL_PATH = Path(__file__).parent / 'checkpoints' / 'best_model.pth'
+
+
+# Model file suffix -> inference backend format
+MODEL_FORMATS = {'.onnx': 'onnx', '.pt': 'torchscript', '.pth': 'pytorch'}
+
+
+def guess_format(model_path) -> str:
+    """Backend format of a model file from its suffix (default: pytorch checkpoint)"""
+    return MODEL_FORMATS.get(Path(model_path).suffix, 'pytorch')
+
+
+def file_sha256(path, chunk_size: int = 1 << 20) -> str:
+    """Stream a file through SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path) -> Dict:
+    """Read a model manifest, returning an empty one if it does not exist"""
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return {'models': []}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def default_manifest_path() -> Path:
+    """Manifest the registry reads by default (MODEL_MANIFEST_PATH or checkpoints/manifest.json)"""
+    return Path(os.environ.get('MODEL_MANIFEST_PATH') or DEFAULT_MANIFEST_PATH)
+
+
+def add_manifest_entry(
+    manifest_path,
+    model_path,
+    version: str,
+    model_id: str = DEFAULT_MODEL_ID,
+    class_mapping_path=None,
+    arch: Optional[str] = None,
+    model_format: Optional[str] = None,
+    extra: Optional[Dict] = None
+) -> Dict:
+    """
+    Add (or replace) a model version in a manifest and make it active
+
+    Paths are stored relative to the manifest so the checkpoint directory
+    can be moved as a whole. The manifest is rewritten atomically.
+
+    Returns:
+        The manifest entry that was written
+    """
+    manifest_path = Path(manifest_path)
+    base_dir = manifest_path.parent
+    model_path = Path(model_path)
+    if class_mapping_path is None:
+        class_mapping_path = model_path.parent / 'class_mapping.json'
+
+    entry = {
+        'model_id': model_id,
+        'version': str(version),
+        'path': os.path.relpath(model_path, base_dir),
+        'class_mapping': os.path.relpath(class_mapping_path, base_dir),
+        'sha256': file_sha256(model_path),
+        'arch': arch,
+        'format': model_format or guess_format(model_path),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if extra:
+        entry.update(extra)
+
+    manifest = load_manifest(manifest_path)
+    manifest['models'] = [
+        m for m in manifest.get('models', [])
+        if not (m['model_id'] == model_id and m['version'] == entry['version'])
+    ]
+    manifest['models'].append(entry)
+    manifest.setdefault('active', {})[model_id] = entry['version']
+
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix('.json.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    return entry
+
+
+def load_inference_backend(model_path, class_mapping_path=None, model_format: Optional[str] = None):
+    """Instantiate the inference backend for a model file (imports it lazily)"""
+    model_format = model_format or guess_format(model_path)
+    if model_format == 'onnx':
+        from ml_model.onnx_inference import PlantDiseaseInferenceONNX
+        return PlantDiseaseInferenceONNX(str(model_path), class_mapping_path)
+    if model_format == 'torchscript':
+        from ml_model.torchscript_inference import PlantDiseaseInferenceTorchScript
+        return PlantDiseaseInferenceTorchScript(str(model_path), class_mapping_path)
+    if model_format == 'pytorch':
+        from ml_model.inference import PlantDiseaseInference
+        return PlantDiseaseInference(str(model_path), class_mapping_path)
+    raise ValueError(f"Unsupported model format: {model_format}")
+
+
+class _ResidentModel:
+    """A loaded model plus in-flight request accounting"""
+
+    def __init__(self, key: Tuple[str, str], model, source_mtime: float):
+        self.key = key
+        self.model = model
+        self.source_mtime = source_mtime
+        self.inflight = 0
+        self.drained = threading.Condition()
+
+    def enter(self):
+        with self.drained:
+            self.inflight += 1
+
+    def exit(self):
+        with self.drained:
+            self.inflight -= 1
+            if self.inflight == 0:
+                self.drained.notify_all()
+
+    def wait_drained(self, timeout: float) -> bool:
+        with self.drained:
+            return self.drained.wait_for(lambda: self.inflight == 0, timeout=timeout)
+
+
+class _PendingLoad:
+    """A model being loaded; other requests for the same key wait on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class _Lease:
+    """Context manager that keeps a model resident while a request uses it"""
+
+    def __init__(self, resident: _ResidentModel):
+        self.resident = resident
+
+    def __enter__(self):
+        return self.resident.model
+
+    def __exit__(self, *exc):
+        self.resident.exit()
+        return False
+
+
+class ModelRegistry:
+    """
+    Registry of inference models keyed by (model_id, version)
+
+    Models are described by a JSON manifest (path, checksum, architecture,
+    class mapping, format). The active version of each model id is swapped
+    atomically when the manifest or model file changes on disk, or when
+    ``reload`` is called; the previous version is dropped once its
+    in-flight requests have finished. At most ``max_resident`` models are
+    kept in memory, least recently used first out.
+    """
+
+    def __init__(self, manifest_path=None, max_resident: int = 2,
+                 check_interval: float = 5.0, drain_timeout: float = 30.0):
+        """
+        Initialize registry
+
+        Args:
+            manifest_path: Path to manifest JSON (defaults to MODEL_MANIFEST_PATH
+                environment variable, then ml_model/checkpoints/manifest.json)
+            max_resident: Maximum number of models kept in memory
+            check_interval: Seconds between on-disk change checks (0 disables)
+            drain_timeout: Seconds to wait for in-flight requests on swap
+        """
+        self.manifest_path = Path(manifest_path) if manifest_path else default_manifest_path()
+        self.max_resident = max_resident
+        self.check_interval = check_interval
+        self.drain_timeout = drain_timeout
+
+        self._lock = threading.RLock()
+        self._resident: "OrderedDict[Tuple[str, str], _ResidentModel]" = OrderedDict()
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._active: Dict[str, str] = {}
+        self._manifest_mtime = None
+        self._last_check = 0.0
+        # Model ids with a new version being loaded by _swap
+        self._swapping = set()
+        # Keys being loaded outside the lock
+        self._loading: Dict[Tuple[str, str], _PendingLoad] = {}
+
+        self._active.update(self._read_manifest())
+
+    # ------------------------------------------------------------------
+    # Manifest handling
+    # ------------------------------------------------------------------
+    def _read_manifest(self) -> Dict[str, str]:
+        """
+        (Re)load manifest entries; keeps ad-hoc path registrations
+
+        Returns:
+            The active version the manifest asks for, per model id (not
+            applied here; reload swaps to it once it has loaded)
+        """
+        manifest = load_manifest(self.manifest_path)
+        base_dir = self.manifest_path.parent
+
+        wanted = dict(manifest.get('active', {}))
+        # Model ids without an explicit active version use the last listed one
+        for entry in manifest.get('models', []):
+            wanted.setdefault(entry['model_id'], entry['version'])
+
+        with self._lock:
+            for entry in manifest.get('models', []):
+                entry = dict(entry)
+                entry['path'] = str((base_dir / entry['path']).resolve())
+                if entry.get('class_mapping'):
+                    entry['class_mapping'] = str((base_dir / entry['class_mapping']).resolve())
+                self._entries[(entry['model_id'], entry['version'])] = entry
+
+            self._manifest_mtime = (
+                self.manifest_path.stat().st_mtime if self.manifest_path.exists() else None
+            )
+        return wanted
+
+    def register_path(self, model_path, model_id: Optional[str] = None,
+                      class_mapping_path=None) -> str:
+        """
+        Register a model file that is not in the manifest
+
+        The file's modification time is used as its version, so replacing
+        the file on disk triggers a hot swap.
+
+        Returns:
+            The model id to use with ``get``/``acquire``
+        """
+        model_path = Path(model_path).resolve()
+        if not model_path.exists():
+            raise FileNotFoundError(
+                f"Model not found at {model_path}. "
+                "Please train the model first using train_model.py or download a pre-trained model."
+            )
+        model_id = model_id or str(model_path)
+        version = self._add_path_entry(model_path, model_id, class_mapping_path)
+
+        with self._lock:
+            self._active[model_id] = version
+        return model_id
+
+    def _add_path_entry(self, model_path: Path, model_id: str, class_mapping_path) -> str:
+        """Add a watched model file as a (not yet active) version; returns the version"""
+        version = str(model_path.stat().st_mtime_ns)
+        with self._lock:
+            self._entries[(model_id, version)] = {
+                'model_id': model_id,
+                'version': version,
+                'path': str(model_path),
+                'class_mapping': str(class_mapping_path) if class_mapping_path else None,
+                'sha256': None,
+                'format': None,
+                'watch_path': True,
+            }
+        return version
+
+    def list_models(self) -> List[Dict]:
+        """Known model versions with their active/resident status"""
+        with self._lock:
+            return [
+                {
+                    **entry,
+                    'active': self._active.get(key[0]) == key[1],
+                    'resident': key in self._resident,
+                    'inflight': self._resident[key].inflight if key in self._resident else 0,
+                }
+                for key, entry in self._entries.items()
+            ]
+
+    # ------------------------------------------------------------------
+    # Loading and eviction
+    # ------------------------------------------------------------------
+    def _load(self, key: Tuple[str, str]) -> _ResidentModel:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            raise KeyError(f"Unknown model {key[0]} version {key[1]}")
+
+        path = Path(entry['path'])
+        if not path.exists():
+            raise FileNotFoundError(f"Model file missing: {path}")
+        if entry.get('sha256') and file_sha256(path) != entry['sha256']:
+            raise ValueError(f"Checksum mismatch for {key[0]} version {key[1]} ({path})")
+
+        model = load_inference_backend(path, entry.get('class_mapping'), entry.get('format'))
+        expected_arch = entry.get('arch')
+        if expected_arch and getattr(model, 'arch', expected_arch) not in (expected_arch, 'unknown'):
+            raise ValueError(
+                f"Manifest says {expected_arch} but checkpoint contains {model.arch}"
+            )
+
+        print(f"📦 Registry loaded {key[0]} version {key[1]}")
+        return _ResidentModel(key, model, path.stat().st_mtime)
+
+    def _get_or_load(self, key: Tuple[str, str]) -> _ResidentModel:
+        """
+        Resident model for key, loading it if needed
+
+        Must be called without the registry lock held. The load runs
+        unlocked so requests for other models are not blocked; concurrent
+        callers for the same key wait for that one load (and get its error).
+        """
+        with self._lock:
+            resident = self._resident.get(key)
+            if resident is not None:
+                return resident
+            pending = self._loading.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._loading[key] = _PendingLoad()
+
+        if not owner:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return self._get_or_load(key)
+
+        try:
+            resident = self._load(key)
+        except BaseException as e:
+            pending.error = e
+            raise
+        else:
+            with self._lock:
+                resident = self._resident.setdefault(key, resident)
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            pending.done.set()
+        return resident
+
+    def _evict_over_capacity(self):
+        """Drop least recently used idle models beyond max_resident"""
+        active_keys = {(model_id, version) for model_id, version in self._active.items()}
+        for key in list(self._resident):
+            if len(self._resident) <= self.max_resident:
+                break
+            resident = self._resident[key]
+            if key in active_keys or resident.inflight:
+                continue
+            del self._resident[key]
+            print(f"🗑️  Registry evicted {key[0]} version {key[1]}")
+
+    def _resolve(self, model_id: str, version: Optional[str]) -> Tuple[str, str]:
+        version = version or self._active.get(model_id)
+        if version is None:
+            raise KeyError(f"No version registered for model '{model_id}'")
+        return model_id, version
+
+    def acquire(self, model_id: str = DEFAULT_MODEL_ID, version: Optional[str] = None) -> _Lease:
+        """
+        Lease a model for the duration of a request
+
+        Usage:
+            with registry.acquire('plant-disease') as model:
+                result = model.predict(image_path)
+        """
+        self._maybe_check_for_changes()
+
+        with self._lock:
+            key = self._resolve(model_id, version)
+
+        while True:
+            resident = self._get_or_load(key)
+            with self._lock:
+                # Retry if it was evicted between loading and leasing
+                if self._resident.get(key) is resident:
+                    self._resident.move_to_end(key)
+                    resident.enter()
+                    self._evict_over_capacity()
+                    return _Lease(resident)
+
+    def get(self, model_id: str = DEFAULT_MODEL_ID, version: Optional[str] = None) -> "ModelHandle":
+        """Handle that always routes to the active (or pinned) version"""
+        with self._lock:
+            self._resolve(model_id, version)
+        return ModelHandle(self, model_id, version)
+
+    # ------------------------------------------------------------------
+    # Hot swap
+    # ------------------------------------------------------------------
+    def _maybe_check_for_changes(self):
+        if not self.check_interval:
+            return
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+
+        manifest_mtime = (
+            self.manifest_path.stat().st_mtime if self.manifest_path.exists() else None
+        )
+        if manifest_mtime != self._manifest_mtime:
+            print("🔄 Model manifest changed - reloading")
+            # Manifest time is recorded now so later requests don't start another reload
+            self._manifest_mtime = manifest_mtime
+            threading.Thread(target=self.reload, daemon=True).start()
+            return
+
+        # Ad-hoc registered files: a new mtime means a new version
+        with self._lock:
+            watched = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.get('watch_path') and self._active.get(key[0]) == key[1]
+            ]
+        for (model_id, old_version), entry in watched:
+            path = Path(entry['path'])
+            if path.exists() and str(path.stat().st_mtime_ns) != old_version:
+                print(f"🔄 Model file changed: {path}")
+                version = self._add_path_entry(path, model_id, entry.get('class_mapping'))
+                # Load in the background; this request is served by the old version
+                threading.Thread(target=self._swap, args=(model_id, version), daemon=True).start()
+
+    def reload(self, model_id: Optional[str] = None) -> Dict[str, str]:
+        """
+        Re-read the manifest and hot swap active versions
+
+        The new version is fully loaded (and checksum verified) before it
+        becomes active, so requests never see a half-loaded model, and
+        requests keep being served by the old version while it loads. The
+        old version is released in the background once its in-flight
+        requests have drained. If loading fails the old version stays active.
+
+        Args:
+            model_id: Only reload this model id (default: all)
+
+        Returns:
+            Mapping of model id to the now-active version
+        """
+        wanted = self._read_manifest()
+
+        model_ids = [model_id] if model_id else list(wanted)
+        for mid in model_ids:
+            if mid in wanted:
+                self._swap(mid, wanted[mid])
+        with self._lock:
+            return {mid: self._active[mid] for mid in model_ids if mid in self._active}
+
+    def _swap(self, model_id: str, new_version: str):
+        """
+        Make new_version the active version of model_id and retire the old one
+
+        Must be called without the registry lock held: the new version is
+        loaded and verified unlocked (even if the old version was never
+        loaded), and the lock is only taken to switch the active version.
+        """
+        with self._lock:
+            old_version = self._active.get(model_id)
+            if new_version == old_version or model_id in self._swapping:
+                return
+            old_key = (model_id, old_version)
+            new_key = (model_id, new_version)
+            self._swapping.add(model_id)
+
+        try:
+            try:
+                resident = self._get_or_load(new_key)
+            except Exception as e:
+                # Keep serving the old version if the new one is broken
+                print(f"❌ Reload of {model_id} version {new_version} failed: {e}")
+                return
+
+            with self._lock:
+                self._resident.setdefault(new_key, resident)
+                self._active[model_id] = new_version
+        finally:
+            with self._lock:
+                self._swapping.discard(model_id)
+
+        threading.Thread(target=self._retire, args=(old_key,), daemon=True).start()
+
+    def _retire(self, key: Tuple[str, str]):
+        """Wait for in-flight requests on an old version, then drop it"""
+        with self._lock:
+            resident = self._resident.get(key)
+        if resident is None:
+            return
+        if not resident.wait_drained(self.drain_timeout):
+            print(f"⚠️ {key[0]} version {key[1]} still busy after {self.drain_timeout}s")
+            return
+        with self._lock:
+            if self._active.get(key[0]) != key[1] and not resident.inflight:
+                self._resident.pop(key, None)
+                print(f"♻️  Retired {key[0]} version {key[1]}")
+
+
+class ModelHandle:
+    """
+    Inference-model lookalike bound to a registry entry
+
+    ``predict``/``batch_predict`` lease the currently active version for the
+    duration of the call, so callers follow hot swaps transparently.
+    """
+
+    def __init__(self, registry: ModelRegistry, model_id: str, version: Optional[str] = None):
+        self._registry = registry
+        self.model_id = model_id
+        self.version = version
+
+    def predict(self, *args, **kwargs):
+        with self._registry.acquire(self.model_id, self.version) as model:
+            return model.predict(*args, **kwargs)
+
+    def batch_predict(self, *args, **kwargs):
+        with self._registry.acquire(self.model_id, self.version) as model:
+            return model.batch_predict(*args, **kwargs)
+
+    def predict_preprocessed(self, *args, **kwargs):
+        with self._registry.acquire(self.model_id, self.version) as model:
+            return model.predict_preprocessed(*args, **kwargs)
+
+    def predict_probabilities(self, *args, **kwargs):
+        with self._registry.acquire(self.model_id, self.version) as model:
+            return model.predict_probabilities(*args, **kwargs)
+
+    def predict_logits(self, *args, **kwargs):
+        with self._registry.acquire(self.model_id, self.version) as model:
+            return model.predict_logits(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Attributes such as classes/arch come from the current version
+        with self._registry.acquire(self.model_id, self.version) as model:
+            return getattr(model, name)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ModelRegistry:
+    """Process-wide model registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry(
+                max_resident=int(os.environ.get('MODEL_REGISTRY_MAX_RESIDENT', '2'))
+            )
+        return _registry
+
+
+def get_inference_model(model_path: str = None, model_id: Optional[str] = None,
+                        version: Optional[str] = None):
+    """
+    Get an inference model for this process
+
+    When INFERENCE_SOCKET is set and no explicit model is requested, returns
+    a client for the shared inference sidecar (ml_model/inference_server.py)
+    instead of loading the model in this process.
+
+    Args:
+        model_path: Explicit model file (.pth, .pt or .onnx)
+        model_id: Manifest model id (defaults to "plant-disease")
+        version: Pin a specific manifest version instead of the active one
+
+    Returns:
+        Object with the PlantDiseaseInference predict/batch_predict interface
+    """
+    socket_path = os.environ.get('INFERENCE_SOCKET')
+    if socket_path and model_path is None and model_id is None and version is None:
+        from ml_model.inference_server import InferenceClient
+        return InferenceClient(socket_path)
+
+    return get_local_inference_model(model_path, model_id, version)
+
+
+def get_local_inference_model(model_path: str = None, model_id: Optional[str] = None,
+                              version: Optional[str] = None) -> ModelHandle:
+    """
+    Get an inference model from the in-process registry
+
+    Args:
+        model_path: Explicit model file (.pth, .pt or .onnx). Registered on first
+            use and hot swapped when the file changes.
+        model_id: Manifest model id (defaults to "plant-disease")
+        version: Pin a specific manifest version instead of the active one
+
+    Returns:
+        ModelHandle with the PlantDiseaseInference predict/batch_predict interface
+    """
+    registry = get_registry()
+
+    if model_path is not None:
+        model_id = registry.register_path(model_path, model_id)
+    else:
+        model_id = model_id or DEFAULT_MODEL_ID
+        with registry._lock:
+            known = model_id in registry._active
+        if not known:
+            # No manifest entry: fall back to the default checkpoint location
+            model_id = registry.register_path(DEFAULT_MODEL_PATH, model_id)
+
+    handle = registry.get(model_id, version)
+    # Load eagerly so missing/broken models fail at startup, not first request
+    with registry.acquire(model_id, version):
+        pass
+    return handle
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Manage the versioned model manifest')
+    parser.add_argument('--manifest', type=str, default=str(default_manifest_path()),
+                       help='Path to manifest JSON (default: MODEL_MANIFEST_PATH or checkpoints/manifest.json)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='Add a model version and make it active')
+    add_parser.add_argument('--model', type=str, required=True, help='Model file (.pth/.pt/.onnx)')
+    add_parser.add_argument('--version', type=str, required=True, help='Version label')
+    add_parser.add_argument('--model-id', type=str, default=DEFAULT_MODEL_ID, help='Model id')
+    add_parser.add_argument('--class-mapping', type=str, default=None, help='Class mapping JSON')
+    add_parser.add_argument('--arch', type=str, default=None, help='Backbone architecture')
+
+    subparsers.add_parser('list', help='List manifest entries')
+
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        entry = add_manifest_entry(
+            args.manifest, args.model, args.version, args.model_id,
+            args.class_mapping, args.arch
+        )
+        print(f"✅ Added {entry['model_id']} version {entry['version']} ({entry['sha256'][:12]})")
+    else:
+        manifest = load_manifest(args.manifest)
+        active = manifest.get('active', {})
+        for entry in manifest.get('models', []):
+            marker = '*' if active.get(entry['model_id']) == entry['version'] else ' '
+            print(f"{marker} {entry['model_id']:<16} {entry['version']:<20} "
+                  f"{entry.get('arch') or '-':<20} {entry['format']:<8} {entry['path']}")
@@ -0,0 +1,66 @@
+"""
+Process memory statistics for startup and training reports
+Uses /proc on Linux and falls back to the resource module elsewhere
+"""
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+
+def _read_kb_fields(path: Path, fields) -> Dict[str, float]:
+    """Read "Name:   1234 kB" style fields from a /proc file as MB"""
+    values = {}
+    with open(path, 'r') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in fields:
+                values[name] = int(rest.split()[0]) / 1024
+    return values
+
+
+def get_memory_usage() -> Dict[str, Optional[float]]:
+    """
+    Current process memory in MB
+
+    Returns:
+        Dictionary with rss_mb, peak_rss_mb and, on Linux, pss_mb (RSS with
+        shared pages divided among the processes sharing them) and
+        shared_mb (pages shared with other processes, e.g. fork or mmap).
+        Values that cannot be measured on this platform are None.
+    """
+    usage = {'rss_mb': None, 'peak_rss_mb': None, 'pss_mb': None, 'shared_mb': None}
+
+    status = Path('/proc/self/status')
+    if status.exists():
+        fields = _read_kb_fields(status, {'VmRSS', 'VmHWM'})
+        usage['rss_mb'] = fields.get('VmRSS')
+        usage['peak_rss_mb'] = fields.get('VmHWM')
+
+        rollup = Path('/proc/self/smaps_rollup')
+        if rollup.exists():
+            fields = _read_kb_fields(rollup, {'Pss', 'Shared_Clean', 'Shared_Dirty'})
+            usage['pss_mb'] = fields.get('Pss')
+            usage['shared_mb'] = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+        return usage
+
+    try:
+        import resource
+    except ImportError:
+        # Windows: no resource module
+        return usage
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kB on Linux/BSD
+    usage['peak_rss_mb'] = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return usage
+
+
+def format_memory_usage(usage: Dict[str, Optional[float]]) -> str:
+    """One-line human readable memory summary"""
+    parts = [f"pid {os.getpid()}"]
+    for key, label in (('rss_mb', 'RSS'), ('pss_mb', 'PSS'),
+                       ('shared_mb', 'shared'), ('peak_rss_mb', 'peak')):
+        if usage.get(key) is not None:
+            parts.append(f"{label} {usage[key]:.0f} MB")
+    return ', '.join(parts)
@@ -0,0 +1,210 @@
+"""
+Lesion-area severity estimation for a single leaf photo
+NumPy/PIL only: leaf and lesion pixels are segmented with HSV colour
+thresholds and square-window morphology on a small thumbnail, so an image
+is measured in a few milliseconds without any model or API call
+
+Lesions are brown, yellow, orange or black tissue surrounded by green leaf.
+Pale coatings such as powdery mildew are close to the grey of a typical
+background and are not counted.
+"""
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+# Allow running as a script (python ml_model/severity.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+ANALYSIS_SIZE = 256
+
+# PIL's HSV mode stores hue as 0-255 for 0-360 degrees
+GREEN_HUE = (round(65 * 255 / 360), round(170 * 255 / 360))
+MIN_SATURATION = 40
+MIN_GREEN_VALUE = 40
+DARK_VALUE = 60
+
+# Upper bounds (percent of leaf area) for each severity label
+SEVERITY_BANDS = ((2.0, 'none'), (10.0, 'mild'), (25.0, 'moderate'))
+
+
+def severity_label(affected_percent: float) -> str:
+    """Map percent of leaf area affected to none/mild/moderate/severe"""
+    for upper, label in SEVERITY_BANDS:
+        if affected_percent < upper:
+            return label
+    return 'severe'
+
+
+def _otsu_threshold(values: np.ndarray) -> int:
+    """Otsu threshold of a uint8 array from its histogram"""
+    hist = np.bincount(values.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(hist)
+    total = weight[-1]
+    mean = np.cumsum(hist * np.arange(256))
+    background = weight[:-1]
+    foreground = total - background
+    valid = (background > 0) & (foreground > 0)
+    between = np.zeros(255)
+    between[valid] = (mean[-1] * background[valid] / total - mean[:-1][valid]) ** 2 \
+        / (background[valid] * foreground[valid])
+    return int(np.argmax(between))
+
+
+def _window_reduce(mask: np.ndarray, radius: int, dilate: bool) -> np.ndarray:
+    """
+    Separable max (dilate) or min (erode) over a (2r+1)^2 square window
+
+    Each pass counts set pixels per window with a cumulative sum, so the cost
+    does not depend on the radius.
+    """
+    if radius <= 0:
+        return mask
+    window = 2 * radius + 1
+    for axis in (0, 1):
+        pad = [(0, 0), (0, 0)]
+        pad[axis] = (radius + 1, radius)
+        # Outside the image counts as background for dilation, and as
+        # "same as the edge" for erosion so objects touching the border survive
+        padded = np.pad(mask, pad, mode='constant' if dilate else 'edge')
+        counts = np.cumsum(padded, axis=axis, dtype=np.int32)
+        upper = counts[window:] if axis == 0 else counts[:, window:]
+        lower = counts[:-window] if axis == 0 else counts[:, :-window]
+        mask = (upper - lower) > 0 if dilate else (upper - lower) == window
+    return mask
+
+
+def dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    return _window_reduce(mask, radius, dilate=True)
+
+
+def erode(mask: np.ndarray, radius: int) -> np.ndarray:
+    return _window_reduce(mask, radius, dilate=False)
+
+
+def opening(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Remove specks smaller than the window"""
+    return dilate(erode(mask, radius), radius)
+
+
+def closing(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Fill holes and gaps smaller than the window"""
+    return erode(dilate(mask, radius), radius)
+
+
+def _thumbnail(image: Union[str, Path, Image.Image], size: int) -> Image.Image:
+    """RGB image whose longest side is ``size`` pixels (JPEGs decoded at reduced scale)"""
+    if not isinstance(image, Image.Image):
+        with Image.open(image) as opened:
+            opened.draft('RGB', (size, size))
+            return _thumbnail(opened.convert('RGB'), size)
+
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    scale = size / max(image.size)
+    if scale < 1:
+        image = image.resize(
+            (max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+            Image.BILINEAR, reducing_gap=2.0
+        )
+    return image
+
+
+def segment_leaf(image: Image.Image) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Segment leaf and lesion pixels of an RGB image
+
+    Green pixels are healthy tissue. Saturated non-green pixels and dark
+    pixels count as leaf only near green tissue, which keeps soil and
+    shadows around the leaf out of the measurement.
+
+    Returns:
+        Tuple of (leaf mask, lesion mask), boolean arrays of the image shape
+    """
+    hsv = np.asarray(image.convert('HSV'))
+    hue, saturation, value = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    radius = max(1, min(hue.shape) // 100)
+
+    min_saturation = max(MIN_SATURATION, min(_otsu_threshold(saturation), 120))
+    saturated = saturation >= min_saturation
+    green = (saturated & (hue >= GREEN_HUE[0]) & (hue <= GREEN_HUE[1])
+             & (value >= MIN_GREEN_VALUE))
+    green = opening(green, radius)
+
+    # Lesions lie on or beside green tissue; limit the search to its vicinity
+    near_green = dilate(green, max(2, min(hue.shape) // 12))
+    candidate = (saturated | (value < DARK_VALUE)) & near_green
+
+    leaf = closing(green | candidate, 2 * radius) & near_green
+    lesion = opening(leaf & ~green, radius)
+    return leaf, lesion
+
+
+def estimate_severity(image: Union[str, Path, Image.Image], size: int = ANALYSIS_SIZE,
+                      return_masks: bool = False) -> Dict:
+    """
+    Measure the share of leaf area covered by lesions
+
+    Args:
+        image: Image path or PIL image
+        size: Longest side of the thumbnail that is analyzed
+        return_masks: Include the boolean leaf and lesion masks
+
+    Returns:
+        Dictionary with affected_area_percent, severity (none/mild/moderate/
+        severe), leaf_coverage_percent (share of the photo that is leaf),
+        method and latency_ms
+    """
+    start = time.perf_counter()
+    leaf, lesion = segment_leaf(_thumbnail(image, size))
+
+    leaf_pixels = int(leaf.sum())
+    affected = 100.0 * lesion.sum() / leaf_pixels if leaf_pixels else 0.0
+    result = {
+        'affected_area_percent': round(float(affected), 1),
+        'severity': severity_label(affected),
+        'leaf_coverage_percent': round(100.0 * leaf_pixels / leaf.size, 1),
+        'method': 'colour_segmentation',
+        'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+    }
+    if return_masks:
+        result['leaf_mask'] = leaf
+        result['lesion_mask'] = lesion
+    return result
+
+
+def render_mask(image_path: str, result: Dict, output_path: str, size: int = ANALYSIS_SIZE):
+    """Save the analyzed thumbnail with leaf (green) and lesion (red) overlays"""
+    thumbnail = _thumbnail(image_path, size)
+    overlay = np.asarray(thumbnail).copy()
+    overlay[result['leaf_mask']] = (overlay[result['leaf_mask']] * 0.5 + (0, 127, 0)).astype(np.uint8)
+    overlay[result['lesion_mask']] = (255, 0, 0)
+    Image.fromarray(overlay).save(output_path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Estimate lesion area of leaf images')
+    parser.add_argument('--image', type=str, nargs='+', required=True,
+                       help='Leaf image(s)')
+    parser.add_argument('--size', type=int, default=ANALYSIS_SIZE,
+                       help='Longest side of the analyzed thumbnail')
+    parser.add_argument('--mask-out', type=str, default=None,
+                       help='Optional path for a segmentation overlay (first image)')
+
+    args = parser.parse_args()
+
+    for i, image_path in enumerate(args.image):
+        result = estimate_severity(image_path, args.size, return_masks=bool(args.mask_out) and i == 0)
+        print(f"🍃 {image_path}: {result['affected_area_percent']:.1f}% of leaf affected "
+              f"({result['severity']}), leaf covers {result['leaf_coverage_percent']:.0f}% "
+              f"of photo, {result['latency_ms']:.1f} ms")
+        if args.mask_out and i == 0:
+            render_mask(image_path, result, args.mask_out, args.size)
+            print(f"✅ Overlay saved to: {args.mask_out}")
@@ -0,0 +1,274 @@
+"""
+Shadow mode: run the local model next to the cloud vision model
+The cloud answer is served; the local prediction runs on a background thread
+off the critical path and the pair is recorded for later comparison. The
+report shows per-class agreement and what each hybrid escalation threshold
+would have saved in cloud calls, cost and latency
+"""
+import json
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Allow running as a script (python ml_model/shadow.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+DEFAULT_DB_PATH = Path(parent_dir) / "data" / "farm_memory.db"
+DEFAULT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+def _tokens(name: Optional[str]) -> frozenset:
+    """Lower-case word set of a plant/disease name ("Pepper,_bell" -> {pepper, bell})"""
+    return frozenset(re.findall(r'[a-z0-9]+', (name or '').lower()))
+
+
+def labels_match(a: Optional[str], b: Optional[str]) -> bool:
+    """
+    Loose name comparison between the cloud's free text and a class name
+
+    Names match when one word set contains the other, so "Early blight"
+    matches "Tomato Early Blight" but "Leaf Mold" does not match "Leaf Spot".
+    """
+    a_tokens, b_tokens = _tokens(a), _tokens(b)
+    if not a_tokens or not b_tokens:
+        return False
+    return a_tokens <= b_tokens or b_tokens <= a_tokens
+
+
+def parse_cloud_diagnosis(text: str) -> Dict:
+    """
+    Extract plant, disease and confidence (0-1) from the vision model's JSON answer
+
+    Tolerates markdown code fences and text around the JSON object.
+    """
+    match = re.search(r'\{.*\}', text or '', re.DOTALL)
+    try:
+        data = json.loads(match.group(0)) if match else {}
+    except json.JSONDecodeError:
+        data = {}
+    confidence = data.get('disease_confidence', data.get('confidence'))
+    try:
+        confidence = float(confidence) / 100.0 if confidence is not None else None
+    except (TypeError, ValueError):
+        confidence = None
+    return {
+        'plant': data.get('plant_type'),
+        'disease': data.get('disease_name'),
+        'confidence': confidence,
+    }
+
+
+class ShadowEvaluator:
+    """
+    Runs the local model in the background and records agreement with the cloud
+
+    A single worker thread keeps shadow inference from competing with
+    request handling for every core; when ``max_pending`` runs are queued
+    new requests are not shadowed (counted in ``skipped``).
+    """
+
+    def __init__(self, model, record: Callable[[Dict], object], max_pending: int = 4):
+        """
+        Initialize shadow evaluator
+
+        Args:
+            model: Local inference model (predict interface)
+            record: Called with one comparison row per request (e.g.
+                MemoryAgent.save_shadow_comparison)
+            max_pending: Maximum queued shadow runs before requests are skipped
+        """
+        self.model = model
+        self.record = record
+        self.max_pending = max_pending
+        self.skipped = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+
+    def _run_local(self, image_path: str) -> Dict:
+        start = time.perf_counter()
+        prediction = self.model.predict(image_path, top_k=1)
+        prediction['latency_ms'] = (time.perf_counter() - start) * 1000
+        return prediction
+
+    def _done(self, _future: Future):
+        with self._lock:
+            self._pending -= 1
+
+    def start(self, image_path: str) -> Optional[Future]:
+        """Queue a local prediction; returns None when the queue is full"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.skipped += 1
+                return None
+            self._pending += 1
+        future = self._executor.submit(self._run_local, image_path)
+        future.add_done_callback(self._done)
+        return future
+
+    def finish(self, local_run: Future, cloud_text: str, cloud_latency_ms: float,
+               image_hash: Optional[str] = None, user_id: Optional[str] = None):
+        """Record the comparison once the local prediction is ready (does not block)"""
+        cloud = parse_cloud_diagnosis(cloud_text)
+
+        def record(future: Future):
+            try:
+                self.record(self.compare(future.result(), cloud, cloud_latency_ms,
+                                         image_hash, user_id))
+            except Exception as e:
+                print(f"⚠️ Shadow comparison failed: {e}")
+
+        local_run.add_done_callback(record)
+
+    def compare(self, prediction: Dict, cloud: Dict, cloud_latency_ms: float,
+                image_hash: Optional[str] = None, user_id: Optional[str] = None) -> Dict:
+        """Comparison row for one request"""
+        primary = prediction['primary_prediction']
+        return {
+            'image_hash': image_hash,
+            'user_id': user_id,
+            'cloud_plant': cloud['plant'],
+            'cloud_disease': cloud['disease'],
+            'cloud_confidence': cloud['confidence'],
+            'cloud_latency_ms': round(cloud_latency_ms, 2),
+            'local_plant': primary['plant'],
+            'local_disease': primary['disease'],
+            'local_confidence': round(primary['confidence'], 4),
+            'local_latency_ms': round(prediction['latency_ms'], 2),
+            'model_arch': prediction['model_info'].get('arch', 'unknown'),
+            'plant_match': labels_match(cloud['plant'], primary['plant']),
+            'disease_match': labels_match(cloud['disease'], primary['disease']),
+        }
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+def agreement_by_class(rows: Sequence[Dict]) -> List[Dict]:
+    """Agreement statistics grouped by the cloud's (plant, disease) answer"""
+    groups: Dict[tuple, List[Dict]] = {}
+    for row in rows:
+        key = (' '.join(sorted(_tokens(row['cloud_plant']))) or 'unknown',
+               ' '.join(sorted(_tokens(row['cloud_disease']))) or 'unknown')
+        groups.setdefault(key, []).append(row)
+
+    stats = []
+    for group in groups.values():
+        n = len(group)
+        stats.append({
+            'plant': group[0]['cloud_plant'] or 'unknown',
+            'disease': group[0]['cloud_disease'] or 'unknown',
+            'count': n,
+            'plant_agreement': sum(r['plant_match'] for r in group) / n,
+            'disease_agreement': sum(r['plant_match'] and r['disease_match'] for r in group) / n,
+            'mean_local_confidence': sum(r['local_confidence'] for r in group) / n,
+        })
+    return sorted(stats, key=lambda s: -s['count'])
+
+
+def project_thresholds(rows: Sequence[Dict], thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+                       cost_per_call: float = 0.0) -> List[Dict]:
+    """
+    Replay recorded requests through the hybrid policy at each threshold
+
+    A request is served locally when the local confidence exceeds the
+    threshold, otherwise it pays the local latency plus the cloud call.
+
+    Returns:
+        One row per threshold with the local share, agreement of the
+        locally served answers with the cloud, cloud calls and cost saved,
+        and mean latency compared with cloud-only serving
+    """
+    n = len(rows)
+    if not n:
+        return []
+    cloud_only_ms = sum(r['cloud_latency_ms'] for r in rows) / n
+
+    projections = []
+    for threshold in thresholds:
+        local = [r for r in rows if r['local_confidence'] > threshold]
+        escalated_cloud_ms = sum(r['cloud_latency_ms'] for r in rows
+                                 if r['local_confidence'] <= threshold)
+        hybrid_ms = (sum(r['local_latency_ms'] for r in rows) + escalated_cloud_ms) / n
+        projections.append({
+            'threshold': threshold,
+            'local_share': len(local) / n,
+            'local_agreement': (sum(r['plant_match'] and r['disease_match'] for r in local)
+                                / len(local)) if local else None,
+            'cloud_calls_saved': len(local),
+            'cost_saved': len(local) * cost_per_call,
+            'mean_latency_ms': hybrid_ms,
+            'latency_saved_ms': cloud_only_ms - hybrid_ms,
+        })
+    return projections
+
+
+def load_comparisons(db_path: str, since: Optional[str] = None) -> List[Dict]:
+    """Read recorded comparisons from the memory database"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    query = "SELECT * FROM shadow_comparisons"
+    params = ()
+    if since:
+        query += " WHERE created_at >= ?"
+        params = (since,)
+    rows = [dict(row) for row in conn.execute(query, params)]
+    conn.close()
+    return rows
+
+
+def print_report(rows: Sequence[Dict], thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+                 cost_per_call: float = 0.0):
+    """Print per-class agreement and per-threshold projections"""
+    n = len(rows)
+    if not n:
+        print("No shadow comparisons recorded yet (set SHADOW_MODE_ENABLED=true)")
+        return
+
+    both = sum(r['plant_match'] and r['disease_match'] for r in rows)
+    print(f"\n🕶️  {n} shadowed requests: plant agreement "
+          f"{sum(r['plant_match'] for r in rows) / n * 100:.1f}%, "
+          f"plant+disease agreement {both / n * 100:.1f}%")
+    print(f"⏱️  Mean latency: local {sum(r['local_latency_ms'] for r in rows) / n:.0f} ms, "
+          f"cloud {sum(r['cloud_latency_ms'] for r in rows) / n:.0f} ms")
+
+    print(f"\n{'Cloud answer':<40} {'n':>5} {'plant':>7} {'disease':>8} {'local conf':>11}")
+    print("-" * 75)
+    for s in agreement_by_class(rows):
+        label = f"{s['plant']} - {s['disease']}"[:40]
+        print(f"{label:<40} {s['count']:>5} {s['plant_agreement']*100:>6.0f}% "
+              f"{s['disease_agreement']*100:>7.0f}% {s['mean_local_confidence']*100:>10.0f}%")
+
+    print(f"\n{'Threshold':>9} {'local':>7} {'agree':>7} {'calls saved':>12} "
+          f"{'cost saved':>11} {'latency':>9} {'saved':>9}")
+    print("-" * 72)
+    for p in project_thresholds(rows, thresholds, cost_per_call):
+        agreement = f"{p['local_agreement']*100:.0f}%" if p['local_agreement'] is not None else '-'
+        print(f"{p['threshold']:>9.2f} {p['local_share']*100:>6.0f}% {agreement:>7} "
+              f"{p['cloud_calls_saved']:>12} {p['cost_saved']:>11.2f} "
+              f"{p['mean_latency_ms']:>7.0f}ms {p['latency_saved_ms']:>7.0f}ms")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Shadow-mode report: local model vs cloud vision')
+    parser.add_argument('--db', type=str, default=str(DEFAULT_DB_PATH),
+                       help='Memory database with the shadow_comparisons table')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=list(DEFAULT_THRESHOLDS),
+                       help='Hybrid escalation thresholds to project')
+    parser.add_argument('--cost-per-call', type=float, default=0.0,
+                       help='Cloud vision cost per request (for projected savings)')
+    parser.add_argument('--since', type=str, default=None,
+                       help='Only use comparisons recorded on/after this date (YYYY-MM-DD)')
+
+    args = parser.parse_args()
+
+    print_report(load_comparisons(args.db, args.since), args.thresholds, args.cost_per_call)
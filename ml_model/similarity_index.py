@@ -0,0 +1,188 @@
+"""
+Cosine-similarity index over image embeddings for "similar past case" lookups
+NumPy only; flat (exact) search by default, optionally IVF-partitioned
+"""
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so a dot product is the cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means returning k normalized centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+    return _normalize(centroids)
+
+
+class EmbeddingIndex:
+    """
+    In-memory cosine-similarity index with incremental adds
+
+    Vectors live in one preallocated float32 matrix that grows by doubling,
+    so adds are amortized O(1). Re-adding an id or removing it leaves a
+    tombstone that ``compact`` reclaims.
+
+    With ``nlist`` > 0 the index is IVF-partitioned once it holds
+    ``nlist * 8`` vectors: rows are assigned to the nearest of ``nlist``
+    k-means centroids and a search only scans the ``nprobe`` closest lists.
+    Below that size (and with nlist=0) search is an exact matrix product.
+    """
+
+    def __init__(self, dim: int, nlist: int = 0, nprobe: int = 4):
+        """
+        Initialize index
+
+        Args:
+            dim: Embedding dimension
+            nlist: Number of IVF partitions (0 = flat exact search)
+            nprobe: Partitions scanned per query in IVF mode
+        """
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._ids: List[Optional[Hashable]] = []
+        self._row_of: Dict[Hashable, int] = {}
+        self._size = 0
+
+        self._centroids: Optional[np.ndarray] = None
+        self._assignment = np.empty(0, dtype=np.int32)
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    def __contains__(self, item_id: Hashable) -> bool:
+        return item_id in self._row_of
+
+    @property
+    def tombstones(self) -> int:
+        """Rows occupied by removed or replaced vectors"""
+        return self._size - len(self._row_of)
+
+    def _grow(self, needed: int):
+        capacity = len(self._vectors)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        vectors = np.empty((new_capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        self._vectors = vectors
+        assignment = np.full(new_capacity, -1, dtype=np.int32)
+        assignment[:self._size] = self._assignment[:self._size]
+        self._assignment = assignment
+
+    def add(self, ids: Sequence[Hashable], vectors: np.ndarray):
+        """
+        Add (or replace) vectors
+
+        Args:
+            ids: One identifier per row (e.g. image hashes)
+            vectors: (N, dim) array, any float dtype
+        """
+        vectors = _normalize(np.asarray(vectors).reshape(-1, self.dim))
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+
+        for item_id in ids:
+            self.remove(item_id)
+
+        start = self._size
+        self._grow(start + len(vectors))
+        self._vectors[start:start + len(vectors)] = vectors
+        for offset, item_id in enumerate(ids):
+            self._ids.append(item_id)
+            self._row_of[item_id] = start + offset
+        self._size += len(vectors)
+
+        if self._centroids is not None:
+            self._assignment[start:self._size] = np.argmax(vectors @ self._centroids.T, axis=1)
+        elif self.nlist and len(self) >= self.nlist * 8:
+            self._train()
+
+    def remove(self, item_id: Hashable) -> bool:
+        """Remove a vector; its row is reclaimed by the next compaction"""
+        row = self._row_of.pop(item_id, None)
+        if row is None:
+            return False
+        self._ids[row] = None
+        return True
+
+    def _train(self):
+        """(Re)build the IVF partitions from the live vectors"""
+        live = np.fromiter(self._row_of.values(), dtype=np.int64)
+        k = min(self.nlist, len(live))
+        self._centroids = _kmeans(self._vectors[live], k)
+        self._assignment[:self._size] = np.argmax(
+            self._vectors[:self._size] @ self._centroids.T, axis=1
+        )
+        self._trained_size = len(live)
+
+    @property
+    def needs_compaction(self) -> bool:
+        """More than a quarter of rows are dead, or IVF was trained on < half the data"""
+        if self._size and self.tombstones > self._size // 4:
+            return True
+        return self._centroids is not None and len(self) > 2 * self._trained_size
+
+    def compact(self):
+        """Drop tombstoned rows and retrain IVF partitions if enabled"""
+        live = sorted(self._row_of.values())
+        self._vectors = self._vectors[live].copy()
+        self._ids = [self._ids[row] for row in live]
+        self._row_of = {item_id: row for row, item_id in enumerate(self._ids)}
+        self._assignment = self._assignment[live].copy()
+        self._size = len(live)
+
+        if self.nlist and len(self) >= self.nlist * 8:
+            self._train()
+        else:
+            self._centroids = None
+
+    def search(self, query: np.ndarray, k: int = 5,
+               min_similarity: float = -1.0) -> List[Tuple[Hashable, float]]:
+        """
+        Find the most similar stored vectors
+
+        Args:
+            query: (dim,) embedding
+            k: Maximum number of results
+            min_similarity: Drop results below this cosine similarity
+
+        Returns:
+            List of (id, cosine similarity), most similar first
+        """
+        if not self._row_of:
+            return []
+        query = _normalize(np.asarray(query).reshape(self.dim))
+
+        if self._centroids is not None:
+            nprobe = min(self.nprobe, len(self._centroids))
+            probes = np.argsort(-(self._centroids @ query))[:nprobe]
+            rows = np.flatnonzero(np.isin(self._assignment[:self._size], probes))
+        else:
+            rows = np.arange(self._size)
+
+        scores = self._vectors[rows] @ query
+        results = []
+        for i in np.argsort(-scores):
+            if scores[i] < min_similarity or len(results) == k:
+                break
+            item_id = self._ids[rows[i]]
+            if item_id is not None:
+                results.append((item_id, float(scores[i])))
+        return results
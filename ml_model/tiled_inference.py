@@ -0,0 +1,229 @@
+"""
+Tiled (sliding-window) inference for wide field photos with many leaves
+Scores overlapping tiles in batches and aggregates them into a coarse
+disease heatmap and a whole-image verdict
+"""
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+# Allow running as a script (python ml_model/tiled_inference.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.base_inference import BaseInference
+from ml_model.preprocessing import load_image, normalize_batch
+
+
+def tile_positions(length: int, tile: int, stride: int) -> List[int]:
+    """Window offsets along one axis; the last window is aligned to the edge"""
+    if length <= tile:
+        return [0]
+    positions = list(range(0, length - tile + 1, stride))
+    if positions[-1] != length - tile:
+        positions.append(length - tile)
+    return positions
+
+
+def extract_tiles(image: Image.Image, tile_size: int, stride: int,
+                  model_size: int) -> Tuple[np.ndarray, List[Tuple[int, int, int, int]], Tuple[int, int]]:
+    """
+    Cut an image into overlapping tiles at model resolution
+
+    The image is resized once so that a tile_size window becomes model_size
+    pixels, then tiles are sliced out of the uint8 array without further
+    resampling.
+
+    Args:
+        image: RGB PIL image
+        tile_size: Window size in original image pixels
+        stride: Window step in original image pixels
+        model_size: Model input resolution
+
+    Returns:
+        Tuple of (NHWC uint8 tiles, boxes (left, top, right, bottom) in
+        original pixels, (rows, cols) of the tile grid)
+    """
+    width, height = image.size
+    scale = model_size / tile_size
+    scaled = image.resize(
+        (max(model_size, round(width * scale)), max(model_size, round(height * scale))),
+        Image.BILINEAR, reducing_gap=2.0
+    )
+    array = np.asarray(scaled)
+
+    step = max(1, round(stride * scale))
+    ys = tile_positions(array.shape[0], model_size, step)
+    xs = tile_positions(array.shape[1], model_size, step)
+
+    tiles = np.stack([array[y:y + model_size, x:x + model_size] for y in ys for x in xs])
+    boxes = [
+        (round(x / scale), round(y / scale),
+         min(width, round((x + model_size) / scale)), min(height, round((y + model_size) / scale)))
+        for y in ys for x in xs
+    ]
+    return tiles, boxes, (len(ys), len(xs))
+
+
+class TiledInference(BaseInference):
+    """
+    Sliding-window wrapper around any backend with predict_probabilities
+
+    Every tile is classified; the whole-image verdict mean-pools the healthy
+    classes but max-pools the disease classes, so a lesion visible in a
+    single tile is not diluted by the healthy leaves around it.
+    """
+
+    backend = "tiled"
+
+    def __init__(self, model: BaseInference, tile_size: int = 448, stride: int = 336,
+                 max_batch: int = 32):
+        """
+        Initialize tiled inference
+
+        Args:
+            model: Inference backend (PyTorch, ONNX, sidecar or registry handle)
+            tile_size: Window size in original image pixels
+            stride: Window step in original image pixels (< tile_size overlaps)
+            max_batch: Maximum tiles per forward pass
+        """
+        if stride <= 0 or tile_size <= 0:
+            raise ValueError("tile_size and stride must be positive")
+        self.model = model
+        self.tile_size = tile_size
+        self.stride = stride
+        self.max_batch = max_batch
+
+        self.classes = model.classes
+        self.class_to_idx = model.class_to_idx
+        self.idx_to_class = {v: k for k, v in self.class_to_idx.items()}
+        self.arch = getattr(model, 'arch', 'unknown')
+        self.device = getattr(model, 'device', 'cpu')
+        self.image_size = getattr(model, 'image_size', 224)
+
+        self._healthy = np.array([
+            self._parse_class_name(self.idx_to_class[i])['disease'].lower() == 'healthy'
+            for i in range(len(self.classes))
+        ])
+
+    def _tile_probabilities(self, tiles: np.ndarray) -> np.ndarray:
+        """Class probabilities for NHWC uint8 tiles, max_batch tiles per pass"""
+        return np.concatenate([
+            self.model.predict_probabilities(normalize_batch(tiles[i:i + self.max_batch]))
+            for i in range(0, len(tiles), self.max_batch)
+        ])
+
+    def aggregate(self, probabilities: np.ndarray) -> np.ndarray:
+        """Whole-image class probabilities from per-tile probabilities"""
+        pooled = np.where(self._healthy, probabilities.mean(axis=0), probabilities.max(axis=0))
+        return pooled / pooled.sum()
+
+    def predict(self, image_path: str, top_k: int = 3) -> Dict:
+        """
+        Predict disease for a wide image from overlapping tiles
+
+        Args:
+            image_path: Path to plant/field image
+            top_k: Number of top predictions to return
+
+        Returns:
+            Standard prediction dictionary for the whole-image verdict, plus
+            a "tiles" entry with the grid shape, per-tile boxes and top class,
+            a disease-probability heatmap (rows x cols) and latency
+        """
+        start = time.perf_counter()
+        image = load_image(image_path)
+        tiles, boxes, grid = extract_tiles(image, self.tile_size, self.stride, self.image_size)
+        probabilities = self._tile_probabilities(tiles)
+
+        result = self._format_prediction(
+            self.aggregate(probabilities), top_k, image.size, str(self.device)
+        )
+
+        disease_score = 1.0 - probabilities[:, self._healthy].sum(axis=1)
+        top_class = probabilities.argmax(axis=1)
+        result['tiles'] = {
+            'grid': list(grid),
+            'tile_size': self.tile_size,
+            'stride': self.stride,
+            'num_tiles': len(tiles),
+            'heatmap': disease_score.astype(np.float64).reshape(grid).round(3).tolist(),
+            'diseased_fraction': round(float((disease_score >= 0.5).mean()), 3),
+            'boxes': [
+                {
+                    'box': list(box),
+                    'disease_score': round(float(score), 3),
+                    **self._parse_class_name(self.idx_to_class[int(idx)])
+                }
+                for box, score, idx in zip(boxes, disease_score, top_class)
+            ],
+            'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+        }
+        return result
+
+
+def render_heatmap(image_path: str, result: Dict, output_path: str, alpha: float = 0.45):
+    """
+    Save the image with the tile disease heatmap overlaid (red = diseased)
+
+    Overlapping tiles are averaged per pixel.
+    """
+    image = load_image(image_path)
+    width, height = image.size
+    score = np.zeros((height, width), dtype=np.float32)
+    count = np.zeros((height, width), dtype=np.float32)
+    for tile in result['tiles']['boxes']:
+        left, top, right, bottom = tile['box']
+        score[top:bottom, left:right] += tile['disease_score']
+        count[top:bottom, left:right] += 1
+    score /= np.maximum(count, 1)
+
+    overlay = np.zeros((height, width, 3), dtype=np.uint8)
+    overlay[..., 0] = (score * 255).astype(np.uint8)
+    overlay[..., 1] = ((1 - score) * 160).astype(np.uint8)
+    Image.blend(image, Image.fromarray(overlay), alpha).save(output_path)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Tiled inference for wide field photos')
+    parser.add_argument('--image', type=str, required=True,
+                       help='Path to field image')
+    parser.add_argument('--model', type=str, default=None,
+                       help='Model file (default: registry active model)')
+    parser.add_argument('--tile-size', type=int, default=448,
+                       help='Window size in image pixels')
+    parser.add_argument('--stride', type=int, default=336,
+                       help='Window step in image pixels')
+    parser.add_argument('--max-batch', type=int, default=32,
+                       help='Maximum tiles per forward pass')
+    parser.add_argument('--heatmap-out', type=str, default=None,
+                       help='Optional path for a heatmap overlay image')
+
+    args = parser.parse_args()
+
+    from ml_model.registry import get_inference_model
+
+    tiled = TiledInference(get_inference_model(args.model), args.tile_size,
+                           args.stride, args.max_batch)
+    result = tiled.predict(args.image)
+
+    primary = result['primary_prediction']
+    tiles = result['tiles']
+    print(f"\n🌱 Verdict: {primary['plant']} - {primary['disease']} "
+          f"({primary['confidence']*100:.1f}%)")
+    print(f"🧩 {tiles['num_tiles']} tiles ({tiles['grid'][0]}x{tiles['grid'][1]}), "
+          f"{tiles['diseased_fraction']*100:.0f}% diseased, {tiles['latency_ms']:.0f} ms")
+    print("🗺️  Heatmap (disease probability per tile):")
+    for row in tiles['heatmap']:
+        print('   ' + ' '.join(f"{v:4.2f}" for v in row))
+
+    if args.heatmap_out:
+        render_heatmap(args.image, result, args.heatmap_out)
+        print(f"✅ Heatmap saved to: {args.heatmap_out}")
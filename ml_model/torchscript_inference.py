@@ -0,0 +1,131 @@
+"""
+TorchScript inference backend for the plant disease detection model
+Serves the traced FP32 and int8 (statically quantized) models written by
+ml_model/export.py; same interface as PlantDiseaseInference
+"""
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+# Allow running as a script (python ml_model/torchscript_inference.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.base_inference import BaseInference
+from ml_model.preprocessing import load_and_preprocess
+
+# Name of the JSON metadata stored inside the TorchScript archive
+METADATA_FILE = 'metadata.json'
+
+
+def save_torchscript(module: torch.jit.ScriptModule, output_path, metadata: Dict) -> Path:
+    """Save a scripted/traced module with checkpoint details (arch, temperature, ...)"""
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    torch.jit.save(module, str(output_path), _extra_files={METADATA_FILE: json.dumps(metadata)})
+    return output_path
+
+
+class PlantDiseaseInferenceTorchScript(BaseInference):
+    """Inference wrapper that runs an exported TorchScript model"""
+
+    backend = "torchscript"
+    supports_logits = True
+
+    def __init__(self, model_path: str, class_mapping_path: str = None,
+                 num_threads: Optional[int] = None):
+        """
+        Initialize TorchScript inference module
+
+        Args:
+            model_path: Path to exported model (.pt file)
+            class_mapping_path: Path to class mapping JSON file
+            num_threads: torch intra-op threads (default: unchanged)
+        """
+        # Load class mapping
+        self._load_class_mapping(model_path, class_mapping_path)
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
+        extra_files = {METADATA_FILE: ''}
+        self.model = torch.jit.load(str(model_path), map_location='cpu', _extra_files=extra_files)
+        self.model.eval()
+        metadata = json.loads(extra_files[METADATA_FILE] or '{}')
+        self.arch = metadata.get('arch', 'unknown')
+        self.precision = metadata.get('precision', 'fp32')
+        self.temperature = float(metadata.get('temperature', 1.0))
+        self.calibration = metadata.get('calibration')
+        # Quantized kernels must run on the engine they were converted for
+        engine = metadata.get('quantized_engine')
+        if engine and engine in torch.backends.quantized.supported_engines:
+            torch.backends.quantized.engine = engine
+        self.device = 'cpu'
+
+        print(f"✅ TorchScript model loaded successfully ({self.arch}, {self.precision})")
+        print(f"📊 Trained on {len(self.classes)} disease classes")
+
+    def predict_logits(self, batch: np.ndarray) -> np.ndarray:
+        """Uncalibrated logits for an NCHW float32 batch"""
+        with torch.no_grad():
+            return self.model(torch.from_numpy(batch)).float().numpy()
+
+    def _probabilities(self, batch: np.ndarray) -> np.ndarray:
+        """Run the model on an NCHW float32 batch and return probabilities"""
+        logits = torch.from_numpy(self.predict_logits(batch))
+        return torch.nn.functional.softmax(logits / self.temperature, dim=1).numpy()
+
+    def predict(self, image_path: str, top_k: int = 3) -> Dict:
+        """
+        Predict disease from plant image
+
+        Args:
+            image_path: Path to plant image
+            top_k: Number of top predictions to return
+
+        Returns:
+            Dictionary with prediction results
+        """
+        array, original_size = load_and_preprocess(image_path, self.image_size)
+        return self.predict_preprocessed(array[np.newaxis], [original_size], top_k)[0]
+
+    def batch_predict(self, image_paths: List[str], top_k: int = 3) -> List[Dict]:
+        """
+        Predict diseases for multiple images in a single forward pass
+
+        Args:
+            image_paths: List of image paths
+            top_k: Number of top predictions per image
+
+        Returns:
+            List of prediction dictionaries
+        """
+        return self._predict_paths(image_paths, top_k)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Test plant disease inference with TorchScript')
+    parser.add_argument('--image', type=str, required=True,
+                       help='Path to plant image')
+    parser.add_argument('--model', type=str, required=True,
+                       help='Path to exported TorchScript model (.pt)')
+    parser.add_argument('--top-k', type=int, default=3,
+                       help='Number of top predictions to show')
+
+    args = parser.parse_args()
+
+    model = PlantDiseaseInferenceTorchScript(args.model)
+    result = model.predict(args.image, args.top_k)
+
+    primary = result['primary_prediction']
+    print(f"\n🌱 Plant: {primary['plant']}")
+    print(f"🦠 Disease: {primary['disease']}")
+    print(f"📊 Confidence: {primary['confidence']*100:.2f}%")
+    print(f"⚠️  Severity: {primary['severity']}")
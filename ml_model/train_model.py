@@ -4,22 +4,60 @@ Uses CNN architecture trained on PlantVillage dataset
 """
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
-from torchvision import transforms, models
+from torch.utils.data import DataLoader, Dataset, Subset
+from torch.utils.data.distributed import DistributedSampler
+from torch.nn.parallel import DistributedDataParallel
+from torchvision import transforms
 from pathlib import Path
 import json
+import random
+import numpy as np
 from PIL import Image
 from tqdm import tqdm
 import os
+import sys
+import time
+
+# Allow running as a script (python ml_model/train_model.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.architectures import (
+    ARCHITECTURES, DEFAULT_ARCH, PlantDiseaseModel, load_checkpoint, load_checkpoint_model,
+    save_checkpoint
+)
+from ml_model.batch_augment import BatchAugment
+from ml_model.dataset_cache import MemmapImageDataset, ensure_cache
+from ml_model.dataset_manifest import is_image_file, load_manifest
+from ml_model.distributed import (
+    BACKEND, all_gather_objects, all_reduce_sum, barrier, broadcast_int, cleanup_distributed,
+    get_rank, get_world_size, init_distributed
+)
+from ml_model.preprocessing import IMAGE_SIZE, Uint8ImageLoader, normalize_batch
+from ml_model.progressive_resizing import ResolutionSchedule, TimeToAccuracyLog, resize_batch
+from ml_model.training_profiler import TrainingProfiler
 
 
 class PlantDiseaseDataset(Dataset):
     """Dataset loader for plant disease images"""
     
-    def __init__(self, root_dir, transform=None):
+    def __init__(self, root_dir, transform=None, loader=None, manifest_path=None):
         self.root_dir = Path(root_dir)
         self.transform = transform
+        # Optional callable(path) replacing PIL open + RGB convert
+        self.loader = loader
+        
+        # Prefer the manifest (dataset_manifest.py) over walking the directories
+        manifest = load_manifest(root_dir, manifest_path)
+        if manifest is not None:
+            self.classes = manifest.classes
+            self.class_to_idx = manifest.class_to_idx
+            self.samples = manifest.samples()
+            return
+        
         self.classes = sorted([d.name for d in self.root_dir.iterdir() if d.is_dir()])
         self.class_to_idx = {cls_name: i for i, cls_name in enumerate(self.classes)}
         
@@ -27,15 +65,19 @@ class PlantDiseaseDataset(Dataset):
         self.samples = []
         for class_name in self.classes:
             class_dir = self.root_dir / class_name
-            for img_path in class_dir.glob('*.jpg'):
-                self.samples.append((img_path, self.class_to_idx[class_name]))
+            for img_path in sorted(class_dir.iterdir()):
+                if is_image_file(img_path.name):
+                    self.samples.append((img_path, self.class_to_idx[class_name]))
     
     def __len__(self):
         return len(self.samples)
     
     def __getitem__(self, idx):
         img_path, label = self.samples[idx]
-        image = Image.open(img_path).convert('RGB')
+        if self.loader is not None:
+            image = self.loader(img_path)
+        else:
+            image = Image.open(img_path).convert('RGB')
         
         if self.transform:
             image = self.transform(image)
@@ -43,27 +85,65 @@ class PlantDiseaseDataset(Dataset):
         return image, label
 
 
-class PlantDiseaseModel(nn.Module):
-    """CNN model for plant disease classification"""
+class ResumableSampler(DistributedSampler):
+    """
+    DistributedSampler whose epoch order can resume mid-epoch
     
-    def __init__(self, num_classes, pretrained=True):
-        super(PlantDiseaseModel, self).__init__()
-        
-        # Use ResNet50 as backbone
-        self.backbone = models.resnet50(pretrained=pretrained)
-        
-        # Replace final layer for our number of classes
-        num_features = self.backbone.fc.in_features
-        self.backbone.fc = nn.Sequential(
-            nn.Dropout(0.5),
-            nn.Linear(num_features, 512),
-            nn.ReLU(),
-            nn.Dropout(0.3),
-            nn.Linear(512, num_classes)
-        )
+    The order is a function of (seed, epoch) and is split across ranks as
+    usual. A resumed run regenerates the interrupted epoch's permutation and
+    skips the samples this rank already trained on without loading them.
+    """
+    
+    def __init__(self, dataset, seed: int, num_replicas: int = 1, rank: int = 0):
+        super().__init__(dataset, num_replicas=num_replicas, rank=rank, shuffle=True, seed=seed)
+        self.start = 0
+    
+    def set_epoch(self, epoch: int, start: int = 0):
+        """Select the epoch's permutation and the number of samples to skip"""
+        super().set_epoch(epoch)
+        self.start = start
+    
+    def __iter__(self):
+        return iter(list(super().__iter__())[self.start:])
     
-    def forward(self, x):
-        return self.backbone(x)
+    def __len__(self):
+        return self.num_samples - self.start
+
+
+def capture_rng_state() -> dict:
+    """Python, NumPy and torch RNG states (tensors and plain types only, weights_only-safe)"""
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    state = {
+        'python': random.getstate(),
+        'numpy': (name, torch.from_numpy(keys.astype(np.int64)), pos, has_gauss, cached_gaussian),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state: dict):
+    """Inverse of capture_rng_state"""
+    random.setstate(state['python'])
+    name, keys, pos, has_gauss, cached_gaussian = state['numpy']
+    np.random.set_state((name, keys.numpy().astype(np.uint32), pos, has_gauss, cached_gaussian))
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def list_checkpoints(output_dir) -> list:
+    """Resumable checkpoints in output_dir, oldest first"""
+    return sorted(Path(output_dir).glob('checkpoint_epoch_*.pth'), key=lambda p: p.stat().st_mtime_ns)
+
+
+def prune_checkpoints(output_dir, keep: int):
+    """Delete all but the newest ``keep`` resumable checkpoints"""
+    if keep <= 0:
+        return
+    for stale in list_checkpoints(output_dir)[:-keep]:
+        stale.unlink(missing_ok=True)
 
 
 def get_transforms():
@@ -88,13 +168,77 @@ def get_transforms():
     return train_transform, val_transform
 
 
+def distillation_loss(student_logits, teacher_logits, labels,
+                      temperature: float = 4.0, alpha: float = 0.7):
+    """
+    Knowledge distillation loss (Hinton et al.)
+    
+    Blends KL divergence between temperature-softened teacher and student
+    distributions with the usual cross-entropy on hard labels.
+    
+    Args:
+        student_logits: Student model outputs
+        teacher_logits: Teacher model outputs for the same batch
+        labels: Ground truth labels
+        temperature: Softening temperature for both distributions
+        alpha: Weight of the soft-target term (1 - alpha goes to hard labels)
+    """
+    soft_loss = F.kl_div(
+        F.log_softmax(student_logits / temperature, dim=1),
+        F.softmax(teacher_logits / temperature, dim=1),
+        reduction='batchmean'
+    ) * (temperature ** 2)
+    hard_loss = F.cross_entropy(student_logits, labels)
+    return alpha * soft_loss + (1 - alpha) * hard_loss
+
+
+def load_teacher(teacher_path: str, classes, device) -> nn.Module:
+    """Load a trained checkpoint as a frozen teacher model"""
+    checkpoint = torch.load(teacher_path, map_location=device)
+    teacher_classes = checkpoint.get('classes')
+    if teacher_classes is not None and list(teacher_classes) != list(classes):
+        raise ValueError(
+            "Teacher was trained on different classes than the training data"
+        )
+    
+    teacher = load_checkpoint_model(checkpoint, len(classes)).to(device)
+    teacher.eval()
+    for param in teacher.parameters():
+        param.requires_grad = False
+    
+    print(f"Teacher: {checkpoint.get('arch', DEFAULT_ARCH)} from {teacher_path}")
+    return teacher
+
+
 def train_model(
     train_dir: str,
     val_dir: str,
     output_dir: str = "ml_model/checkpoints",
     num_epochs: int = 50,
     batch_size: int = 32,
-    learning_rate: float = 0.001
+    learning_rate: float = 0.001,
+    arch: str = DEFAULT_ARCH,
+    teacher_path: str = None,
+    distill_temperature: float = 4.0,
+    distill_alpha: float = 0.7,
+    calibrate: bool = True,
+    target_escalation_rate: float = 0.15,
+    cache_dir: str = None,
+    head_only: bool = False,
+    backbone_path: str = None,
+    resume: str = None,
+    seed: int = None,
+    checkpoint_every: int = 1,
+    checkpoint_steps: int = 0,
+    keep_checkpoints: int = 3,
+    max_steps: int = 0,
+    num_workers: int = None,
+    batch_augment: bool = False,
+    resolution_schedule: str = None,
+    export: bool = False,
+    train_manifest: str = None,
+    val_manifest: str = None,
+    manifest_path: str = None
 ):
     """
     Train plant disease detection model
@@ -106,81 +250,349 @@ def train_model(
         num_epochs: Number of training epochs
         batch_size: Batch size for training
         learning_rate: Learning rate for optimizer
+        arch: Backbone architecture name (see architectures.ARCHITECTURES)
+        teacher_path: Optional trained checkpoint to distill from. When set,
+            the model is trained as a student on the teacher's soft targets.
+        distill_temperature: Softening temperature for distillation
+        distill_alpha: Weight of the soft-target loss during distillation
+        calibrate: Fit a softmax temperature for the best model on the
+            validation set afterwards (see ml_model/calibration.py)
+        target_escalation_rate: Share of validation images the calibrated
+            escalation threshold sends to the cloud fallback
+        cache_dir: Optional directory for pre-decoded memory-mapped copies
+            of train_dir and val_dir (built on first use, see
+            ml_model/dataset_cache.py)
+        head_only: Freeze the backbone, cache its pooled features once and
+            train only the classification head on them (see
+            ml_model/head_training.py); minutes instead of days on CPU
+        backbone_path: Trained checkpoint whose backbone to reuse in
+            head-only mode (default: ImageNet weights for arch)
+        resume: Resumable checkpoint to continue from, or 'latest' for the
+            newest one in output_dir. Restores model, optimizer, scheduler,
+            RNG state, best accuracy and the position within the epoch
+            (bit-exact mid-epoch only when augmentation runs in this
+            process, i.e. batch_augment or num_workers=0).
+        seed: Seed for Python, NumPy and torch RNGs and the sample order
+        checkpoint_every: Save a resumable checkpoint every N epochs
+        checkpoint_steps: Also save one every N training batches (0 = off)
+        keep_checkpoints: Number of resumable checkpoints to keep
+        max_steps: Stop each epoch's training and validation after this many
+            batches (smoke tests and the scaling benchmark; 0 = full epochs)
+        num_workers: DataLoader worker processes per training process
+            (default: 4, fewer per process when data-parallel)
+        batch_augment: Augment whole batches with tensor ops after collation
+            (see ml_model/batch_augment.py) instead of per-image PIL
+            transforms in the workers, which then only decode and resize
+        resolution_schedule: Progressive-resolution phases such as
+            "128:10,176:5,224" (SIZE:EPOCHS, see
+            ml_model/progressive_resizing.py). Lower resolutions train with
+            proportionally larger batches (batch_size is the 224px batch)
+            so memory stays about constant; validation stays at 224px.
+    
+        export: Afterwards export the best model as FP32, TorchScript, int8
+            and ONNX, verified and benchmarked, into <output_dir>/export
+            (see ml_model/export.py)
+        train_manifest: Manifest selecting the training images instead of
+            the folder's own, e.g. the deduplicated manifest_dedup.npz
+            written by ml_model/dedup.py
+        val_manifest: Same for the validation images (drops images
+            leaked from train, so best_model.pth is chosen on unseen data);
+            calibration and export use it too
+        manifest_path: Registry manifest the exported variants are added to
+            (default: the one the registry reads, see ml_model/registry.py)
+    
+    Validation accuracy against wall-clock time is logged to
+    <output_dir>/time_to_accuracy.json after every epoch.
+    
+    Every step is timed (data wait, augment, forward, backward, optimizer) into
+    <output_dir>/timing/epoch_NNN.jsonl; the end-of-run summary recommends
+    num_workers / batch_size changes (see ml_model/training_profiler.py).
+    
+    Data-parallel training: launched with torchrun (or via spawn() from
+    ml_model/distributed.py) every process trains on its DistributedSampler
+    share with batch_size images per step, gradients are averaged by DDP,
+    metrics are all-reduced and only rank 0 writes checkpoints.
+    
+    Returns:
+        Dictionary with best_accuracy, images_per_sec (last epoch, all
+        processes) and world_size
     """
-    # Setup device
-    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    print(f"Using device: {device}")
+    # Join the process group when launched by torchrun or the built-in spawner
+    distributed = init_distributed()
+    rank, world_size = get_rank(), get_world_size()
+    is_main = rank == 0
+    log = print if is_main else (lambda *args, **kwargs: None)
+    
+    # Setup device (gloo data parallelism runs on CPU)
+    device = torch.device('cuda' if torch.cuda.is_available() and not distributed else 'cpu')
+    log(f"Using device: {device}" + (f" x {world_size} processes ({BACKEND})" if distributed else ""))
+    
+    if seed is not None:
+        # Offset by rank so dropout and augmentation differ between ranks
+        random.seed(seed + rank)
+        np.random.seed(seed + rank)
+        torch.manual_seed(seed + rank)
     
     # Create output directory
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
     
+    for manifest in (train_manifest, val_manifest):
+        # An explicit manifest must not silently fall back to the full folder
+        if manifest and not Path(manifest).exists():
+            raise FileNotFoundError(f"Dataset manifest not found: {manifest}")
+    
+    if head_only:
+        if teacher_path:
+            raise ValueError("Distillation is not supported in head-only mode")
+        if distributed:
+            raise ValueError("Head-only training runs in a single process")
+        if train_manifest or val_manifest:
+            raise ValueError("Dataset manifests are not supported in head-only mode")
+        from ml_model.head_training import train_head_only
+        train_head_only(train_dir, val_dir, output_path, arch, backbone_path,
+                        num_epochs, batch_size, learning_rate, cache_dir)
+        if calibrate:
+            from ml_model.calibration import calibrate_checkpoint
+            print("\n📐 Calibrating confidences on the validation set...")
+            calibrate_checkpoint(output_path / 'best_model.pth', val_dir,
+                                 target_escalation_rate, batch_size)
+        if export:
+            from ml_model.export import export_model
+            export_model(output_path / 'best_model.pth', val_dir, manifest_path=manifest_path)
+        return
+    
     # Load datasets
-    train_transform, val_transform = get_transforms()
-    train_dataset = PlantDiseaseDataset(train_dir, transform=train_transform)
-    val_dataset = PlantDiseaseDataset(val_dir, transform=val_transform)
+    # Validation uses the same uint8 fast path as inference: workers decode
+    # and resize, batches are normalized once after collation
+    # With batch_augment the train set also yields uint8 and is augmented per batch
+    train_transform = None if batch_augment else get_transforms()[0]
+    augment = BatchAugment() if batch_augment else None
+    if cache_dir:
+        # Images were decoded once into uint8 shards; no JPEG decoding per epoch
+        if is_main:
+            train_index = ensure_cache(train_dir, Path(cache_dir) / 'train', IMAGE_SIZE,
+                                       manifest_path=train_manifest)
+            ensure_cache(val_dir, Path(cache_dir) / 'val', IMAGE_SIZE, classes=train_index['classes'],
+                         manifest_path=val_manifest)
+        barrier()
+        train_dataset = MemmapImageDataset(Path(cache_dir) / 'train', transform=train_transform)
+        val_dataset = MemmapImageDataset(Path(cache_dir) / 'val')
+    else:
+        train_dataset = PlantDiseaseDataset(
+            train_dir, transform=train_transform,
+            loader=Uint8ImageLoader(IMAGE_SIZE) if batch_augment else None,
+            manifest_path=train_manifest
+        )
+        val_dataset = PlantDiseaseDataset(val_dir, loader=Uint8ImageLoader(IMAGE_SIZE),
+                                          manifest_path=val_manifest)
     
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, 
-                             shuffle=True, num_workers=4)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size, 
-                           shuffle=False, num_workers=4)
+    # Sample order is derived from (seed, epoch), shared by all ranks and split
+    # between them, so a resumed epoch can skip what was already trained on
+    sampler_seed = broadcast_int(seed if seed is not None else int(torch.randint(2**31, ()).item()))
+    train_sampler = ResumableSampler(train_dataset, sampler_seed, world_size, rank)
+    # Each rank validates a disjoint slice; metrics are summed over ranks
+    val_shard = Subset(val_dataset, range(rank, len(val_dataset), world_size)) if distributed else val_dataset
+    # With several ranks per machine leave most cores to their compute threads
+    if num_workers is None:
+        num_workers = 4 if not distributed else max(1, min(4, (os.cpu_count() or 1) // (2 * world_size)))
+    # The training loader is built per epoch: the batch size follows the schedule
+    schedule = (ResolutionSchedule.from_string(resolution_schedule, num_epochs, batch_size)
+                if resolution_schedule else ResolutionSchedule.constant(num_epochs, batch_size))
+    val_loader = DataLoader(val_shard, batch_size=batch_size, 
+                           shuffle=False, num_workers=num_workers)
     
     # Save class mapping
-    class_mapping = {
-        'classes': train_dataset.classes,
-        'class_to_idx': train_dataset.class_to_idx
-    }
-    with open(output_path / 'class_mapping.json', 'w') as f:
-        json.dump(class_mapping, f, indent=2)
+    if is_main:
+        class_mapping = {
+            'classes': train_dataset.classes,
+            'class_to_idx': train_dataset.class_to_idx
+        }
+        with open(output_path / 'class_mapping.json', 'w') as f:
+            json.dump(class_mapping, f, indent=2)
     
-    print(f"Training on {len(train_dataset)} images")
-    print(f"Validating on {len(val_dataset)} images")
-    print(f"Number of classes: {len(train_dataset.classes)}")
+    log(f"Training on {len(train_dataset)} images")
+    log(f"Validating on {len(val_dataset)} images")
+    log(f"Number of classes: {len(train_dataset.classes)}")
+    if resolution_schedule:
+        log(f"Resolution schedule: {schedule.describe()}")
     
     # Initialize model
-    model = PlantDiseaseModel(num_classes=len(train_dataset.classes))
+    model = PlantDiseaseModel(num_classes=len(train_dataset.classes), arch=arch)
+    log(f"Architecture: {arch}")
     model = model.to(device)
+    # DDP broadcasts rank 0's initial weights and averages gradients in backward
+    train_module = DistributedDataParallel(model) if distributed else model
+    
+    # Optional teacher for knowledge distillation
+    teacher = None
+    if teacher_path:
+        teacher = load_teacher(teacher_path, train_dataset.classes, device)
     
     # Loss and optimizer
     criterion = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=learning_rate)
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(
-        optimizer, mode='max', factor=0.5, patience=5, verbose=True
+        optimizer, mode='max', factor=0.5, patience=5
     )
     
     # Training loop
     best_accuracy = 0.0
+    start_epoch = 0
+    start_position = 0
+    running = (0.0, 0, 0)
+    images_per_sec = 0.0
+    profiler = TrainingProfiler(
+        output_path / 'timing' if is_main else None, num_workers, batch_size, world_size,
+        uses_cache=bool(cache_dir), batch_augment=batch_augment, sync=torch.cuda.synchronize if device.type == 'cuda' else None
+    )
+    curve = TimeToAccuracyLog(output_path / 'time_to_accuracy.json' if is_main else None, schedule)
+    
+    def save_training_state(epoch, next_epoch, position, running, accuracy, rng_states, filename):
+        """
+        Resumable checkpoint; next_epoch/position say where training continues
+        
+        rng_states holds every rank's capture_rng_state(), indexed by rank.
+        """
+        save_checkpoint({
+            'epoch': epoch,
+            'model_state_dict': model.state_dict(),
+            'optimizer_state_dict': optimizer.state_dict(),
+            'accuracy': accuracy,
+            'classes': train_dataset.classes,
+            'arch': arch,
+            'resume': {
+                'epoch': next_epoch,
+                'position': position,
+                'running': running,
+                'scheduler_state_dict': scheduler.state_dict(),
+                'best_accuracy': best_accuracy,
+                'sampler_seed': train_sampler.seed,
+                'world_size': world_size,
+                # Rank 0's state under 'rng' keeps older readers working
+                'rng': rng_states[0],
+                'rank_rng': rng_states,
+                'time_to_accuracy': curve.records,
+            },
+        }, output_path / filename)
+        prune_checkpoints(output_path, keep_checkpoints)
+    
+    if resume:
+        resume_path = list_checkpoints(output_path)[-1:] if resume == 'latest' else [Path(resume)]
+        if not resume_path:
+            log(f"⚠️ No checkpoint to resume in {output_path}; starting from scratch")
+        else:
+            resume_path = resume_path[0]
+            checkpoint = load_checkpoint(resume_path, device, mmap=False)
+            if checkpoint.get('arch', DEFAULT_ARCH) != arch:
+                raise ValueError(f"Checkpoint {resume_path} is {checkpoint.get('arch', DEFAULT_ARCH)}, not {arch}")
+            if checkpoint.get('classes', train_dataset.classes) != train_dataset.classes:
+                raise ValueError(f"Checkpoint {resume_path} was trained on different classes")
+            model.load_state_dict(checkpoint['model_state_dict'])
+            optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+            state = checkpoint.get('resume')
+            if state is None:
+                # Older checkpoints only hold weights and optimizer state
+                start_epoch = checkpoint['epoch'] + 1
+            else:
+                scheduler.load_state_dict(state['scheduler_state_dict'])
+                best_accuracy = state['best_accuracy']
+                train_sampler.seed = state['sampler_seed']
+                start_epoch = state['epoch']
+                # The position is per rank; mid-epoch it only carries over
+                # when the number of processes is unchanged
+                if state['position'] and state.get('world_size', 1) != world_size:
+                    log("⚠️ Process count changed; restarting the interrupted epoch")
+                else:
+                    start_position = state['position']
+                    # Running totals were summed over ranks; rank 0 carries them
+                    if is_main:
+                        running = tuple(state['running'])
+                # Each rank continues its own RNG streams (augmentation, dropout)
+                rank_rng = state.get('rank_rng')
+                if rank_rng and len(rank_rng) == world_size:
+                    restore_rng_state(rank_rng[rank])
+                elif is_main:
+                    restore_rng_state(state['rng'])
+                curve.records = list(state.get('time_to_accuracy', []))
+            log(f"🔁 Resumed from {resume_path}: epoch {start_epoch+1}, "
+                f"{start_position * world_size} samples into the epoch, best accuracy {best_accuracy:.2f}%")
     
-    for epoch in range(num_epochs):
-        print(f"\nEpoch {epoch+1}/{num_epochs}")
-        print("-" * 50)
+    for epoch in range(start_epoch, num_epochs):
+        phase = schedule.phase(epoch)
+        log(f"\nEpoch {epoch+1}/{num_epochs}"
+            + (f" ({phase.size}px, batch {phase.batch_size})" if resolution_schedule else ""))
+        log("-" * 50)
+        epoch_start = time.perf_counter()
         
-        # Training phase
+        # Training phase (a resumed epoch continues its running totals)
         model.train()
-        train_loss = 0.0
-        train_correct = 0
-        train_total = 0
+        position = start_position if epoch == start_epoch else 0
+        train_sampler.set_epoch(epoch, position)
+        # Running loss is summed per sample (batch-mean loss x batch size)
+        train_loss, train_correct, train_total = running if epoch == start_epoch else (0.0, 0, 0)
+        profiler.begin_epoch(epoch)
         
-        train_pbar = tqdm(train_loader, desc="Training")
-        for images, labels in train_pbar:
+        # Worker seeds come from a per-epoch generator: drawing them from the
+        # global torch RNG would move it past the state a resume restores
+        loader_generator = torch.Generator().manual_seed(train_sampler.seed + epoch)
+        train_loader = DataLoader(train_dataset, batch_size=phase.batch_size,
+                                  sampler=train_sampler, num_workers=num_workers,
+                                  generator=loader_generator)
+        train_pbar = tqdm(train_loader, desc="Training", disable=not is_main)
+        for step, (images, labels) in enumerate(train_pbar, 1):
             images, labels = images.to(device), labels.to(device)
+            profiler.lap('data_wait')
+            if augment is not None:
+                images = augment(images)
+            if phase.size != IMAGE_SIZE:
+                images = resize_batch(images, phase.size)
+            if augment is not None or phase.size != IMAGE_SIZE:
+                profiler.lap('augment')
             
             optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, labels)
+            outputs = train_module(images)
+            if teacher is not None:
+                with torch.no_grad():
+                    teacher_outputs = teacher(images)
+                loss = distillation_loss(outputs, teacher_outputs, labels,
+                                         distill_temperature, distill_alpha)
+            else:
+                loss = criterion(outputs, labels)
+            profiler.lap('forward')
             loss.backward()
+            profiler.lap('backward')
             optimizer.step()
+            profiler.lap('optimizer')
             
-            train_loss += loss.item()
+            train_loss += loss.item() * labels.size(0)
             _, predicted = outputs.max(1)
             train_total += labels.size(0)
             train_correct += predicted.eq(labels).sum().item()
+            position += labels.size(0)
             
             train_pbar.set_postfix({
                 'loss': f'{train_loss/train_total:.4f}',
                 'acc': f'{100.*train_correct/train_total:.2f}%'
             })
+            
+            if checkpoint_steps and step % checkpoint_steps == 0 and position < train_sampler.num_samples:
+                # Every rank reaches this step together; totals are summed for the checkpoint
+                totals = tuple(all_reduce_sum(train_loss, train_correct, train_total))
+                rng_states = all_gather_objects(capture_rng_state())
+                if is_main:
+                    save_training_state(epoch, epoch, position, totals, None, rng_states,
+                                        f'checkpoint_epoch_{epoch+1}_step_{position // phase.batch_size}.pth')
+            
+            profiler.end_step(labels.size(0))
+            if max_steps and step >= max_steps:
+                break
         
+        # Throughput excludes the first step (DataLoader worker start-up)
+        timing = profiler.end_epoch()
+        steady_images, train_loss, train_correct, train_total = all_reduce_sum(
+            timing['steady_images'], train_loss, train_correct, train_total)
+        images_per_sec = steady_images / timing['steady_seconds'] if timing['steady_seconds'] else 0.0
         train_accuracy = 100. * train_correct / train_total
         
         # Validation phase
@@ -190,14 +602,15 @@ def train_model(
         val_total = 0
         
         with torch.no_grad():
-            val_pbar = tqdm(val_loader, desc="Validation")
-            for images, labels in val_pbar:
+            val_pbar = tqdm(val_loader, desc="Validation", disable=not is_main)
+            for step, (images, labels) in enumerate(val_pbar, 1):
+                images = torch.from_numpy(normalize_batch(images.numpy()))
                 images, labels = images.to(device), labels.to(device)
                 
                 outputs = model(images)
                 loss = criterion(outputs, labels)
                 
-                val_loss += loss.item()
+                val_loss += loss.item() * labels.size(0)
                 _, predicted = outputs.max(1)
                 val_total += labels.size(0)
                 val_correct += predicted.eq(labels).sum().item()
@@ -206,38 +619,75 @@ def train_model(
                     'loss': f'{val_loss/val_total:.4f}',
                     'acc': f'{100.*val_correct/val_total:.2f}%'
                 })
+                
+                if max_steps and step >= max_steps:
+                    break
         
+        val_loss, val_correct, val_total = all_reduce_sum(val_loss, val_correct, val_total)
         val_accuracy = 100. * val_correct / val_total
         
-        print(f"\nTrain Loss: {train_loss/train_total:.4f} | Train Acc: {train_accuracy:.2f}%")
-        print(f"Val Loss: {val_loss/val_total:.4f} | Val Acc: {val_accuracy:.2f}%")
+        log(f"\nTrain Loss: {train_loss/train_total:.4f} | Train Acc: {train_accuracy:.2f}%")
+        log(f"Val Loss: {val_loss/val_total:.4f} | Val Acc: {val_accuracy:.2f}%")
+        log(f"📈 Throughput: {images_per_sec:.1f} images/s"
+            + (f" across {world_size} processes" if distributed else "")
+            + f" | data wait {timing['phase_fraction']['data_wait']*100:.0f}% of step time"
+            + (f" | peak RSS {timing['peak_rss_mb']:.0f} MB" if timing['peak_rss_mb'] else ""))
         
-        # Learning rate scheduling
+        # Learning rate scheduling (identical on every rank: metrics are global)
         scheduler.step(val_accuracy)
         
         # Save best model
         if val_accuracy > best_accuracy:
             best_accuracy = val_accuracy
-            torch.save({
-                'epoch': epoch,
-                'model_state_dict': model.state_dict(),
-                'optimizer_state_dict': optimizer.state_dict(),
-                'accuracy': val_accuracy,
-                'classes': train_dataset.classes
-            }, output_path / 'best_model.pth')
-            print(f"✅ Saved best model with accuracy: {val_accuracy:.2f}%")
+            if is_main:
+                save_checkpoint({
+                    'epoch': epoch,
+                    'model_state_dict': model.state_dict(),
+                    'optimizer_state_dict': optimizer.state_dict(),
+                    'accuracy': val_accuracy,
+                    'classes': train_dataset.classes,
+                    'arch': arch,
+                    'teacher': str(teacher_path) if teacher_path else None
+                }, output_path / 'best_model.pth')
+                print(f"✅ Saved best model with accuracy: {val_accuracy:.2f}%")
         
-        # Save checkpoint every 5 epochs
-        if (epoch + 1) % 5 == 0:
-            torch.save({
-                'epoch': epoch,
-                'model_state_dict': model.state_dict(),
-                'optimizer_state_dict': optimizer.state_dict(),
-                'accuracy': val_accuracy,
-            }, output_path / f'checkpoint_epoch_{epoch+1}.pth')
-    
-    print(f"\n🎉 Training complete! Best validation accuracy: {best_accuracy:.2f}%")
-
+        # Time-to-accuracy curve (wall clock of training and validation)
+        curve.record(epoch, time.perf_counter() - epoch_start, val_accuracy, best_accuracy)
+        
+        # Resumable checkpoint (only the newest keep_checkpoints are kept)
+        if checkpoint_every and (epoch + 1) % checkpoint_every == 0:
+            rng_states = all_gather_objects(capture_rng_state())
+            if is_main:
+                save_training_state(epoch, epoch + 1, 0, (0.0, 0, 0), val_accuracy, rng_states,
+                                    f'checkpoint_epoch_{epoch+1}.pth')
+    
+    log(f"\n🎉 Training complete! Best validation accuracy: {best_accuracy:.2f}%")
+    if is_main:
+        profiler.write_summary()
+        time_to_best = curve.time_to(round(best_accuracy, 4))
+        if time_to_best is not None:
+            print(f"⏱️  Best accuracy reached after {time_to_best:.0f}s of training "
+                  f"(curve: {output_path / 'time_to_accuracy.json'})")
+    
+    if distributed:
+        cleanup_distributed()
+    
+    if is_main and calibrate and (output_path / 'best_model.pth').exists():
+        from ml_model.calibration import calibrate_checkpoint
+        print("\n📐 Calibrating confidences on the validation set...")
+        calibrate_checkpoint(output_path / 'best_model.pth', val_dir,
+                             target_escalation_rate, batch_size, val_manifest=val_manifest)
+    
+    if is_main and export and (output_path / 'best_model.pth').exists():
+        from ml_model.export import export_model
+        export_model(output_path / 'best_model.pth', val_dir, manifest_path=manifest_path,
+                     val_manifest=val_manifest)
+    
+    return {
+        'best_accuracy': best_accuracy,
+        'images_per_sec': images_per_sec,
+        'world_size': world_size,
+    }
 
 if __name__ == '__main__':
     import argparse
@@ -255,14 +705,106 @@ if __name__ == '__main__':
                        help='Batch size for training')
     parser.add_argument('--lr', type=float, default=0.001,
                        help='Learning rate')
+    parser.add_argument('--arch', type=str, default=DEFAULT_ARCH,
+                       choices=sorted(ARCHITECTURES),
+                       help='Backbone architecture')
+    parser.add_argument('--teacher', type=str, default=None,
+                       help='Checkpoint to distill from (e.g. a ResNet50 best_model.pth)')
+    parser.add_argument('--distill-temperature', type=float, default=4.0,
+                       help='Distillation softening temperature')
+    parser.add_argument('--distill-alpha', type=float, default=0.7,
+                       help='Weight of the soft-target loss when distilling')
+    
+    parser.add_argument('--cache-dir', type=str, default=None,
+                       help='Pre-decoded memory-mapped dataset cache (built on first use)')
+    parser.add_argument('--no-calibrate', action='store_true',
+                       help='Skip temperature scaling of the best model')
+    parser.add_argument('--target-escalation-rate', type=float, default=0.15,
+                       help='Share of validation images the hybrid agent should send to the cloud')
+    parser.add_argument('--head-only', action='store_true',
+                       help='Train only the head on cached frozen-backbone features')
+    parser.add_argument('--backbone', type=str, default=None,
+                       help='Checkpoint whose backbone to reuse with --head-only (default: ImageNet weights)')
+    parser.add_argument('--resume', type=str, nargs='?', const='latest', default=None,
+                       help='Continue from a checkpoint (default: newest in --output-dir)')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='Random seed for reproducible runs')
+    parser.add_argument('--checkpoint-every', type=int, default=1,
+                       help='Save a resumable checkpoint every N epochs')
+    parser.add_argument('--checkpoint-steps', type=int, default=0,
+                       help='Also save a resumable checkpoint every N batches (0 = off)')
+    parser.add_argument('--keep-checkpoints', type=int, default=3,
+                       help='Number of resumable checkpoints to keep')
+    parser.add_argument('--num-workers', type=int, default=None,
+                       help='DataLoader workers per process (default: 4; see the timing summary)')
+    parser.add_argument('--batch-augment', action='store_true',
+                       help='Augment whole batches with tensor ops instead of per-image PIL transforms')
+    parser.add_argument('--resolution-schedule', type=str, default=None,
+                       help='Progressive resolution as SIZE:EPOCHS phases, e.g. "128:10,176:5,224" '
+                            '(batch size scales up at lower sizes)')
+    parser.add_argument('--export', action='store_true',
+                       help='Export, verify and benchmark FP32/TorchScript/int8/ONNX variants after training')
+    parser.add_argument('--manifest', type=str, default=None,
+                       help='Registry manifest for --export (default: MODEL_MANIFEST_PATH or '
+                            'ml_model/checkpoints/manifest.json)')
+    parser.add_argument('--train-manifest', type=str, default=None,
+                       help='Manifest selecting the training images (e.g. manifest_dedup.npz from dedup.py)')
+    parser.add_argument('--val-manifest', type=str, default=None,
+                       help='Manifest selecting the validation images (e.g. manifest_dedup.npz from dedup.py)')
+    parser.add_argument('--nproc', type=int, default=1,
+                       help='Data-parallel processes to spawn on this machine (gloo); '
+                            'not needed under torchrun')
+    parser.add_argument('--scaling-benchmark', type=int, nargs='+', default=None,
+                       help='Measure training throughput at these process counts (e.g. 1 2 4 8) and exit')
+    parser.add_argument('--benchmark-steps', type=int, default=20,
+                       help='Training batches per process count in the scaling benchmark')
     
     args = parser.parse_args()
     
-    train_model(
+    train_kwargs = dict(
         train_dir=args.train_dir,
         val_dir=args.val_dir,
         output_dir=args.output_dir,
         num_epochs=args.epochs,
         batch_size=args.batch_size,
-        learning_rate=args.lr
+        learning_rate=args.lr,
+        arch=args.arch,
+        teacher_path=args.teacher,
+        distill_temperature=args.distill_temperature,
+        distill_alpha=args.distill_alpha,
+        calibrate=not args.no_calibrate,
+        target_escalation_rate=args.target_escalation_rate,
+        cache_dir=args.cache_dir,
+        head_only=args.head_only,
+        backbone_path=args.backbone,
+        resume=args.resume,
+        seed=args.seed,
+        checkpoint_every=args.checkpoint_every,
+        checkpoint_steps=args.checkpoint_steps,
+        keep_checkpoints=args.keep_checkpoints,
+        num_workers=args.num_workers,
+        batch_augment=args.batch_augment,
+        resolution_schedule=args.resolution_schedule,
+        export=args.export,
+        train_manifest=args.train_manifest,
+        val_manifest=args.val_manifest,
+        manifest_path=args.manifest
     )
+    
+    if args.scaling_benchmark:
+        from ml_model.distributed import print_scaling_report, scaling_benchmark
+        benchmark_dir = Path(args.output_dir) / 'scaling_benchmark'
+        results = scaling_benchmark(train_model, args.scaling_benchmark, **{
+            **train_kwargs, 'output_dir': str(benchmark_dir), 'num_epochs': 1,
+            'max_steps': args.benchmark_steps, 'calibrate': False, 'resume': None,
+            'checkpoint_every': 0, 'checkpoint_steps': 0, 'export': False,
+        })
+        print_scaling_report(results)
+        with open(benchmark_dir / 'scaling_report.json', 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Scaling report saved to: {benchmark_dir / 'scaling_report.json'}")
+    elif args.nproc > 1:
+        from ml_model.distributed import spawn
+        spawn(train_model, args.nproc, **train_kwargs)
+    else:
+        train_model(**train_kwargs)
@@ -0,0 +1,208 @@
+"""
+Per-step training timing: data-loader wait vs. compute
+Every step is split into data_wait (blocked on the DataLoader), augment
+(batch-level augmentation and resizing, if enabled), forward, backward,
+optimizer and other (metrics, logging, checkpoints). Steps are
+written as JSONL, one file per epoch ending with an epoch summary, and the
+end-of-run summary recommends num_workers / batch_size changes
+"""
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from ml_model.resource_usage import get_memory_usage
+
+PHASES = ('data_wait', 'augment', 'forward', 'backward', 'optimizer', 'other')
+
+# Share of step time spent waiting for data above which training is input-bound
+INPUT_BOUND_FRACTION = 0.25
+# Below this the loader is comfortably ahead of compute
+COMPUTE_BOUND_FRACTION = 0.05
+
+
+def total_memory_mb() -> Optional[float]:
+    """Physical memory of the machine in MB, None if unknown"""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / 1024 / 1024
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class TrainingProfiler:
+    """
+    Times the phases of every training step
+
+    Usage inside the loop: ``lap('data_wait')`` when the batch arrives,
+    ``lap('forward')`` / ``lap('backward')`` / ``lap('optimizer')`` after
+    each phase and ``end_step(batch_images)`` at the end of the iteration.
+    """
+
+    def __init__(self, log_dir: Optional[str], num_workers: int, batch_size: int,
+                 world_size: int = 1, uses_cache: bool = False, batch_augment: bool = False,
+                 sync: Optional[Callable[[], None]] = None):
+        """
+        Initialize profiler
+
+        Args:
+            log_dir: Directory for epoch_NNN.jsonl and summary.json (None:
+                time without writing, e.g. on non-zero ranks)
+            num_workers: DataLoader workers of this run (for recommendations)
+            batch_size: Images per step and process
+            world_size: Data-parallel processes
+            uses_cache: Whether images come from the memory-mapped cache
+            batch_augment: Whether augmentation runs per batch (BatchAugment)
+            sync: Called before each lap (torch.cuda.synchronize on GPU, so
+                asynchronous kernels are attributed to the right phase)
+        """
+        self.log_dir = Path(log_dir) if log_dir else None
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.world_size = world_size
+        self.uses_cache = uses_cache
+        self.batch_augment = batch_augment
+        self.sync = sync
+        self.epochs: List[Dict] = []
+        self._file = None
+        if self.log_dir:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+
+    def begin_epoch(self, epoch: int):
+        self.epoch = epoch
+        self.step = 0
+        self.images = 0
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self._phases = {}
+        self._steady_images = 0
+        self._steady_start = None
+        if self.log_dir:
+            self._file = open(self.log_dir / f'epoch_{epoch + 1:03d}.jsonl', 'w')
+        self._last = time.perf_counter()
+
+    def lap(self, phase: str):
+        """Attribute the time since the previous lap to phase"""
+        if self.sync is not None:
+            self.sync()
+        now = time.perf_counter()
+        self._phases[phase] = self._phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def end_step(self, images: int):
+        """Close the step and write its record"""
+        self.lap('other')
+        self.step += 1
+        self.images += images
+        for phase in PHASES:
+            self.totals[phase] += self._phases.get(phase, 0.0)
+        # The first step includes DataLoader worker start-up
+        if self._steady_start is None:
+            self._steady_start = self._last
+        else:
+            self._steady_images += images
+        if self._file:
+            record = {'type': 'step', 'epoch': self.epoch + 1, 'step': self.step, 'images': images}
+            record.update({f'{phase}_s': round(self._phases.get(phase, 0.0), 6) for phase in PHASES})
+            record['step_s'] = round(sum(self._phases.values()), 6)
+            self._file.write(json.dumps(record) + '\n')
+        self._phases = {}
+
+    def end_epoch(self) -> Dict:
+        """Epoch summary (also written as the last line of the epoch's JSONL)"""
+        total = sum(self.totals.values())
+        steady_seconds = self._last - self._steady_start if self._steady_start else 0.0
+        summary = {
+            'type': 'epoch',
+            'epoch': self.epoch + 1,
+            'steps': self.step,
+            'images': self.images,
+            'seconds': round(total, 3),
+            # Per process; train_model reports the all-reduced total
+            'images_per_sec': round(self._steady_images / steady_seconds, 2) if steady_seconds else None,
+            'steady_images': self._steady_images,
+            'steady_seconds': round(steady_seconds, 3),
+            'phase_seconds': {phase: round(value, 3) for phase, value in self.totals.items()},
+            'phase_fraction': {phase: round(value / total, 4) if total else 0.0
+                               for phase, value in self.totals.items()},
+            'peak_rss_mb': get_memory_usage()['peak_rss_mb'],
+        }
+        if self._file:
+            self._file.write(json.dumps(summary) + '\n')
+            self._file.close()
+            self._file = None
+        self.epochs.append(summary)
+        return summary
+
+    def recommendations(self) -> List[str]:
+        """num_workers / batch_size advice from the measured epochs"""
+        if not self.epochs:
+            return []
+        phases = {phase: sum(e['phase_seconds'][phase] for e in self.epochs) for phase in PHASES}
+        total = sum(phases.values()) or 1.0
+        wait = phases['data_wait'] / total
+        cpus = os.cpu_count() or 1
+        cores_per_process = max(1, cpus // self.world_size)
+        advice = []
+
+        if wait > INPUT_BOUND_FRACTION:
+            message = f"Input-bound: {wait * 100:.0f}% of step time waits for data."
+            if self.num_workers < cores_per_process:
+                suggested = min(cores_per_process, max(self.num_workers * 2, self.num_workers + 2))
+                message += f" Try --num-workers {suggested}."
+            if not self.uses_cache:
+                message += " --cache-dir removes JPEG decoding from every epoch."
+            if not self.batch_augment:
+                message += " --batch-augment moves the per-image augmentation out of the workers."
+            advice.append(message)
+        elif wait < COMPUTE_BOUND_FRACTION and self.num_workers > 2:
+            suggested = max(2, self.num_workers // 2)
+            advice.append(
+                f"Compute-bound: only {wait * 100:.1f}% of step time waits for data. "
+                f"--num-workers {suggested} would leave more cores to the compute threads."
+            )
+
+        peak = max((e['peak_rss_mb'] or 0) for e in self.epochs)
+        memory = total_memory_mb()
+        if memory and peak * self.world_size > 0.8 * memory:
+            advice.append(
+                f"Memory: peak RSS {peak:.0f} MB per process is close to the machine's "
+                f"{memory:.0f} MB. Try --batch-size {max(1, self.batch_size // 2)}."
+            )
+        elif memory and wait < INPUT_BOUND_FRACTION and peak * self.world_size < 0.4 * memory:
+            advice.append(
+                f"Memory headroom: peak RSS {peak:.0f} MB of {memory:.0f} MB. "
+                f"--batch-size {self.batch_size * 2} may raise throughput "
+                f"(scale --lr with it)."
+            )
+
+        if phases['optimizer'] / total > 0.2:
+            advice.append(
+                f"The optimizer step takes {phases['optimizer'] / total * 100:.0f}% of step time; "
+                f"larger batches amortize it over more images."
+            )
+        if not advice:
+            advice.append("Balanced: data loading keeps up without idle workers; no change needed.")
+        return advice
+
+    def write_summary(self) -> Dict:
+        """Print and save the run summary with recommendations"""
+        summary = {
+            'num_workers': self.num_workers,
+            'batch_size': self.batch_size,
+            'world_size': self.world_size,
+            'epochs': self.epochs,
+            'recommendations': self.recommendations(),
+        }
+        if self.epochs:
+            last = self.epochs[-1]
+            fractions = ', '.join(f"{phase} {value * 100:.0f}%"
+                                  for phase, value in last['phase_fraction'].items())
+            print(f"\n⏱️  Step time (last epoch): {fractions}; peak RSS {last['peak_rss_mb'] or 0:.0f} MB")
+        print("🧭 Recommendations:")
+        for message in summary['recommendations']:
+            print(f"   - {message}")
+        if self.log_dir:
+            with open(self.log_dir / 'summary.json', 'w') as f:
+                json.dump(summary, f, indent=2)
+            print(f"✅ Step timing saved to: {self.log_dir}")
+        return summary
@@ -0,0 +1,353 @@
+"""
+Field video scanning: walk-through video of a plot -> per-plot disease summary
+Frames are decoded as a stream, near-duplicate and blurry frames are skipped,
+and the rest go through the local model in fixed-size batches, so memory
+stays bounded regardless of video length
+"""
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Allow running as a script (python ml_model/video_scan.py)
+parent_dir = str(Path(__file__).resolve().parent.parent)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+
+from ml_model.preprocessing import normalize_batch
+
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi', 'mkv', '3gp', 'webm'}
+
+
+def _import_cv2():
+    try:
+        import cv2
+    except ImportError as e:
+        raise ImportError(
+            "OpenCV is required for video scanning. "
+            "Install with: pip install opencv-python-headless"
+        ) from e
+    return cv2
+
+
+def video_duration(video_path: str) -> Optional[float]:
+    """Duration in seconds from the container metadata, or None if unknown"""
+    cv2 = _import_cv2()
+    capture = cv2.VideoCapture(str(video_path))
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"Could not open video: {video_path}")
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        frames = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+    finally:
+        capture.release()
+    if not fps or not frames or frames < 0:
+        return None
+    return frames / fps
+
+
+def iter_sampled_frames(video_path: str, sample_fps: float = 3.0
+                        ) -> Iterator[Tuple[int, float, np.ndarray]]:
+    """
+    Stream frames from a video at roughly ``sample_fps``
+
+    Frames between samples are grabbed but not decoded into images, and only
+    one frame is held in memory at a time.
+
+    Yields:
+        Tuples of (frame index, timestamp in seconds, BGR uint8 frame)
+    """
+    cv2 = _import_cv2()
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, round(fps / sample_fps))
+    index = 0
+    try:
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index, index / fps, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+class FrameSelector:
+    """
+    Cheap per-frame quality gate
+
+    Sharpness is the variance of the Laplacian of a small grayscale
+    thumbnail; a frame is blurry if it is below ``min_sharpness`` or below
+    ``blur_ratio`` times the median sharpness of the last ``window`` sampled
+    frames (accepted or not, so one very sharp frame cannot raise the bar for
+    the rest of the video). A frame is a near-duplicate if its mean absolute
+    difference from the last accepted thumbnail is below ``min_difference``
+    grey levels.
+    """
+
+    def __init__(self, min_sharpness: float = 20.0, blur_ratio: float = 0.5,
+                 min_difference: float = 6.0, thumbnail_width: int = 160,
+                 window: int = 15):
+        self.min_sharpness = min_sharpness
+        self.blur_ratio = blur_ratio
+        self.min_difference = min_difference
+        self.thumbnail_width = thumbnail_width
+        self._cv2 = _import_cv2()
+        self._last_thumbnail: Optional[np.ndarray] = None
+        self._recent_sharpness = deque(maxlen=window)
+
+    def check(self, frame: np.ndarray) -> str:
+        """
+        Classify a BGR frame
+
+        Returns:
+            'keep', 'blurry' or 'duplicate'
+        """
+        cv2 = self._cv2
+        height, width = frame.shape[:2]
+        thumb_height = max(1, round(height * self.thumbnail_width / width))
+        gray = cv2.cvtColor(
+            cv2.resize(frame, (self.thumbnail_width, thumb_height), interpolation=cv2.INTER_AREA),
+            cv2.COLOR_BGR2GRAY
+        )
+
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_32F).var())
+        baseline = float(np.median(self._recent_sharpness)) if self._recent_sharpness else None
+        self._recent_sharpness.append(sharpness)
+        if sharpness < self.min_sharpness or (
+                baseline is not None and sharpness < self.blur_ratio * baseline):
+            return 'blurry'
+
+        thumbnail = gray.astype(np.int16)
+        if self._last_thumbnail is not None:
+            difference = float(np.abs(thumbnail - self._last_thumbnail).mean())
+            if difference < self.min_difference:
+                return 'duplicate'
+
+        self._last_thumbnail = thumbnail
+        return 'keep'
+
+
+class _PlotSummary:
+    """Running per-class statistics; constant memory in the number of frames"""
+
+    def __init__(self, model, min_confidence: float):
+        self.model = model
+        self.min_confidence = min_confidence
+        num_classes = len(model.classes)
+        self.votes = np.zeros(num_classes, dtype=np.int64)
+        self.confidence_sum = np.zeros(num_classes, dtype=np.float64)
+        self.peak = np.zeros(num_classes, dtype=np.float64)
+        self.peak_time = np.zeros(num_classes, dtype=np.float64)
+        self.uncertain = 0
+
+    def update(self, probabilities: np.ndarray, timestamps: List[float]):
+        top = probabilities.argmax(axis=1)
+        confidence = probabilities[np.arange(len(top)), top]
+        for idx, conf, timestamp in zip(top, confidence, timestamps):
+            if conf < self.min_confidence:
+                self.uncertain += 1
+                continue
+            self.votes[idx] += 1
+            self.confidence_sum[idx] += conf
+            if conf > self.peak[idx]:
+                self.peak[idx] = conf
+                self.peak_time[idx] = timestamp
+
+    def classes(self) -> List[Dict]:
+        total = max(int(self.votes.sum()), 1)
+        rows = []
+        for idx in np.argsort(-self.votes, kind='stable'):
+            if self.votes[idx] == 0:
+                break
+            parsed = self.model._parse_class_name(self.model.idx_to_class[int(idx)])
+            rows.append({
+                'plant': parsed['plant'],
+                'disease': parsed['disease'],
+                'frames': int(self.votes[idx]),
+                'fraction': round(self.votes[idx] / total, 3),
+                'mean_confidence': round(self.confidence_sum[idx] / self.votes[idx], 3),
+                'peak_confidence': round(float(self.peak[idx]), 3),
+                'peak_timestamp_s': round(float(self.peak_time[idx]), 2),
+            })
+        return rows
+
+
+def scan_video(
+    video_path: str,
+    model=None,
+    plot_id: Optional[str] = None,
+    sample_fps: float = 3.0,
+    batch_size: int = 16,
+    min_sharpness: float = 20.0,
+    min_difference: float = 6.0,
+    min_confidence: float = 0.5,
+    min_diseased_fraction: float = 0.15,
+    max_frames: Optional[int] = None,
+    max_duration_s: Optional[float] = None
+) -> Dict:
+    """
+    Scan a plot walk-through video and summarize the diseases seen
+
+    Args:
+        video_path: Video file
+        model: Inference backend with predict_probabilities (default: registry model)
+        plot_id: Label for the plot (default: video file name)
+        sample_fps: Frames per second considered for analysis
+        batch_size: Frames per forward pass (bounds memory)
+        min_sharpness: Laplacian-variance floor below which frames are blurry
+        min_difference: Mean grey-level change below which frames are duplicates
+        min_confidence: Frames whose top-1 probability is lower are "uncertain"
+        min_diseased_fraction: Share of confident frames showing a disease
+            needed for a disease verdict
+        max_frames: Stop after analyzing this many frames
+        max_duration_s: Stop decoding at this timestamp (bounds the scan
+            time even when the container reports no or a wrong duration)
+
+    Returns:
+        Per-plot summary dictionary
+    """
+    cv2 = _import_cv2()
+    if model is None:
+        from ml_model.registry import get_inference_model
+        model = get_inference_model()
+
+    start = time.perf_counter()
+    size = getattr(model, 'image_size', 224)
+    selector = FrameSelector(min_sharpness=min_sharpness, min_difference=min_difference)
+    summary = _PlotSummary(model, min_confidence)
+    counts = {'sampled': 0, 'blurry': 0, 'duplicate': 0, 'analyzed': 0}
+
+    # One preallocated uint8 batch buffer, reused for the whole video
+    buffer = np.empty((batch_size, size, size, 3), dtype=np.uint8)
+    timestamps: List[float] = []
+    last_timestamp = 0.0
+    truncated = False
+
+    def flush():
+        if timestamps:
+            batch = normalize_batch(buffer[:len(timestamps)])
+            summary.update(model.predict_probabilities(batch), timestamps)
+            counts['analyzed'] += len(timestamps)
+            timestamps.clear()
+
+    for _, timestamp, frame in iter_sampled_frames(video_path, sample_fps):
+        if max_duration_s and timestamp > max_duration_s:
+            truncated = True
+            break
+        last_timestamp = timestamp
+        counts['sampled'] += 1
+        verdict = selector.check(frame)
+        if verdict != 'keep':
+            counts[verdict] += 1
+            continue
+
+        resized = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+        buffer[len(timestamps)] = resized[..., ::-1]  # BGR -> RGB
+        timestamps.append(timestamp)
+        if len(timestamps) == batch_size:
+            flush()
+        if max_frames and counts['analyzed'] + len(timestamps) >= max_frames:
+            break
+    flush()
+
+    classes = summary.classes()
+    diseased = [c for c in classes if c['disease'].lower() != 'healthy']
+    confident_frames = sum(c['frames'] for c in classes)
+    diseased_fraction = (sum(c['frames'] for c in diseased) / confident_frames
+                         if confident_frames else 0.0)
+
+    if diseased and diseased_fraction >= min_diseased_fraction:
+        verdict = diseased[0]
+    elif classes:
+        verdict = next((c for c in classes if c['disease'].lower() == 'healthy'), classes[0])
+    else:
+        verdict = None
+
+    elapsed = time.perf_counter() - start
+    return {
+        'plot_id': plot_id or Path(video_path).stem,
+        'video': str(video_path),
+        'duration_s': round(last_timestamp, 2),
+        'truncated': truncated,
+        'frames_sampled': counts['sampled'],
+        'frames_skipped_blurry': counts['blurry'],
+        'frames_skipped_duplicate': counts['duplicate'],
+        'frames_analyzed': counts['analyzed'],
+        'frames_uncertain': summary.uncertain,
+        'verdict': {
+            'plant': verdict['plant'],
+            'disease': verdict['disease'],
+            'frame_fraction': verdict['fraction'],
+            'mean_confidence': verdict['mean_confidence'],
+        } if verdict else None,
+        'diseased_frame_fraction': round(diseased_fraction, 3),
+        'classes': classes,
+        'processing_time_s': round(elapsed, 2),
+        'realtime_factor': round(last_timestamp / elapsed, 2) if elapsed else None,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Scan plot walk-through videos for diseases')
+    parser.add_argument('--video', type=str, nargs='+', required=True,
+                       help='Video file(s), one per plot')
+    parser.add_argument('--model', type=str, default=None,
+                       help='Model file (default: registry active model)')
+    parser.add_argument('--sample-fps', type=float, default=3.0,
+                       help='Frames per second considered for analysis')
+    parser.add_argument('--batch-size', type=int, default=16,
+                       help='Frames per forward pass')
+    parser.add_argument('--min-sharpness', type=float, default=20.0,
+                       help='Blur threshold (Laplacian variance)')
+    parser.add_argument('--min-difference', type=float, default=6.0,
+                       help='Near-duplicate threshold (mean grey-level change)')
+    parser.add_argument('--max-duration', type=float, default=None,
+                       help='Only scan the first N seconds of each video')
+    parser.add_argument('--output', type=str, default=None,
+                       help='Optional JSON file for the summaries')
+
+    args = parser.parse_args()
+
+    from ml_model.registry import get_inference_model
+    model = get_inference_model(args.model)
+
+    summaries = []
+    for video in args.video:
+        print(f"\n🎥 Scanning {video}...")
+        summary = scan_video(
+            video, model,
+            sample_fps=args.sample_fps,
+            batch_size=args.batch_size,
+            min_sharpness=args.min_sharpness,
+            min_difference=args.min_difference,
+            max_duration_s=args.max_duration
+        )
+        summaries.append(summary)
+
+        print(f"🧮 {summary['frames_analyzed']} frames analyzed "
+              f"({summary['frames_skipped_blurry']} blurry, "
+              f"{summary['frames_skipped_duplicate']} duplicate skipped) "
+              f"in {summary['processing_time_s']:.1f}s")
+        if summary['verdict']:
+            v = summary['verdict']
+            print(f"🌱 Plot {summary['plot_id']}: {v['plant']} - {v['disease']} "
+                  f"({v['frame_fraction']*100:.0f}% of frames)")
+        for c in summary['classes']:
+            print(f"   {c['plant']} - {c['disease']}: {c['frames']} frames, "
+                  f"peak {c['peak_confidence']*100:.0f}% at {c['peak_timestamp_s']}s")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summaries, f, indent=2)
+        print(f"✅ Results saved to: {args.output}")
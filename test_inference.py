@@ -2,6 +2,11 @@
 Quick test of inference pipeline without training
 Uses pre-trained ResNet50 from ImageNet
 """
+import os
+import sys
+import subprocess
+import tempfile
+import numpy as np
 import torch
 import torchvision.models as models
 from torchvision import transforms
@@ -54,3 +59,70 @@ print("\n" + "=" * 50)
 print("✅ ML Pipeline Working!")
 print(f"💡 Expected inference time: {inference_time*1000:.0f}ms per image")
 print("💡 Ready for plant disease model training")
+
+# batch_predict smoke check on every backend (needs a trained checkpoint:
+# python test_inference.py [path/to/best_model.pth])
+checkpoint = sys.argv[1] if len(sys.argv) > 1 else 'ml_model/checkpoints/best_model.pth'
+if not os.path.exists(checkpoint):
+    print(f"\n⚠️ No checkpoint at {checkpoint} - skipping backend smoke check")
+    sys.exit(0)
+
+print("\n4. batch_predict on every backend...")
+from ml_model.export import _metadata, export_torchscript
+from ml_model.export_onnx import export_onnx
+from ml_model.inference import PlantDiseaseInference
+from ml_model.inference_server import InferenceClient
+from ml_model.registry import load_inference_backend
+
+work_dir = tempfile.mkdtemp()
+image_paths = []
+for i, color in enumerate(['green', 'yellow', 'brown']):
+    image_paths.append(os.path.join(work_dir, f'{i}.jpg'))
+    Image.new('RGB', (256, 256), color=color).save(image_paths[-1])
+image_paths.append(os.path.join(work_dir, 'missing.jpg'))
+
+reference = PlantDiseaseInference(checkpoint, precision='fp32', channels_last=False)
+mapping = os.path.join(os.path.dirname(checkpoint), 'class_mapping.json')
+torchscript_path = export_torchscript(
+    reference.model.to('cpu').eval(), os.path.join(work_dir, 'model.pt'),
+    torch.randn(1, 3, 224, 224), _metadata(reference, 'fp32')
+)
+backends = {
+    'pytorch': reference,
+    'torchscript': load_inference_backend(torchscript_path, mapping),
+}
+try:
+    backends['onnx'] = load_inference_backend(
+        export_onnx(checkpoint, os.path.join(work_dir, 'model.onnx'), verify=False), mapping)
+except ImportError:
+    print("   ⚠️ onnx/onnxruntime not installed - skipping ONNX backend")
+
+socket_path = os.path.join(work_dir, 'inference.sock')
+sidecar = subprocess.Popen([sys.executable, 'ml_model/inference_server.py',
+                            '--socket', socket_path, '--model', os.path.abspath(checkpoint)],
+                           cwd=os.path.dirname(os.path.abspath(__file__)))
+for _ in range(600):
+    if os.path.exists(socket_path):
+        break
+    time.sleep(0.1)
+backends['sidecar'] = InferenceClient(socket_path)
+
+expected = None
+for name, backend in backends.items():
+    results = backend.batch_predict(image_paths, top_k=2)
+    assert [r['status'] for r in results] == ['success'] * 3 + ['error'], name
+    top1 = [(r['primary_prediction']['plant'], r['primary_prediction']['disease']) for r in results[:3]]
+    expected = expected or top1
+    assert top1 == expected, f"{name}: {top1} != {expected}"
+    print(f"   ✅ {name}: {len(results)} results, top-1 {top1}")
+
+# Raw probabilities from the sidecar match the in-process model
+from ml_model.preprocessing import load_batch
+batch = load_batch(image_paths[:3], reference.image_size)[0]
+difference = np.abs(backends['sidecar'].predict_probabilities(batch)
+                    - reference.predict_probabilities(batch)).max()
+assert difference < 1e-5, f"sidecar probabilities differ by {difference}"
+print(f"   ✅ sidecar: raw probabilities match (max difference {difference:.1e})")
+sidecar.terminate()
+
+print("✅ batch_predict works on every backend")